@@ -0,0 +1,6 @@
+# =============================================================================
+# Road Accident Analysis - Benchmarks
+# =============================================================================
+#
+# synthetic.py generates reproducible accident CSVs at any scale and
+# run_benchmarks.py times the pipeline on them. See run_benchmarks.py for usage.
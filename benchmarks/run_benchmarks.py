@@ -0,0 +1,217 @@
+# =============================================================================
+# Road Accident Analysis - Benchmark Suite
+# =============================================================================
+#
+# Times every stage of the pipeline on synthetic data at several scales and
+# appends one JSON line per (scale, stage) to a results file, tagged with a
+# label (the git commit by default), so runs of different versions can be
+# compared:
+#
+#   load_csv, preprocess, compact_dtypes, cache_build, cache_read,
+#   aggregate, stream_aggregate, chart_specs, section_1 ... section_10
+#
+# Each section stage renders that section's charts (Agg backend, in-process).
+# Peak memory is the highest resident set size seen while the stage ran,
+# minus the RSS when it started.
+#
+# Above --max-in-memory-rows (1e7 by default) the stages that hold the whole
+# frame (load_csv ... aggregate) are recorded as skipped, and the charts are
+# built from the streamed aggregates, so 1e8-row runs stay in bounded memory.
+#
+# Usage:
+#   python -m benchmarks.run_benchmarks --rows 1e5 1e6
+#   python -m benchmarks.run_benchmarks --rows 1e7 1e8 --max-in-memory-rows 1e7
+#   python -m benchmarks.run_benchmarks --compare a1b2c3d e4f5a6b
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+from road_accidents.profiling import PeakMemory
+
+DEFAULT_ROWS = [1e5, 1e6]
+DEFAULT_DATA_DIR = os.path.join('benchmarks', 'data')
+DEFAULT_OUTPUT = os.path.join('benchmarks', 'results.jsonl')
+DEFAULT_MAX_IN_MEMORY_ROWS = 10_000_000
+
+# Stages that need the full frame in memory
+IN_MEMORY_STAGES = ['load_csv', 'preprocess', 'compact_dtypes', 'cache_build', 'cache_read', 'aggregate']
+
+
+# -----------------------------------------------------------------------------
+# Measurement
+# -----------------------------------------------------------------------------
+class Recorder:
+    """Runs stages, measures them and collects result records."""
+
+    def __init__(self, label, rows):
+        self.label = label
+        self.rows = rows
+        self.records = []
+
+    def run(self, stage, func, *args, **kwargs):
+        cpu_start = time.process_time()
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            wall = time.perf_counter() - start
+        record = {
+            'label': self.label,
+            'rows': self.rows,
+            'stage': stage,
+            'wall_s': round(wall, 4),
+            'cpu_s': round(time.process_time() - cpu_start, 4),
+            'peak_mem_mb': round(memory.delta_mb, 1),
+        }
+        self.records.append(record)
+        print("  {:<18} {:>9.3f}s  {:>8.1f} MB".format(stage, wall, memory.delta_mb))
+        return result
+
+    def skip(self, stage, reason):
+        self.records.append({'label': self.label, 'rows': self.rows, 'stage': stage,
+                             'wall_s': None, 'cpu_s': None, 'peak_mem_mb': None, 'skipped': reason})
+        print("  {:<18} skipped ({})".format(stage, reason))
+
+
+# -----------------------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------------------
+def git_label():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def dataset_path(data_dir, rows, seed):
+    return os.path.join(data_dir, 'synthetic-{}-seed{}.csv'.format(rows, seed))
+
+
+def render_section(specs, output_dir):
+    from road_accidents.report import render_chart
+    for spec in specs:
+        render_chart(spec, output_dir)
+
+
+def benchmark_scale(path, rows, label, chunksize, max_in_memory_rows=DEFAULT_MAX_IN_MEMORY_ROWS):
+    import pandas as pd
+
+    from road_accidents.aggregate import aggregate_frame, stream_aggregates
+    from road_accidents.cache import AccidentCache
+    from road_accidents.dtypes import compact_dtypes
+    from road_accidents.ingest import derive_time_fields
+    from road_accidents.parsing import ParseReport
+    from road_accidents.report import build_chart_specs
+
+    recorder = Recorder(label, rows)
+    workdir = tempfile.mkdtemp(prefix='accident-bench-')
+    try:
+        if rows <= max_in_memory_rows:
+            report = ParseReport()
+            df = recorder.run('load_csv', pd.read_csv, path)
+            df = recorder.run('preprocess', derive_time_fields, df, report)
+            compacted, _ = recorder.run('compact_dtypes', compact_dtypes, df)
+
+            cache = AccidentCache(path, os.path.join(workdir, 'cache'))
+            recorder.run('cache_build', cache.build, df, report)
+            del df
+            recorder.run('cache_read', cache.read)
+
+            agg = recorder.run('aggregate', aggregate_frame, compacted)
+            recorder.run('stream_aggregate', stream_aggregates, path, chunksize)
+        else:
+            reason = "more than {} rows".format(max_in_memory_rows)
+            for stage in IN_MEMORY_STAGES:
+                recorder.skip(stage, reason)
+            compacted = None
+            agg = recorder.run('stream_aggregate', stream_aggregates, path, chunksize)
+        # Without the frame the row-level charts (box plots, correlation) are left out
+        specs = recorder.run('chart_specs', build_chart_specs, agg, compacted)
+
+        charts_dir = os.path.join(workdir, 'charts')
+        os.makedirs(charts_dir)
+        for section in range(1, 11):
+            section_specs = [spec for spec in specs if spec.section == section]
+            recorder.run('section_{}'.format(section), render_section, section_specs, charts_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return recorder.records
+
+
+def environment():
+    import numpy
+    import pandas
+    return {
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(rows_list, data_dir, output, label, seed, chunksize, max_in_memory_rows=DEFAULT_MAX_IN_MEMORY_ROWS):
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from benchmarks.synthetic import generate_csv
+
+    env = environment()
+    timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+    for rows in rows_list:
+        path = dataset_path(data_dir, rows, seed)
+        if not os.path.exists(path):
+            print("Generating {} rows -> {}".format(rows, path))
+            generate_csv(path, rows, seed)
+        print("Benchmarking {} rows ({})".format(rows, label))
+        records = benchmark_scale(path, rows, label, chunksize, max_in_memory_rows)
+        with open(output, 'a') as f:
+            for record in records:
+                f.write(json.dumps({**record, 'timestamp': timestamp, **env}) + "\n")
+    print("Results appended to {}".format(output))
+
+
+def compare(output, base, head):
+    """Print wall time and peak memory of two labels side by side."""
+    import pandas as pd
+
+    results = pd.read_json(output, lines=True, dtype={'label': str})
+    results = results[results['label'].isin([base, head])]
+    # Latest run per label/scale/stage
+    results = results.sort_values('timestamp').groupby(['label', 'rows', 'stage']).last()
+    table = results[['wall_s', 'peak_mem_mb']].unstack('label')
+    table[('speedup', '')] = table[('wall_s', base)] / table[('wall_s', head)]
+    print(table.round(3).to_string())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the road accident pipeline on synthetic data.")
+    parser.add_argument('--rows', nargs='+', type=float, default=DEFAULT_ROWS,
+                        help="dataset sizes, e.g. 1e5 1e6 1e7 (up to 1e8)")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where generated CSVs are kept")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON-lines results file (appended)")
+    parser.add_argument('--label', default=None, help="version label (default: git commit)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000, help="rows per chunk when streaming")
+    parser.add_argument('--max-in-memory-rows', type=float, default=DEFAULT_MAX_IN_MEMORY_ROWS,
+                        help="above this size only the streaming stages run")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'),
+                        help="compare two labels from the results file instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(args.output, *args.compare)
+        return
+    run([int(rows) for rows in args.rows], args.data_dir, args.output,
+        args.label or git_label(), args.seed, args.chunk_size, int(args.max_in_memory_rows))
+
+
+if __name__ == '__main__':
+    main()
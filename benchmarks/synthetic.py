@@ -0,0 +1,196 @@
+# =============================================================================
+# Road Accident Analysis - Synthetic Data Generator
+# =============================================================================
+#
+# Writes a reproducible road-accident CSV with every column the analysis
+# script looks for, with realistic cardinalities and skew:
+#
+#   * a few hundred cities with Zipf-distributed accident counts, each with a
+#     coordinate centre; accidents scatter around their city
+#   * intersections scaling with the row count (hundreds of thousands at 1e7+),
+#     again heavily skewed
+#   * rush-hour peaks in Time, more accidents on Fridays/weekends and in winter
+#   * Severity, Weather, Lighting, Speeding, Injury/Fatality counts that depend
+#     on each other the way real data does (night + speeding -> more fatal)
+#   * multi-valued Contributing_Factors ("Speeding;Wet road") on some rows
+#   * a small share of malformed Date/Time values
+#
+# Rows are generated and written in chunks, so 1e8 rows need no more memory
+# than 1e6.
+#
+# Usage:
+#   python -m benchmarks.synthetic 1000000 synthetic-1e6.csv
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+REGIONS = ['North', 'South', 'East', 'West', 'Central', 'North-East']
+SEVERITIES = ['Minor', 'Serious', 'Fatal']
+GENDERS = ['Male', 'Female', 'Other']
+GENDER_P = [0.68, 0.31, 0.01]
+WEATHER = ['Clear', 'Rain', 'Fog', 'Cloudy', 'Snow', 'Storm', 'Haze']
+WEATHER_P = [0.55, 0.17, 0.08, 0.12, 0.02, 0.02, 0.04]
+ROAD_TYPES = ['National Highway', 'State Highway', 'Urban Road', 'Rural Road', 'Expressway', 'Other']
+ROAD_TYPE_P = [0.30, 0.22, 0.28, 0.14, 0.04, 0.02]
+VEHICLE_TYPES = ['Two-Wheeler', 'Car', 'Truck', 'Bus', 'Auto-Rickshaw', 'Bicycle', 'Pedestrian', 'Other']
+VEHICLE_P = [0.38, 0.27, 0.12, 0.05, 0.07, 0.04, 0.05, 0.02]
+FACTORS = ['Speeding', 'Drunk driving', 'Distracted driving', 'Wet road', 'Fatigue', 'Poor visibility',
+           'Wrong-side driving', 'Jumping red light', 'Potholes', 'Mechanical failure', 'Overloading',
+           'Animal crossing']
+FACTOR_P = np.array([0.26, 0.08, 0.14, 0.07, 0.07, 0.06, 0.08, 0.06, 0.05, 0.05, 0.04, 0.04])
+ROAD_USERS = ['Driver', 'Passenger', 'Pedestrian', 'Cyclist', 'Motorcyclist']
+ROAD_USER_P = [0.34, 0.20, 0.14, 0.05, 0.27]
+
+# Relative accident rate per hour of day (rush hours and a late-evening peak)
+HOUR_WEIGHTS = np.array([2, 1.5, 1.2, 1, 1, 1.5, 3, 5, 7, 6, 5, 5,
+                         5.5, 5, 5, 5.5, 6.5, 8, 8.5, 7, 6, 5, 4, 3], dtype=float)
+# Monday..Sunday
+DAY_WEIGHTS = np.array([1.0, 0.95, 0.95, 1.0, 1.15, 1.2, 1.1])
+# January..December (winter fog and monsoon peaks)
+MONTH_WEIGHTS = np.array([1.15, 1.0, 0.95, 0.95, 1.0, 1.0, 1.1, 1.1, 1.0, 0.95, 1.0, 1.2])
+
+
+def _city_table(n_cities, rng):
+    # Fixed per seed: names, centres (roughly India's extent), regions and
+    # Zipf-like weights
+    centres_lat = rng.uniform(9.0, 31.0, n_cities)
+    centres_lon = rng.uniform(70.0, 92.0, n_cities)
+    weights = 1.0 / np.arange(1, n_cities + 1) ** 1.1
+    return pd.DataFrame({
+        'City': ['City_{:03d}'.format(i) for i in range(n_cities)],
+        'lat': centres_lat,
+        'lon': centres_lon,
+        'Region': rng.choice(REGIONS, n_cities),
+        'urban': rng.random(n_cities) < np.linspace(0.9, 0.3, n_cities),
+        'weight': weights / weights.sum(),
+    })
+
+
+def _date_weights(start, end):
+    days = pd.date_range(start, end, freq='D')
+    weights = DAY_WEIGHTS[days.dayofweek] * MONTH_WEIGHTS[days.month - 1]
+    # Slow growth over the years
+    weights = weights * np.linspace(1.0, 1.3, len(days))
+    return days, weights / weights.sum()
+
+
+def generate_chunk(n, rng, cities, days, day_weights, n_intersections, bad_fraction=0.001):
+    """One chunk of n synthetic accident rows."""
+    city_idx = rng.choice(len(cities), n, p=cities['weight'].to_numpy())
+    city = cities.iloc[city_idx]
+    urban = city['urban'].to_numpy() & (rng.random(n) < 0.85)
+
+    dates = days[rng.choice(len(days), n, p=day_weights)]
+    hours = rng.choice(24, n, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    minutes = rng.integers(0, 60, n)
+    night = (hours < 6) | (hours >= 19)
+
+    # Intersections: skewed, and numbered per city so names repeat realistically
+    inter = (rng.zipf(1.3, n) - 1) % n_intersections
+    intersection = pd.Series(city['City'].to_numpy()).str.cat(
+        pd.Series(inter).astype(str), sep='_X')
+
+    speeding = rng.random(n) < np.where(night, 0.35, 0.2)
+    seatbelt = rng.random(n) < 0.6
+    age = np.clip(rng.gamma(6.0, 6.0, n) + 12, 16, 90).astype(np.int64)
+    experience = np.clip(age - 18 - rng.integers(0, 10, n), 0, None)
+
+    # Severity: base Minor 70%, Serious 22%, Fatal 8%, worse at night / speeding / no seatbelt
+    risk = 1.0 + 0.6 * night + 0.8 * speeding + 0.4 * (~seatbelt)
+    u = rng.random(n)
+    fatal = u < 0.08 * risk / 1.5
+    serious = ~fatal & (u < (0.08 + 0.22) * risk / 1.5)
+    severity = np.where(fatal, 'Fatal', np.where(serious, 'Serious', 'Minor'))
+
+    fatality = np.where(fatal, 1 + rng.poisson(0.4, n), 0)
+    injury = rng.poisson(np.where(fatal, 2.5, np.where(serious, 2.0, 1.0)))
+
+    # Contributing factors: one to three, joined with ';' on ~25% of rows
+    n_factors = 1 + (rng.random(n) < 0.25) + (rng.random(n) < 0.05)
+    first = rng.choice(len(FACTORS), n, p=FACTOR_P / FACTOR_P.sum())
+    second = (first + rng.integers(1, len(FACTORS), n)) % len(FACTORS)
+    third = (second + rng.integers(1, len(FACTORS) - 1, n)) % len(FACTORS)
+    names = np.array(FACTORS, dtype=object)
+    factors = names[first]
+    factors = np.where(n_factors >= 2, factors + ';' + names[second], factors)
+    factors = np.where(n_factors >= 3, factors + ';' + names[third], factors)
+
+    spread = np.where(urban, 0.05, 0.35)
+    df = pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Time': pd.Series(hours).map('{:02d}'.format).str.cat(pd.Series(minutes).map('{:02d}'.format), sep=':'),
+        'City': city['City'].to_numpy(),
+        'Intersection': intersection.to_numpy(),
+        'Region': city['Region'].to_numpy(),
+        'Latitude': np.round(city['lat'].to_numpy() + rng.normal(0, 1, n) * spread, 6),
+        'Longitude': np.round(city['lon'].to_numpy() + rng.normal(0, 1, n) * spread, 6),
+        'Severity': severity,
+        'Age': age,
+        'Gender': rng.choice(GENDERS, n, p=GENDER_P),
+        'Weather': rng.choice(WEATHER, n, p=WEATHER_P),
+        'Road_Type': rng.choice(ROAD_TYPES, n, p=ROAD_TYPE_P),
+        'Lighting': np.where(night, rng.choice(['Dark - lit', 'Dark - unlit'], n, p=[0.6, 0.4]),
+                             rng.choice(['Daylight', 'Dusk/Dawn'], n, p=[0.9, 0.1])),
+        'Vehicle_Type': rng.choice(VEHICLE_TYPES, n, p=VEHICLE_P),
+        'Driver_Experience': experience,
+        'Speeding': np.where(speeding, 'Yes', 'No'),
+        'Seatbelt_Usage': np.where(seatbelt, 'Yes', 'No'),
+        'Contributing_Factors': factors,
+        'Injury_Count': injury,
+        'Fatality_Count': fatality,
+        'Road_User': rng.choice(ROAD_USERS, n, p=ROAD_USER_P),
+        'Area_Type': np.where(urban, 'Urban', 'Rural'),
+    })
+
+    # A few malformed values, as in real exports
+    if bad_fraction:
+        bad = rng.random(n) < bad_fraction
+        df.loc[bad & (rng.random(n) < 0.5), 'Date'] = 'unknown'
+        df.loc[bad & (rng.random(n) < 0.5), 'Time'] = '25:61'
+    return df
+
+
+def generate_csv(path, rows, seed=0, start='2015-01-01', end='2023-12-31',
+                 chunk_rows=DEFAULT_CHUNK_ROWS, n_cities=300, bad_fraction=0.001):
+    """Write `rows` synthetic accidents to `path`, chunk by chunk."""
+    rng = np.random.default_rng(seed)
+    cities = _city_table(n_cities, rng)
+    days, day_weights = _date_weights(start, end)
+    # Distinct intersections per city grow with the data (~3% of rows overall)
+    n_intersections = max(50, int(rows * 0.03 / n_cities))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    written = 0
+    with open(tmp_path, 'w', newline='') as f:
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            chunk = generate_chunk(n, rng, cities, days, day_weights, n_intersections, bad_fraction)
+            chunk.to_csv(f, index=False, header=(written == 0))
+            written += n
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic road accident CSV.")
+    parser.add_argument('rows', type=float, help="number of rows (e.g. 1e6)")
+    parser.add_argument('path', help="output CSV path")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default='2015-01-01', help="first accident date")
+    parser.add_argument('--end', default='2023-12-31', help="last accident date")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+    generate_csv(args.path, int(args.rows), args.seed, args.start, args.end, args.chunk_rows)
+    print("Wrote {} rows to {}".format(int(args.rows), args.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+# =============================================================================
+# Road Accident Analysis - Supporting Package
+# =============================================================================
+#
+# Helpers used by "ROAD ACCIDENT ANALYSIS.py". Submodules are imported on
+# demand so that importing the package itself stays cheap.
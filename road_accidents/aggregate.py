@@ -0,0 +1,272 @@
+# =============================================================================
+# Road Accident Analysis - Single-Pass Aggregation Engine
+# =============================================================================
+#
+# Every chart in sections 1-10 that only needs counts is drawn from an
+# AggregateResults object instead of scanning the frame again. The
+# AccidentAggregator collects all of those counts, crosstabs and summary
+# statistics in one pass over the data (or one pass per chunk when streaming),
+# so total runtime grows with the number of rows, not rows x charts.
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.factors import FACTOR_COLUMN, FACTOR_SEPARATOR, FactorTables
+from road_accidents.hotspots import DEFAULT_CELL_SIZE, HotspotAccumulator
+from road_accidents.ingest import DAYS_ORDER, RunningCounts, iter_accident_chunks
+from road_accidents.sketches import DEFAULT_TOP_K, SketchAccumulator
+from road_accidents.timeseries import DAILY_KEYS, DailyCountsBuilder
+
+# Value counts used by the bar charts (Date gives the daily time series,
+# Age and Driver_Experience the histograms)
+COUNT_COLUMNS = [
+    'Date', 'Year', 'Month', 'DayOfWeek', 'Hour',
+    'City', 'Intersection', 'Region',
+    'Severity', 'Age', 'Gender',
+    'Weather', 'Road_Type', 'Lighting',
+    'Vehicle_Type', 'Driver_Experience', 'Speeding', 'Seatbelt_Usage',
+    'Contributing_Factors', 'Road_User', 'Area_Type',
+]
+
+# (row, column) pairs for the grouped bar charts, and the per-group value
+# counts the section 4c/9c distribution tests run on
+CROSSTABS = [
+    ('Vehicle_Type', 'Severity'),
+    ('Contributing_Factors', 'Severity'),
+    ('Contributing_Factors', 'Region'),
+    ('Region', 'Year'),
+    ('Gender', 'Age'),
+    ('Speeding', 'Fatality_Count'),
+]
+
+# Numeric columns summarised with count/sum/mean/std/min/max
+STAT_COLUMNS = ['Age', 'Driver_Experience', 'Injury_Count', 'Fatality_Count']
+
+
+def _plain_index(index):
+    # Categorical levels (from compacted frames) become ordinary values so
+    # plots keep the count order instead of the category order
+    if isinstance(index, pd.MultiIndex):
+        return pd.MultiIndex.from_arrays(
+            [np.asarray(index.get_level_values(i)) for i in range(index.nlevels)],
+            names=index.names)
+    if isinstance(index, pd.CategoricalIndex):
+        return pd.Index(np.asarray(index), name=index.name)
+    return index
+
+
+class AggregateResults:
+    """Counts, crosstabs and summary statistics produced by AccidentAggregator."""
+
+    def __init__(self, total_rows, counts, crosstabs, stats, hotspots=None, sketches=None, daily=None):
+        self.total_rows = total_rows
+        # column -> counts Series sorted like value_counts()
+        self.counts = counts
+        # (row, column) -> DataFrame of counts
+        self.crosstabs = crosstabs
+        # column -> dict of summary statistics
+        self.stats = stats
+        # HotspotCells with per-cell counts by Severity (None without coordinates)
+        self.hotspots = hotspots
+        # column -> ColumnSummary for sketched (approximate) columns; their
+        # entries in `counts` only hold the estimated top values
+        self.sketches = sketches or {}
+        # DailyCounts per Region and Severity (None without dates)
+        self.daily = daily
+
+    def crosstab(self, row, column):
+        return self.crosstabs[(row, column)]
+
+    def long_crosstab(self, row, column):
+        """Crosstab as a long frame (row, column, count) for grouped bar plots."""
+        table = self.crosstab(row, column).stack()
+        table.name = 'count'
+        return table[table > 0].reset_index()
+
+    def factors(self, sep=FACTOR_SEPARATOR):
+        """Per-factor tables for multi-valued Contributing_Factors (None if not counted)."""
+        if FACTOR_COLUMN not in self.counts:
+            return None
+        crosstabs = {column: table for (row, column), table in self.crosstabs.items() if row == FACTOR_COLUMN}
+        return FactorTables.from_combinations(self.counts[FACTOR_COLUMN], crosstabs, sep)
+
+
+class AccidentAggregator:
+    """Accumulates every requested aggregate in a single pass over the rows."""
+
+    def __init__(self, counts=COUNT_COLUMNS, crosstabs=CROSSTABS, stats=STAT_COLUMNS,
+                 hotspot_cell_size=DEFAULT_CELL_SIZE, approximate=(), top_k=DEFAULT_TOP_K,
+                 daily_keys=DAILY_KEYS):
+        # Columns in `approximate` get bounded-memory top-K and distinct-count
+        # sketches instead of exact value counts
+        approximate = [col for col in approximate if col in counts]
+        self._sketches = SketchAccumulator(approximate, top_k) if approximate else None
+        self.count_columns = [col for col in counts if col not in approximate]
+        self.crosstab_pairs = [tuple(pair) for pair in crosstabs]
+        self.stat_columns = list(stats)
+        # Pass hotspot_cell_size=None to skip the coordinate grid
+        self._hotspots = HotspotAccumulator(hotspot_cell_size) if hotspot_cell_size else None
+        # Pass daily_keys=None to skip the dense daily series
+        self._daily = DailyCountsBuilder(daily_keys) if daily_keys is not None else None
+        self.total_rows = 0
+        self._counts = {col: RunningCounts() for col in self.count_columns}
+        self._crosstabs = {pair: RunningCounts() for pair in self.crosstab_pairs}
+        self._stats = {}
+
+    def required_columns(self):
+        """Columns that must be present in each chunk (derived ones included)."""
+        needed = list(self.count_columns)
+        if self._sketches is not None:
+            needed.extend(self._sketches.columns)
+        for pair in self.crosstab_pairs:
+            needed.extend(pair)
+        needed.extend(self.stat_columns)
+        if self._hotspots is not None:
+            needed.extend(['Longitude', 'Latitude', self._hotspots.by])
+        if self._daily is not None:
+            needed.extend(self._daily.required_columns())
+        return list(dict.fromkeys(needed))
+
+    def update(self, chunk):
+        self.total_rows += len(chunk)
+
+        for col in self.count_columns:
+            if col in chunk.columns:
+                self._counts[col].add(chunk[col].value_counts(sort=False))
+
+        for row, column in self.crosstab_pairs:
+            if row in chunk.columns and column in chunk.columns:
+                self._crosstabs[(row, column)].add(chunk.groupby([row, column], observed=True, sort=False).size())
+
+        for col in self.stat_columns:
+            if col not in chunk.columns:
+                continue
+            values = chunk[col].dropna().to_numpy(dtype=np.float64)
+            if not len(values):
+                continue
+            running = self._stats.setdefault(
+                col, {'count': 0, 'sum': 0.0, 'sum_sq': 0.0, 'min': np.inf, 'max': -np.inf})
+            running['count'] += len(values)
+            running['sum'] += values.sum()
+            running['sum_sq'] += np.square(values).sum()
+            running['min'] = min(running['min'], values.min())
+            running['max'] = max(running['max'], values.max())
+
+        if self._hotspots is not None:
+            self._hotspots.update(chunk)
+        if self._sketches is not None:
+            self._sketches.update(chunk)
+        if self._daily is not None:
+            self._daily.update(chunk)
+        return self
+
+    def _tables(self):
+        # name -> RunningCounts of every exact count table
+        tables = {'counts-' + col: running for col, running in self._counts.items()}
+        tables.update(('crosstab-{}-{}'.format(*pair), running) for pair, running in self._crosstabs.items())
+        if self._hotspots is not None:
+            tables['hotspots'] = self._hotspots.counts
+        return tables
+
+    def pop_tables(self):
+        """Take out the exact count tables as {name: counts Series}, leaving them empty.
+
+        They are the bulk of the state; the aggregate store keeps them as
+        key/count arrays it can update in place and pickles only the rest.
+        """
+        tables = {name: running.pop() for name, running in self._tables().items()}
+        return {name: counts for name, counts in tables.items() if counts is not None}
+
+    def add_tables(self, tables):
+        """Add {name: counts Series} tables (as returned by pop_tables) into this aggregator."""
+        running = self._tables()
+        for name, counts in tables.items():
+            running[name].add(counts)
+        return self
+
+    def merge(self, other):
+        """Fold in the state of another aggregator with the same settings (e.g. of a delta file)."""
+        self.total_rows += other.total_rows
+        tables = {name: running.total() for name, running in other._tables().items()}
+        self.add_tables({name: counts for name, counts in tables.items() if counts is not None})
+        for col, theirs in other._stats.items():
+            running = self._stats.setdefault(
+                col, {'count': 0, 'sum': 0.0, 'sum_sq': 0.0, 'min': np.inf, 'max': -np.inf})
+            for key in ('count', 'sum', 'sum_sq'):
+                running[key] += theirs[key]
+            running['min'] = min(running['min'], theirs['min'])
+            running['max'] = max(running['max'], theirs['max'])
+        if self._sketches is not None:
+            self._sketches.merge(other._sketches)
+        if self._daily is not None:
+            self._daily.merge(other._daily)
+        return self
+
+    def result(self):
+        counts = {}
+        for col, running in self._counts.items():
+            col_counts = running.total()
+            if col_counts is None:
+                continue
+            # Categorical value_counts() also lists unobserved categories
+            col_counts = col_counts[col_counts > 0]
+            col_counts.index = _plain_index(col_counts.index)
+            col_counts = col_counts.sort_values(ascending=False, kind='stable')
+            col_counts.index.name = col
+            col_counts.name = 'count'
+            counts[col] = col_counts
+
+        # Weekday vs. weekend split falls out of the day-of-week counts; rows
+        # without a parseable Date count as weekdays, as with isin() on the rows
+        if 'DayOfWeek' in counts:
+            by_day = counts['DayOfWeek']
+            weekend = by_day[by_day.index.isin(DAYS_ORDER[5:])].sum()
+            counts['Is_Weekend'] = pd.Series(
+                [self.total_rows - weekend, weekend],
+                index=pd.Index([False, True], name='Is_Weekend'), name='count')
+
+        crosstabs = {}
+        for pair, running in self._crosstabs.items():
+            pair_counts = running.total()
+            if pair_counts is not None:
+                pair_counts = pair_counts.copy()
+                pair_counts.index = _plain_index(pair_counts.index)
+                crosstabs[pair] = pair_counts.unstack(fill_value=0).sort_index().astype(np.int64)
+
+        stats = {}
+        for col, running in self._stats.items():
+            n = running['count']
+            mean = running['sum'] / n
+            # Sample standard deviation from the running sums
+            var = (running['sum_sq'] - n * mean * mean) / (n - 1) if n > 1 else float('nan')
+            stats[col] = {
+                'count': n,
+                'sum': running['sum'],
+                'mean': mean,
+                'std': float(np.sqrt(max(var, 0.0))) if n > 1 else float('nan'),
+                'min': running['min'],
+                'max': running['max'],
+            }
+
+        sketches = self._sketches.result() if self._sketches is not None else {}
+        for col, summary in sketches.items():
+            counts[col] = summary.top
+
+        hotspots = self._hotspots.result() if self._hotspots is not None else None
+        daily = self._daily.result() if self._daily is not None else None
+        return AggregateResults(self.total_rows, counts, crosstabs, stats, hotspots, sketches, daily)
+
+
+def aggregate_frame(df, aggregator=None):
+    """Collect all aggregates from an in-memory frame in one pass."""
+    aggregator = aggregator or AccidentAggregator()
+    return aggregator.update(df).result()
+
+
+def stream_aggregates(path, chunksize, aggregator=None, report=None):
+    """Collect all aggregates from the CSV one chunk at a time."""
+    aggregator = aggregator or AccidentAggregator()
+    chunks = iter_accident_chunks(path, chunksize, usecols=aggregator.required_columns(), report=report)
+    for chunk in chunks:
+        aggregator.update(chunk)
+    return aggregator.result()
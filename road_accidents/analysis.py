@@ -0,0 +1,567 @@
+# =============================================================================
+# Road Accident Analysis - Lazy Importable API
+# =============================================================================
+#
+# The results of sections 1-10 as named, lazily computed values:
+#
+#   >>> from road_accidents.analysis import AccidentAnalysis
+#   >>> analysis = AccidentAnalysis("road-accident-data.csv")
+#   >>> analysis.fatal_percentage
+#   8.42
+#   >>> analysis.accidents_per_year
+#   >>> analysis.plot('accidents_per_year')
+#
+# A result loads only the columns it needs (from the memory-mapped Feather
+# cache when available) and is memoized, as are the loaded columns, so asking
+# for one number costs one column read. matplotlib and seaborn are imported
+# only when plot() is called.
+
+import pandas as pd
+
+from road_accidents.dtypes import compact_series
+from road_accidents.factors import FactorTables
+from road_accidents.ingest import DAYS_ORDER, load_accidents
+from road_accidents.stats import compare_groups, proportion_intervals
+from road_accidents.timeseries import DAILY_KEYS, DailyCounts
+from road_accidents.report import AGE_BINS, AGE_LABELS, SEVERITY_MAPPING, ChartSpec, draw_chart
+
+DEFAULT_PATH = "road-accident-data.csv"
+
+# name -> _Result, in section order
+RESULTS = {}
+
+
+class _Result:
+    def __init__(self, func, section, columns, chart, chart_options):
+        self.func = func
+        self.name = func.__name__
+        self.section = section
+        self.columns = columns
+        self.chart = chart
+        self.chart_options = chart_options
+        self.description = (func.__doc__ or '').strip()
+
+
+def result(section, columns, chart=None, **chart_options):
+    """Register a function of an AccidentAnalysis as a named result.
+
+    `columns` lists the (raw or derived) columns the result reads; `chart`
+    is the ChartSpec kind used by AccidentAnalysis.plot(), with title,
+    axis labels and drawing options as keyword arguments.
+    """
+    def register(func):
+        RESULTS[func.__name__] = _Result(func, section, list(columns), chart, chart_options)
+        return func
+    return register
+
+
+class AccidentAnalysis:
+    """Lazily computed, memoized accident statistics for one CSV file."""
+
+    def __init__(self, path=DEFAULT_PATH, use_cache=True, compact=True):
+        self.path = path
+        self.use_cache = use_cache
+        self.compact = compact
+        self._columns = {}
+        self._results = {}
+        self._cache = None
+        self._available = None
+
+    def __repr__(self):
+        return "AccidentAnalysis({!r}, computed={})".format(self.path, sorted(self._results))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Analysis of an already loaded frame (e.g. a filtered subset); nothing is read from disk."""
+        analysis = cls(path=None, use_cache=False, compact=False)
+        analysis._available = list(df.columns)
+        analysis._columns = {col: df[col] for col in df.columns}
+        return analysis
+
+    def __getattr__(self, name):
+        if name in RESULTS:
+            return self.get(name)
+        raise AttributeError("{!r} is not a result; see AccidentAnalysis.results()".format(name))
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(RESULTS))
+
+    @staticmethod
+    def results():
+        """Names and descriptions of every available result."""
+        return {name: spec.description for name, spec in RESULTS.items()}
+
+    # -------------------------------------------------------------------------
+    # Data access
+    # -------------------------------------------------------------------------
+    def _accident_cache(self):
+        if self._cache is None:
+            from road_accidents.cache import AccidentCache, _have_pyarrow
+            self._cache = AccidentCache(self.path) if _have_pyarrow() else False
+        return self._cache
+
+    def available_columns(self):
+        """Raw and derived columns present in the data."""
+        if self._available is None:
+            cache = self._accident_cache() if self.use_cache else None
+            if cache:
+                self._available = cache.columns()
+            else:
+                from road_accidents.ingest import available_columns, read_header
+                self._available = available_columns(read_header(self.path))
+        return self._available
+
+    def has(self, *columns):
+        return all(col in self.available_columns() for col in columns)
+
+    def frame(self, columns):
+        """DataFrame of `columns`, loading (and memoizing) only the missing ones."""
+        columns = [col for col in columns if col in self.available_columns()]
+        missing = [col for col in columns if col not in self._columns]
+        if missing:
+            cache = self._accident_cache() if self.use_cache else None
+            loaded = cache.read(missing) if cache else load_accidents(self.path, usecols=missing)
+            for col in missing:
+                series = loaded[col]
+                self._columns[col] = compact_series(series) if self.compact else series
+        return pd.DataFrame({col: self._columns[col] for col in columns})
+
+    def column(self, name):
+        return self.frame([name])[name]
+
+    def get(self, name):
+        """Compute (once) and return the named result."""
+        if name not in self._results:
+            spec = RESULTS[name]
+            if not self.has(*spec.columns):
+                raise KeyError("{} needs columns {} which are not all in {}".format(
+                    name, spec.columns, self.path))
+            self._results[name] = spec.func(self)
+        return self._results[name]
+
+    def clear(self):
+        """Forget memoized results and columns (e.g. after the CSV changed)."""
+        self._columns.clear()
+        self._results.clear()
+        self._available = None
+
+    # -------------------------------------------------------------------------
+    # Plotting
+    # -------------------------------------------------------------------------
+    def chart_spec(self, name):
+        """The ChartSpec for a result, as drawn by the headless report."""
+        spec = RESULTS[name]
+        if spec.chart is None:
+            raise ValueError("{} has no chart".format(name))
+        options = dict(spec.chart_options)
+        title = options.pop('title')
+        xlabel = options.pop('xlabel', '')
+        ylabel = options.pop('ylabel', '')
+        data = self.get(name)
+        if spec.chart == 'density':
+            rasters, extent = data.density()
+            data = {'rasters': rasters, 'extent': extent}
+            options.setdefault('figsize', (5 * max(len(rasters), 1), 5))
+            xlabel, ylabel = "Longitude", "Latitude"
+        return ChartSpec(name, spec.section, spec.chart, data, title, xlabel, ylabel, **options)
+
+    def plot(self, name, ax=None):
+        """Draw a result with matplotlib (imported only now); returns the Axes or Figure."""
+        import matplotlib.pyplot as plt
+
+        chart = self.chart_spec(name)
+        if chart.kind == 'density':
+            from road_accidents.hotspots import plot_density
+            fig = plt.figure(figsize=chart.figsize)
+            plot_density(fig, chart.data['rasters'], chart.data['extent'], chart.title)
+            return fig
+        if ax is None:
+            _, ax = plt.subplots(figsize=chart.figsize)
+        draw_chart(chart, ax)
+        return ax
+
+
+def _counts(analysis, column):
+    return analysis.column(column).value_counts()
+
+
+# =============================================================================
+# 1. Frequency of Accidents Over Time
+# =============================================================================
+@result(1, [])
+def total_accidents(analysis):
+    """Total number of accidents recorded."""
+    cache = analysis._accident_cache() if analysis.use_cache else None
+    if cache:
+        return cache.rows()
+    return len(analysis.column(analysis.available_columns()[0]))
+
+
+@result(1, ['Year'], 'bar', title="Number of Accidents per Year", xlabel="Year",
+        ylabel="Number of Accidents", palette='Blues_d')
+def accidents_per_year(analysis):
+    """Accidents per year."""
+    return _counts(analysis, 'Year').sort_index()
+
+
+@result(1, ['Month'], 'bar', title="Number of Accidents per Month", xlabel="Month",
+        ylabel="Number of Accidents", palette='Greens_d')
+def accidents_per_month(analysis):
+    """Accidents per calendar month (1-12)."""
+    return _counts(analysis, 'Month').sort_index()
+
+
+@result(1, ['DayOfWeek'], 'bar', title="Number of Accidents by Day of the Week",
+        xlabel="Day of the Week", ylabel="Number of Accidents", palette='Purples_d')
+def accidents_per_day_of_week(analysis):
+    """Accidents per day of the week, Monday first."""
+    return _counts(analysis, 'DayOfWeek').reindex(DAYS_ORDER, fill_value=0)
+
+
+@result(1, ['Hour'], 'bar', title="Number of Accidents by Hour of the Day", xlabel="Hour of the Day",
+        ylabel="Number of Accidents", palette='Oranges_d')
+def accidents_per_hour(analysis):
+    """Accidents per hour of the day."""
+    return _counts(analysis, 'Hour').sort_index()
+
+
+@result(1, ['Date'], 'line', title="Daily Accident Frequency Over Time", xlabel="Date",
+        ylabel="Number of Accidents", figsize=(14, 7), color='navy')
+def daily_accidents(analysis):
+    """Accidents per calendar date (days without accidents are absent)."""
+    return _counts(analysis, 'Date').sort_index()
+
+
+@result(1, ['Date'])
+def daily_counts(analysis):
+    """Dense, zero-filled DailyCounts per Region and Severity."""
+    return DailyCounts.from_frame(analysis.frame(['Date'] + DAILY_KEYS))
+
+
+@result(1, ['Date'], 'line', title="Rolling Average of Daily Accidents", xlabel="Date",
+        ylabel="Accidents per Day", figsize=(14, 7))
+def daily_rolling_average(analysis):
+    """Trailing 7-, 30- and 365-day averages of the daily accident count."""
+    return analysis.get('daily_counts').rolling().drop(columns='count')
+
+
+@result(1, ['Date'])
+def monthly_year_over_year(analysis):
+    """Accidents per month next to the same month a year earlier."""
+    return analysis.get('daily_counts').year_over_year('M')
+
+
+@result(1, ['Date'])
+def daily_anomalies(analysis):
+    """Days 3+ standard deviations off the mean for their month and weekday."""
+    return analysis.get('daily_counts').anomalies()
+
+
+# =============================================================================
+# 2. Geographical Distribution
+# =============================================================================
+@result(2, ['City'], 'bar', title="Top 10 Cities with Highest Accident Frequency", xlabel="City",
+        ylabel="Number of Accidents", palette='Reds_d', figsize=(12, 6), rotate_xticks=True)
+def top_cities(analysis):
+    """The 10 cities with the most accidents."""
+    return _counts(analysis, 'City').head(10)
+
+
+@result(2, ['Intersection'], 'bar', title="Top 10 Intersections with Highest Accident Frequency",
+        xlabel="Intersection", ylabel="Number of Accidents", palette='Reds_d', figsize=(12, 6),
+        rotate_xticks=True)
+def top_intersections(analysis):
+    """The 10 intersections with the most accidents."""
+    return _counts(analysis, 'Intersection').head(10)
+
+
+@result(2, ['Region'], 'bar', title="Accident Distribution by Region/Zone", xlabel="Region/Zone",
+        ylabel="Number of Accidents", palette='coolwarm', figsize=(12, 6), rotate_xticks=True)
+def accidents_by_region(analysis):
+    """Accidents per region."""
+    return _counts(analysis, 'Region')
+
+
+@result(2, ['Latitude', 'Longitude'], 'density', title="Geographical Hotspots of Accidents")
+def hotspot_cells(analysis):
+    """Accident counts per 0.01 degree grid cell and Severity (HotspotCells)."""
+    from road_accidents.hotspots import HotspotAccumulator
+    columns = ['Latitude', 'Longitude'] + (['Severity'] if analysis.has('Severity') else [])
+    return HotspotAccumulator().update(analysis.frame(columns)).result()
+
+
+# =============================================================================
+# 3. Accident Severity Analysis
+# =============================================================================
+@result(3, ['Severity'], 'bar', title="Distribution of Accident Severities", xlabel="Accident Severity",
+        ylabel="Count", palette='Set2', figsize=(8, 6))
+def severity_counts(analysis):
+    """Accidents per Severity level."""
+    return _counts(analysis, 'Severity')
+
+
+@result(3, ['Severity'])
+def fatal_percentage(analysis):
+    """Percentage of accidents that were fatal."""
+    counts = analysis.get('severity_counts')
+    if counts.sum() == 0:
+        return float('nan')
+    return float(counts.get('Fatal', 0) / counts.sum() * 100)
+
+
+@result(3, ['Severity'])
+def serious_percentage(analysis):
+    """Percentage of accidents that were serious."""
+    counts = analysis.get('severity_counts')
+    if counts.sum() == 0:
+        return float('nan')
+    return float(counts.get('Serious', 0) / counts.sum() * 100)
+
+
+@result(3, ['Severity'])
+def severity_percentage_intervals(analysis):
+    """Fatal/serious percentages with 95% bootstrap confidence intervals."""
+    return proportion_intervals(analysis.get('severity_counts'), ('Fatal', 'Serious'))
+
+
+@result(3, ['Severity', 'Hour', 'Month'], 'heatmap', title="Correlation Matrix of Severity and Time Factors",
+        figsize=(6, 4))
+def severity_time_correlation(analysis):
+    """Correlation of numeric Severity (Minor=1 .. Fatal=3) with Hour and Month."""
+    frame = analysis.frame(['Severity', 'Hour', 'Month'])
+    numeric = pd.DataFrame({
+        'Severity_Numeric': frame['Severity'].map(SEVERITY_MAPPING).astype(float),
+        'Hour': frame['Hour'].astype(float),
+        'Month': frame['Month'].astype(float),
+    })
+    return numeric.corr()
+
+
+# =============================================================================
+# 4. Demographic Insights
+# =============================================================================
+@result(4, ['Age'], 'hist', title="Distribution of Age of Individuals Involved in Accidents", xlabel="Age",
+        ylabel="Frequency", color='skyblue')
+def age_distribution(analysis):
+    """Accidents per age (for histograms)."""
+    return _counts(analysis, 'Age').sort_index()
+
+
+@result(4, ['Age'], 'bar', title="Accident Frequency by Age Group", xlabel="Age Group",
+        ylabel="Number of Accidents", palette='magma')
+def accidents_by_age_group(analysis):
+    """Accidents per age group (0-18, 19-30, 31-45, 46-60, 60+)."""
+    ages = analysis.get('age_distribution')
+    groups = pd.cut(ages.index, bins=AGE_BINS, labels=AGE_LABELS, right=False)
+    return ages.groupby(groups, observed=False).sum()
+
+
+@result(4, ['Gender'], 'bar', title="Gender Distribution of Individuals Involved in Accidents",
+        xlabel="Gender", ylabel="Count", palette='pastel', figsize=(8, 6))
+def gender_distribution(analysis):
+    """Accidents per gender."""
+    return _counts(analysis, 'Gender')
+
+
+@result(4, ['Gender', 'Age'])
+def age_by_gender(analysis):
+    """Age summary statistics per gender."""
+    frame = analysis.frame(['Gender', 'Age'])
+    return frame.groupby('Gender', observed=True)['Age'].describe()
+
+
+@result(4, ['Gender', 'Age'])
+def age_by_gender_tests(analysis):
+    """Mann-Whitney and KS tests of Age between each pair of genders."""
+    frame = analysis.frame(['Gender', 'Age'])
+    return compare_groups(frame.groupby(['Gender', 'Age'], observed=True).size().unstack(fill_value=0))
+
+
+# =============================================================================
+# 5. Environmental and Road Conditions
+# =============================================================================
+@result(5, ['Weather'], 'bar', title="Accident Frequency by Weather Condition", xlabel="Weather Condition",
+        ylabel="Number of Accidents", palette='cool', figsize=(12, 6), rotate_xticks=True)
+def accidents_by_weather(analysis):
+    """Accidents per weather condition."""
+    return _counts(analysis, 'Weather')
+
+
+@result(5, ['Road_Type'], 'bar', title="Accident Frequency by Road Type", xlabel="Road Type",
+        ylabel="Number of Accidents", palette='autumn', figsize=(12, 6), rotate_xticks=True)
+def accidents_by_road_type(analysis):
+    """Accidents per road type."""
+    return _counts(analysis, 'Road_Type')
+
+
+@result(5, ['Lighting'], 'bar', title="Accident Frequency by Lighting Condition",
+        xlabel="Lighting Condition", ylabel="Number of Accidents", palette='winter', figsize=(12, 6),
+        rotate_xticks=True)
+def accidents_by_lighting(analysis):
+    """Accidents per lighting condition."""
+    return _counts(analysis, 'Lighting')
+
+
+# =============================================================================
+# 6. Vehicle and Driver Information
+# =============================================================================
+@result(6, ['Vehicle_Type'], 'bar', title="Accident Frequency by Vehicle Type", xlabel="Vehicle Type",
+        ylabel="Number of Accidents", palette='Spectral', figsize=(12, 6), rotate_xticks=True)
+def accidents_by_vehicle_type(analysis):
+    """Accidents per vehicle type."""
+    return _counts(analysis, 'Vehicle_Type')
+
+
+def _long_crosstab(analysis, row, column):
+    frame = analysis.frame([row, column])
+    table = frame.groupby([row, column], observed=True).size()
+    table.name = 'count'
+    return table.reset_index()
+
+
+@result(6, ['Vehicle_Type', 'Severity'], 'grouped_bar', title="Accident Severity by Vehicle Type",
+        xlabel="Vehicle Type", ylabel="Count", palette='Accent', x='Vehicle_Type', hue='Severity',
+        figsize=(12, 6), rotate_xticks=True)
+def severity_by_vehicle_type(analysis):
+    """Accidents per (Vehicle_Type, Severity), long format."""
+    return _long_crosstab(analysis, 'Vehicle_Type', 'Severity')
+
+
+@result(6, ['Driver_Experience'], 'hist', title="Distribution of Driver Experience",
+        xlabel="Years of Experience", ylabel="Frequency", color='olive')
+def driver_experience(analysis):
+    """Accidents per year of driver experience."""
+    return _counts(analysis, 'Driver_Experience').sort_index()
+
+
+@result(6, ['Speeding'], 'bar', title="Frequency of Accidents Involving Speeding", xlabel="Speeding (Yes/No)",
+        ylabel="Number of Accidents", palette='coolwarm', figsize=(8, 6))
+def speeding(analysis):
+    """Accidents with and without speeding."""
+    return _counts(analysis, 'Speeding')
+
+
+@result(6, ['Seatbelt_Usage'], 'bar', title="Frequency of Accidents by Seatbelt Usage",
+        xlabel="Seatbelt Usage (Yes/No)", ylabel="Number of Accidents", palette='coolwarm', figsize=(8, 6))
+def seatbelt_usage(analysis):
+    """Accidents with and without seatbelt use."""
+    return _counts(analysis, 'Seatbelt_Usage')
+
+
+# =============================================================================
+# 7. Temporal Patterns
+# =============================================================================
+@result(7, ['DayOfWeek'], 'bar', title="Accident Frequency: Weekdays vs. Weekends",
+        xlabel="Is Weekend (True/False)", ylabel="Number of Accidents", palette='pastel', figsize=(8, 6))
+def weekday_vs_weekend(analysis):
+    """Accidents on weekdays (False) and weekends (True); rows without a Date count as weekdays."""
+    by_day = analysis.get('accidents_per_day_of_week')
+    weekend = int(by_day[DAYS_ORDER[5:]].sum())
+    return pd.Series([len(analysis.column('DayOfWeek')) - weekend, weekend],
+                     index=pd.Index([False, True], name='Is_Weekend'), name='count')
+
+
+# =============================================================================
+# 8. Contributing Factors
+# =============================================================================
+def _factor_tables(analysis, by=()):
+    # Records may list several factors ("Speeding;Wet road"); count each one
+    frame = analysis.frame(['Contributing_Factors'] + list(by))
+    return FactorTables.from_frame(frame, by=by)
+
+
+@result(8, ['Contributing_Factors'], 'bar', title="Top 10 Contributing Factors to Accidents",
+        xlabel="Contributing Factor", ylabel="Count", palette='mako', figsize=(12, 6), rotate_xticks=True)
+def top_contributing_factors(analysis):
+    """The 10 factors mentioned by the most accidents."""
+    return analysis.get('factor_counts').head(10)
+
+
+@result(8, ['Contributing_Factors'])
+def factor_counts(analysis):
+    """Accidents mentioning each individual contributing factor."""
+    return _factor_tables(analysis).counts
+
+
+@result(8, ['Contributing_Factors', 'Severity'], 'grouped_bar', title="Contributing Factors by Accident Severity",
+        xlabel="Contributing Factor", ylabel="Count", palette='viridis', x='Contributing_Factors',
+        hue='Severity', figsize=(12, 6), rotate_xticks=True)
+def factors_by_severity(analysis):
+    """Accidents per (factor, Severity), long format."""
+    return _factor_tables(analysis, ['Severity']).long_crosstab('Severity')
+
+
+@result(8, ['Contributing_Factors', 'Region'], 'grouped_bar', title="Contributing Factors by Region",
+        xlabel="Contributing Factor", ylabel="Count", palette='Spectral', x='Contributing_Factors',
+        hue='Region', figsize=(12, 6), rotate_xticks=True)
+def factors_by_region(analysis):
+    """Accidents per (factor, Region), long format."""
+    return _factor_tables(analysis, ['Region']).long_crosstab('Region')
+
+
+@result(8, ['Contributing_Factors'], 'heatmap', title="Co-occurrence of Contributing Factors",
+        xlabel="Contributing Factor", ylabel="Contributing Factor", figsize=(10, 8), fmt='d', cmap='mako')
+def factor_cooccurrence(analysis):
+    """Accidents listing both factors, for every pair of factors (diagonal: factor_counts)."""
+    return _factor_tables(analysis).cooccurrence
+
+
+# =============================================================================
+# 9. Injury and Fatality Analysis
+# =============================================================================
+@result(9, ['Road_User'], 'bar', title="Accident Frequency by Road User Type", xlabel="Road User",
+        ylabel="Number of Accidents", palette='Set1', figsize=(12, 6))
+def accidents_by_road_user(analysis):
+    """Accidents per road user type."""
+    return _counts(analysis, 'Road_User')
+
+
+@result(9, ['Injury_Count'])
+def total_injuries(analysis):
+    """Total Injury_Count over all accidents."""
+    return int(analysis.column('Injury_Count').sum())
+
+
+@result(9, ['Fatality_Count'])
+def total_fatalities(analysis):
+    """Total Fatality_Count over all accidents."""
+    return int(analysis.column('Fatality_Count').sum())
+
+
+@result(9, ['Vehicle_Type', 'Injury_Count'])
+def injuries_by_vehicle_type(analysis):
+    """Injury_Count summary statistics per vehicle type."""
+    frame = analysis.frame(['Vehicle_Type', 'Injury_Count'])
+    return frame.groupby('Vehicle_Type', observed=True)['Injury_Count'].describe()
+
+
+@result(9, ['Speeding', 'Fatality_Count'])
+def fatalities_by_speeding(analysis):
+    """Fatality_Count summary statistics with and without speeding."""
+    frame = analysis.frame(['Speeding', 'Fatality_Count'])
+    return frame.groupby('Speeding', observed=True)['Fatality_Count'].describe()
+
+
+@result(9, ['Speeding', 'Fatality_Count'])
+def fatalities_by_speeding_tests(analysis):
+    """Mann-Whitney and KS tests of Fatality_Count with vs. without speeding."""
+    frame = analysis.frame(['Speeding', 'Fatality_Count'])
+    return compare_groups(frame.groupby(['Speeding', 'Fatality_Count'], observed=True).size().unstack(fill_value=0))
+
+
+# =============================================================================
+# 10. Comparative Analysis
+# =============================================================================
+@result(10, ['Region', 'Year'], 'grouped_bar', title="Accident Frequency by Region and Year", xlabel="Region",
+        ylabel="Number of Accidents", palette='tab10', x='Region', hue='Year', figsize=(12, 6),
+        rotate_xticks=True)
+def region_by_year(analysis):
+    """Accidents per (Region, Year), long format."""
+    return _long_crosstab(analysis, 'Region', 'Year')
+
+
+@result(10, ['Area_Type'], 'bar', title="Accident Frequency: Urban vs. Rural", xlabel="Area Type",
+        ylabel="Number of Accidents", palette='Set2', figsize=(8, 6))
+def urban_vs_rural(analysis):
+    """Accidents in urban and rural areas."""
+    return _counts(analysis, 'Area_Type')
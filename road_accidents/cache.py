@@ -0,0 +1,205 @@
+# =============================================================================
+# Road Accident Analysis - Columnar Cache of the Preprocessed Frame
+# =============================================================================
+#
+# Parsing the CSV and deriving Date/Year/Month/DayOfWeek/Hour dominates start-up
+# time. AccidentCache keeps the preprocessed frame as an uncompressed Feather
+# (Arrow IPC) file next to a small JSON sidecar describing the source file it
+# was built from. Later runs memory-map the Feather file and read only the
+# columns they ask for; the cache is rebuilt automatically when the CSV changes.
+#
+# Feather support needs pyarrow. Without it the cache falls back to loading
+# the CSV directly.
+
+import hashlib
+import json
+import os
+import warnings
+
+from road_accidents.ingest import load_accidents
+from road_accidents.parsing import ParseReport
+
+DEFAULT_CACHE_DIR = '.accident_cache'
+
+# Bump when the preprocessing changes so existing caches are rebuilt
+CACHE_VERSION = 2
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_stem(source):
+    """Name for files derived from `source`: its stem plus a hash of its absolute path.
+
+    The hash keeps same-named CSVs from different directories from sharing
+    (and endlessly rebuilding) one cache entry.
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    path_hash = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:10]
+    return '{}-{}'.format(stem, path_hash)
+
+
+def source_signature(path):
+    """Size, mtime and content hash identifying a version of a source file."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_digest(path)}
+
+
+def source_unchanged(meta, path):
+    """True when `meta` (holding a source_signature) still describes `path`.
+
+    Size and mtime are checked first; only when the mtime differs is the file
+    hashed, so touching the CSV without changing it keeps derived files. In
+    that case meta['mtime_ns'] is updated and the caller should save it.
+    """
+    stat = os.stat(path)
+    if meta.get('size') != stat.st_size:
+        return False
+    if meta.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if meta.get('sha256') != file_digest(path):
+        return False
+    meta['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+def read_json(path):
+    """Parsed JSON file, or None if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """Write JSON atomically (via a temporary file and rename)."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _have_pyarrow():
+    try:
+        import pyarrow.feather  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class AccidentCache:
+    """Feather cache of the preprocessed accident frame for one CSV file."""
+
+    def __init__(self, source, cache_dir=DEFAULT_CACHE_DIR):
+        self.source = source
+        self.cache_dir = cache_dir
+        stem = cache_stem(source)
+        self.data_path = os.path.join(cache_dir, stem + '.feather')
+        self.meta_path = os.path.join(cache_dir, stem + '.meta.json')
+
+    # -------------------------------------------------------------------------
+    # Freshness
+    # -------------------------------------------------------------------------
+    def _read_meta(self):
+        return read_json(self.meta_path)
+
+    def is_fresh(self):
+        """True when the cache matches the current source file."""
+        meta = self._read_meta()
+        if meta is None or meta.get('version') != CACHE_VERSION:
+            return False
+        if not os.path.exists(self.data_path):
+            return False
+        mtime_ns = meta.get('mtime_ns')
+        if not source_unchanged(meta, self.source):
+            return False
+        if meta['mtime_ns'] != mtime_ns:
+            # Same contents, new mtime: save it so the hash is skipped next time
+            self._write_meta(meta)
+        return True
+
+    def _write_meta(self, meta):
+        write_json(self.meta_path, meta)
+
+    # -------------------------------------------------------------------------
+    # Build / read
+    # -------------------------------------------------------------------------
+    def build(self, df=None, report=None):
+        """(Re)build the cache from the source CSV, or from an already loaded frame.
+
+        The parse report of the build is stored in the sidecar, so cache hits
+        can still show which rows had unparseable dates.
+        """
+        from pyarrow import feather
+
+        signature = source_signature(self.source)
+        if df is None:
+            report = ParseReport()
+            df = load_accidents(self.source, report=report)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.data_path + '.tmp'
+        # Uncompressed so the file can be memory-mapped without a decode step
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, self.data_path)
+        self._write_meta({
+            'version': CACHE_VERSION,
+            'source': os.path.abspath(self.source),
+            **signature,
+            'columns': list(df.columns),
+            'rows': len(df),
+            'parse_report': report.to_dict() if report is not None else None,
+        })
+        return df
+
+    def parse_report(self):
+        """ParseReport recorded when the cache was built (None if unknown)."""
+        meta = self._read_meta()
+        if not meta or not meta.get('parse_report'):
+            return None
+        return ParseReport.from_dict(meta['parse_report'])
+
+    def columns(self):
+        """Column names of the cached frame (builds the cache if needed)."""
+        self.ensure()
+        return self._read_meta()['columns']
+
+    def rows(self):
+        """Row count of the cached frame (builds the cache if needed)."""
+        self.ensure()
+        return self._read_meta()['rows']
+
+    def ensure(self):
+        """Rebuild the cache if it is missing or stale. Returns True if rebuilt."""
+        if self.is_fresh():
+            return False
+        self.build()
+        return True
+
+    def read(self, columns=None):
+        """Load the preprocessed frame, or just `columns` of it, via memory-mapping."""
+        if not _have_pyarrow():
+            warnings.warn("pyarrow is not installed; reading the CSV without a cache")
+            return load_accidents(self.source, usecols=columns)
+
+        from pyarrow import feather
+
+        if not self.is_fresh():
+            df = self.build()
+            return df if columns is None else df[[c for c in columns if c in df.columns]]
+        if columns is not None:
+            cached = self._read_meta()['columns']
+            columns = [c for c in columns if c in cached]
+        table = feather.read_table(self.data_path, columns=columns, memory_map=True)
+        return table.to_pandas()
+
+
+def load_cached_accidents(path, columns=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Drop-in replacement for load_accidents() that goes through the Feather cache."""
+    return AccidentCache(path, cache_dir).read(columns)
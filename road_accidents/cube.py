@@ -0,0 +1,450 @@
+# =============================================================================
+# Road Accident Analysis - Precomputed Accident Cube
+# =============================================================================
+#
+# Accident counts and injury/fatality sums pre-aggregated over the time,
+# location and condition dimensions of the analysis, so ad-hoc variations of
+# the fixed charts ("accidents by Hour for the North region in rain",
+# "Severity by Vehicle_Type on weekends") are answered from the cube instead
+# of the raw rows:
+#
+#   >>> cube = AccidentCube.for_source("road-accident-data.csv")
+#   >>> cube.query('Hour', where={'Region': 'North', 'Weather': 'Rain'})
+#   >>> cube.pivot('Vehicle_Type', 'Severity', where={'Is_Weekend': True})
+#
+# Only the non-empty cells are stored: one small integer code array per
+# dimension (int8 for up to 127 levels) plus one array per measure. A query
+# masks the cells by the `where` codes and bincounts the measures over the
+# `by` codes, so its cost depends on the number of cells, not rows.
+#
+# With ten dimensions the base cells are nearly as many as the rows, so the
+# low-dimensional roll-ups (cuboids) that the analysis asks for are stored as
+# well, and a query is answered from the smallest cuboid covering its `by`
+# and `where` dimensions; only other combinations scan the base cells.
+# Is_Weekend is not stored at all: it is derived from DayOfWeek at query time.
+#
+# The cube is saved as .npy files next to the Feather cache and memory-mapped
+# on load.
+#
+# Usage:
+#   python -m road_accidents.cube road-accident-data.csv --by Hour --where Region=North --where Weather=Rain
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.cache import DEFAULT_CACHE_DIR, cache_stem, read_json, source_signature, source_unchanged, write_json
+from road_accidents.ingest import DAYS_ORDER, RunningCounts, iter_accident_chunks
+
+CUBE_DIMENSIONS = [
+    'Year', 'Month', 'DayOfWeek', 'Hour',
+    'Region', 'Weather', 'Road_Type', 'Lighting', 'Vehicle_Type', 'Severity',
+]
+
+# Dimensions computed from a stored one at query time:
+# name -> (stored dimension, function of its level)
+DERIVED_DIMENSIONS = {'Is_Weekend': ('DayOfWeek', lambda day: day in DAYS_ORDER[5:])}
+
+# Roll-ups materialized next to the base cells (section 10d and the
+# per-period summaries)
+CUBOIDS = [
+    ('Hour', 'Region', 'Weather'),
+    ('DayOfWeek', 'Vehicle_Type', 'Severity'),
+    ('Year', 'Month', 'Region', 'Severity'),
+]
+
+# measure name -> source column (None counts rows)
+CUBE_MEASURES = {'count': None, 'injuries': 'Injury_Count', 'fatalities': 'Fatality_Count'}
+
+# Bump when the on-disk layout changes
+CUBE_VERSION = 2
+
+# Rows per chunk when building from the CSV
+BUILD_CHUNK_SIZE = 500_000
+
+# Above this many `by` combinations, query() groups with np.unique instead of
+# a dense bincount
+_DENSE_GROUPS = 1 << 22
+
+
+def _code_dtype(n_levels):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_levels < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _sorted_levels(dim, levels):
+    if dim == 'DayOfWeek':
+        return sorted(levels, key=lambda day: DAYS_ORDER.index(day) if day in DAYS_ORDER else len(DAYS_ORDER))
+    try:
+        return sorted(levels)
+    except TypeError:
+        return sorted(levels, key=str)
+
+
+def _python_value(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    # Year/Month/Hour are floats when some dates failed to parse
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _cuboid_dirname(dims):
+    return 'cuboid-{}'.format('-'.join(dims))
+
+
+class CubeBuilder:
+    """Accumulates the cube cells chunk by chunk (codes assigned as levels appear)."""
+
+    def __init__(self, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, cuboids=CUBOIDS):
+        self.dimensions = list(dimensions)
+        self.measures = dict(measures)
+        self.cuboids = [tuple(dims) for dims in cuboids]
+        self.total_rows = 0
+        self._levels = {dim: [] for dim in self.dimensions}
+        # Chunk cells are buffered and summed about once per doubling of the
+        # cell table, not re-grouped with every chunk
+        self._cells = RunningCounts()
+
+    def required_columns(self):
+        needed = list(self.dimensions)
+        needed.extend(col for col in self.measures.values() if col)
+        return list(dict.fromkeys(needed))
+
+    def _codes(self, dim, values):
+        levels = self._levels[dim]
+        seen = pd.Index(levels)
+        new = pd.unique(values.dropna())
+        new = [value for value in new if value not in seen]
+        if new:
+            levels.extend(_python_value(value) for value in new)
+            seen = pd.Index(levels)
+        # Missing (and unparseable) values get code -1
+        return seen.get_indexer(values)
+
+    def update(self, chunk):
+        self.total_rows += len(chunk)
+        columns = {}
+        for dim in self.dimensions:
+            if dim in chunk.columns:
+                values = chunk[dim]
+            else:
+                values = pd.Series(np.nan, index=chunk.index)
+            columns[dim] = self._codes(dim, pd.Series(values).astype(object))
+        for name, col in self.measures.items():
+            if col is None:
+                columns[name] = np.ones(len(chunk), dtype=np.int64)
+            elif col in chunk.columns:
+                columns[name] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+            else:
+                columns[name] = np.zeros(len(chunk))
+        self._cells.add(pd.DataFrame(columns).groupby(self.dimensions, sort=False).sum())
+        return self
+
+    def result(self):
+        """The finished AccidentCube, with each dimension's levels sorted and the cuboids rolled up."""
+        cells = self._cells.total()
+        if cells is None:
+            cells = pd.DataFrame(columns=self.dimensions + list(self.measures)).set_index(self.dimensions)
+        codes = {}
+        levels = {}
+        for i, dim in enumerate(self.dimensions):
+            raw = self._levels[dim]
+            ordered = _sorted_levels(dim, raw)
+            # old code -> new code, with -1 (missing) kept at -1
+            remap = np.append(pd.Index(ordered).get_indexer(raw), -1)
+            old = np.asarray(cells.index.get_level_values(i), dtype=np.int64)
+            codes[dim] = remap[old].astype(_code_dtype(len(ordered)))
+            levels[dim] = ordered
+        measures = {}
+        for name in self.measures:
+            values = cells[name].to_numpy(dtype=np.float64)
+            if np.array_equal(values, np.round(values)):
+                values = pd.to_numeric(pd.Series(values.astype(np.int64)), downcast='integer').to_numpy()
+            measures[name] = values
+        return AccidentCube(codes, measures, levels, {'rows': self.total_rows}).materialize(self.cuboids)
+
+
+class AccidentCube:
+    """Sparse cube of accident counts and injury/fatality sums."""
+
+    def __init__(self, codes, measures, levels, meta=None, cuboids=None):
+        self.dimensions = list(levels)
+        self.measure_names = list(measures)
+        self.codes = codes
+        self.measures = measures
+        self.levels = levels
+        self.meta = meta or {}
+        # dimensions tuple -> AccidentCube rolled up to them
+        self.cuboids = cuboids or {}
+
+    def __repr__(self):
+        return "AccidentCube({} cells, dimensions={})".format(self.cells, self.dimensions)
+
+    @property
+    def cells(self):
+        return len(self.measures[self.measure_names[0]]) if self.measure_names else 0
+
+    # -------------------------------------------------------------------------
+    # Construction and persistence
+    # -------------------------------------------------------------------------
+    @classmethod
+    def build(cls, df, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, cuboids=CUBOIDS):
+        """Build the cube from an in-memory frame."""
+        return CubeBuilder(dimensions, measures, cuboids).update(df).result()
+
+    @classmethod
+    def stream(cls, path, chunksize, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, cuboids=CUBOIDS,
+               report=None):
+        """Build the cube from the CSV one chunk at a time."""
+        builder = CubeBuilder(dimensions, measures, cuboids)
+        for chunk in iter_accident_chunks(path, chunksize, usecols=builder.required_columns(), report=report):
+            builder.update(chunk)
+        return builder.result()
+
+    def save(self, directory, extra_meta=None):
+        os.makedirs(directory, exist_ok=True)
+        for dim in self.dimensions:
+            np.save(os.path.join(directory, 'dim-{}.npy'.format(dim)), self.codes[dim])
+        for name in self.measure_names:
+            np.save(os.path.join(directory, 'measure-{}.npy'.format(name)), self.measures[name])
+        write_json(os.path.join(directory, 'meta.json'), {
+            **self.meta,
+            **(extra_meta or {}),
+            'version': CUBE_VERSION,
+            'levels': [[dim, [_python_value(level) for level in self.levels[dim]]] for dim in self.dimensions],
+            'measures': self.measure_names,
+            'cuboids': [list(dims) for dims in self.cuboids],
+        })
+        for dims, cuboid in self.cuboids.items():
+            cuboid.save(os.path.join(directory, _cuboid_dirname(dims)))
+
+    @classmethod
+    def load(cls, directory):
+        """Open a saved cube; the arrays are memory-mapped, not read."""
+        meta = read_json(os.path.join(directory, 'meta.json'))
+        levels = {dim: dim_levels for dim, dim_levels in meta['levels']}
+        codes = {dim: np.load(os.path.join(directory, 'dim-{}.npy'.format(dim)), mmap_mode='r')
+                 for dim in levels}
+        measures = {name: np.load(os.path.join(directory, 'measure-{}.npy'.format(name)), mmap_mode='r')
+                    for name in meta['measures']}
+        cuboids = {tuple(dims): cls.load(os.path.join(directory, _cuboid_dirname(dims)))
+                   for dims in meta.get('cuboids', [])}
+        return cls(codes, measures, levels, meta, cuboids)
+
+    @classmethod
+    def for_source(cls, path, cache_dir=DEFAULT_CACHE_DIR, chunksize=BUILD_CHUNK_SIZE):
+        """Load the saved cube for a CSV, (re)building it chunk by chunk if missing or stale."""
+        stem = cache_stem(path)
+        directory = os.path.join(cache_dir, '{}.cube'.format(stem))
+        meta = read_json(os.path.join(directory, 'meta.json'))
+        if meta is not None and meta.get('version') == CUBE_VERSION:
+            mtime_ns = meta.get('mtime_ns')
+            if source_unchanged(meta, path):
+                if meta['mtime_ns'] != mtime_ns:
+                    write_json(os.path.join(directory, 'meta.json'), meta)
+                return cls.load(directory)
+
+        signature = source_signature(path)
+        cls.stream(path, chunksize).save(directory, signature)
+        return cls.load(directory)
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+    def _stored(self, dim):
+        # The stored dimension a (possibly derived) dimension is read from
+        if dim in self.levels:
+            return dim
+        if dim in DERIVED_DIMENSIONS and DERIVED_DIMENSIONS[dim][0] in self.levels:
+            return DERIVED_DIMENSIONS[dim][0]
+        raise KeyError("{!r} is not a cube dimension ({})".format(
+            dim, ', '.join(self.dimensions + [d for d in DERIVED_DIMENSIONS if d not in self.levels])))
+
+    def dimension_levels(self, dim):
+        """Sorted levels of a stored or derived dimension."""
+        source = self._stored(dim)
+        if source == dim:
+            return self.levels[dim]
+        derive = DERIVED_DIMENSIONS[dim][1]
+        return _sorted_levels(dim, {derive(level) for level in self.levels[source]})
+
+    def dimension_codes(self, dim):
+        """Per-cell level codes (-1: missing) of a stored or derived dimension."""
+        source = self._stored(dim)
+        codes = np.asarray(self.codes[source], dtype=np.int64)
+        if source == dim:
+            return codes
+        derive = DERIVED_DIMENSIONS[dim][1]
+        levels = self.dimension_levels(dim)
+        # Trailing -1 maps missing source values to missing
+        lookup = np.array([levels.index(derive(level)) for level in self.levels[source]] + [-1], dtype=np.int64)
+        return lookup[codes]
+
+    def rollup(self, dims):
+        """The cube aggregated to stored dimensions `dims` (missing values kept as their own group)."""
+        dims = list(dims)
+        shape = tuple(len(self.levels[dim]) + 1 for dim in dims)
+        # Shift codes by one so missing (-1) becomes group 0
+        codes = [np.asarray(self.codes[dim], dtype=np.int64) + 1 for dim in dims]
+        keys = np.ravel_multi_index(codes, shape) if self.cells else np.empty(0, dtype=np.int64)
+        groups, inverse = np.unique(keys, return_inverse=True)
+        group_codes = np.unravel_index(groups, shape)
+        rolled_codes = {dim: (c - 1).astype(_code_dtype(len(self.levels[dim]))) for dim, c in zip(dims, group_codes)}
+        measures = {}
+        for name in self.measure_names:
+            values = np.asarray(self.measures[name])
+            total = np.bincount(inverse, weights=values, minlength=len(groups))
+            measures[name] = total.astype(np.int64) if np.issubdtype(values.dtype, np.integer) else total
+        return AccidentCube(rolled_codes, measures, {dim: self.levels[dim] for dim in dims},
+                            {'rows': self.meta.get('rows')})
+
+    def materialize(self, cuboids=CUBOIDS):
+        """Store roll-ups to each dimension tuple in `cuboids` (those the cube has); returns self."""
+        for dims in cuboids:
+            if all(dim in self.levels for dim in dims):
+                self.cuboids[tuple(dims)] = self.rollup(dims)
+        return self
+
+    def _smallest_cube(self, dims):
+        # The smallest materialized cuboid holding every needed dimension (else the base cells)
+        needed = {self._stored(dim) for dim in dims}
+        covering = [cuboid for key, cuboid in self.cuboids.items() if needed <= set(key)]
+        return min(covering, key=lambda cuboid: cuboid.cells) if covering else self
+
+    def _level_codes(self, dim, values):
+        levels = self.dimension_levels(dim)
+        if isinstance(values, slice):
+            # Inclusive range over ordered levels, e.g. Year=slice(2019, 2021)
+            return [i for i, level in enumerate(levels)
+                    if (values.start is None or level >= values.start)
+                    and (values.stop is None or level <= values.stop)]
+        if isinstance(values, (list, tuple, set, frozenset, range, np.ndarray, pd.Index)):
+            values = list(values)
+        else:
+            values = [values]
+        lookup = {level: i for i, level in enumerate(levels)}
+        return [lookup[value] for value in values if value in lookup]
+
+    def _mask(self, where):
+        mask = np.ones(self.cells, dtype=bool)
+        for dim, values in (where or {}).items():
+            codes = self._level_codes(dim, values)
+            # One spare slot at the end, which missing values (-1) index
+            allowed = np.zeros(len(self.dimension_levels(dim)) + 1, dtype=bool)
+            allowed[codes] = True
+            mask &= allowed[self.dimension_codes(dim)]
+        return mask
+
+    def slice(self, **where):
+        """Sub-cube of the cells matching `where` (dimension=value or list of values)."""
+        mask = self._mask(where)
+        codes = {dim: np.asarray(self.codes[dim])[mask] for dim in self.dimensions}
+        measures = {name: np.asarray(self.measures[name])[mask] for name in self.measure_names}
+        return AccidentCube(codes, measures, self.levels, self.meta)
+
+    def totals(self, where=None):
+        """Measure totals over the cells matching `where`."""
+        cube = self._smallest_cube(list(where or {}))
+        if cube is not self:
+            return cube.totals(where)
+        mask = self._mask(where)
+        return pd.Series({name: np.asarray(self.measures[name])[mask].sum() for name in self.measure_names})
+
+    def query(self, by=(), where=None, measures=None):
+        """Roll the cube up to the `by` dimensions, over the cells matching `where`.
+
+        `where` maps dimensions to a value, a list of values or an inclusive
+        slice; missing values never match. Returns a DataFrame indexed by the
+        `by` levels (empty groups omitted; rows with a missing `by` value are
+        left out) with one column per measure.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        cube = self._smallest_cube(by + list(where or {}))
+        if cube is not self:
+            return cube.query(by, where, measures)
+        measures = list(measures or self.measure_names)
+        mask = self._mask(where)
+        if not by:
+            return self.totals(where)[measures].to_frame().T
+
+        codes = [self.dimension_codes(dim)[mask] for dim in by]
+        present = np.logical_and.reduce([c >= 0 for c in codes])
+        codes = [c[present] for c in codes]
+        shape = tuple(len(self.dimension_levels(dim)) for dim in by)
+        keys = np.ravel_multi_index(codes, shape) if codes[0].size else np.empty(0, dtype=np.int64)
+
+        values = {name: np.asarray(self.measures[name])[mask][present] for name in measures}
+        counts = np.asarray(self.measures['count'])[mask][present] if 'count' in self.measures else None
+        if np.prod(shape, dtype=np.float64) <= _DENSE_GROUPS:
+            size = int(np.prod(shape))
+            sums = {name: np.bincount(keys, weights=vals, minlength=size) for name, vals in values.items()}
+            groups = np.flatnonzero(np.bincount(keys, weights=counts, minlength=size) if counts is not None
+                                    else np.bincount(keys, minlength=size))
+            sums = {name: total[groups] for name, total in sums.items()}
+        else:
+            groups, inverse = np.unique(keys, return_inverse=True)
+            sums = {name: np.bincount(inverse, weights=vals, minlength=len(groups)) for name, vals in values.items()}
+
+        index_codes = np.unravel_index(groups, shape)
+        index = pd.MultiIndex.from_arrays(
+            [pd.Index(self.dimension_levels(dim), dtype=object).take(c) for dim, c in zip(by, index_codes)],
+            names=by)
+        if len(by) == 1:
+            index = index.get_level_values(0)
+        frame = pd.DataFrame(sums, index=index)
+        for name in measures:
+            if np.issubdtype(np.asarray(self.measures[name]).dtype, np.integer):
+                frame[name] = frame[name].astype(np.int64)
+        return frame
+
+    def pivot(self, row, column, where=None, measure='count'):
+        """Two-dimensional roll-up of one measure (zero-filled), e.g. Severity by Vehicle_Type."""
+        return self.query([row, column], where, [measure])[measure].unstack(fill_value=0)
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def parse_where(cube, items):
+    """Turn DIM=VALUE[,VALUE...] strings into a `where` dict, matching levels by their text."""
+    where = {}
+    for item in items or []:
+        dim, _, text = item.partition('=')
+        try:
+            levels = cube.dimension_levels(dim)
+        except KeyError as e:
+            raise SystemExit(e.args[0])
+        wanted = set(text.split(','))
+        where[dim] = [level for level in levels if str(level) in wanted]
+    return where
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Slice and roll up the precomputed accident cube.")
+    parser.add_argument('data', help="accident CSV file")
+    parser.add_argument('--by', action='append', default=[], help="dimension to group by (repeatable)")
+    parser.add_argument('--where', action='append', default=[], metavar='DIM=VALUE[,VALUE]',
+                        help="keep only cells with these values (repeatable)")
+    parser.add_argument('--measure', action='append', default=None, choices=list(CUBE_MEASURES),
+                        help="measure to show (default: all)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    cube = AccidentCube.for_source(args.data)
+    print("Cube ready in {:.3f}s ({} cells from {} rows)".format(
+        time.perf_counter() - start, cube.cells, cube.meta.get('rows')))
+
+    start = time.perf_counter()
+    result = cube.query(args.by, parse_where(cube, args.where), args.measure)
+    print(result.to_string())
+    print("({:.3f}s)".format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# =============================================================================
+# Road Accident Analysis - Dtype Compaction
+# =============================================================================
+#
+# After loading, most descriptive columns (City, Region, Severity, Weather, ...)
+# are plain strings and the numeric ones are int64/float64. compact_dtypes()
+# turns low-cardinality string columns into categoricals and downcasts numeric
+# columns to the smallest width that still holds every value exactly, which
+# shrinks the frame and speeds up every value_counts()/groupby() afterwards.
+
+import numpy as np
+import pandas as pd
+
+# A string column becomes categorical when it has at most this many distinct
+# values per row
+MAX_UNIQUE_RATIO = 0.5
+
+
+def _is_string_column(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _compact_float(series):
+    # float32 only when every value survives the round trip (e.g. Year/Hour,
+    # which are floats only because of NaN); coordinates keep float64
+    as32 = series.astype(np.float32)
+    exact = (as32.astype(np.float64) == series) | series.isna()
+    return as32 if exact.all() else series
+
+
+def compact_series(series, max_unique_ratio=MAX_UNIQUE_RATIO):
+    """Return `series` in the most compact dtype that loses no information."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        return _compact_float(series)
+    if _is_string_column(series):
+        n_unique = series.nunique(dropna=True)
+        if len(series) and n_unique <= max_unique_ratio * len(series):
+            return series.astype('category')
+    return series
+
+
+def compact_dtypes(df, max_unique_ratio=MAX_UNIQUE_RATIO, columns=None):
+    """Compact the dtypes of `df` (or just `columns` of it).
+
+    Returns (compacted frame, report), where report is a DataFrame indexed by
+    column with the dtype and memory use before and after.
+    """
+    columns = list(df.columns) if columns is None else [c for c in columns if c in df.columns]
+    before = df.memory_usage(deep=True, index=False)
+    compacted = df.copy(deep=False)
+    for col in columns:
+        compacted[col] = compact_series(df[col], max_unique_ratio)
+    after = compacted.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        'dtype_before': df.dtypes.astype(str),
+        'dtype_after': compacted.dtypes.astype(str),
+        'bytes_before': before,
+        'bytes_after': after,
+    })
+    return compacted, report
+
+
+def format_memory_report(report):
+    """Human-readable summary of a compact_dtypes() report."""
+    total_before = report['bytes_before'].sum()
+    total_after = report['bytes_after'].sum()
+    ratio = total_before / total_after if total_after else float('nan')
+    changed = report[report['dtype_before'] != report['dtype_after']]
+    lines = ["Memory before: {:.2f} MB, after: {:.2f} MB ({:.1f}x smaller)".format(
+        total_before / 1e6, total_after / 1e6, ratio)]
+    for col, row in changed.iterrows():
+        lines.append("  {:<22} {:>10} -> {:<10} {:>10.2f} MB -> {:.2f} MB".format(
+            col, row['dtype_before'], row['dtype_after'],
+            row['bytes_before'] / 1e6, row['bytes_after'] / 1e6))
+    return "\n".join(lines)
@@ -0,0 +1,158 @@
+# =============================================================================
+# Road Accident Analysis - Multi-Valued Contributing Factors
+# =============================================================================
+#
+# A record's Contributing_Factors may list several factors
+# ("Speeding;Wet road;Fatigue"). Counting the raw strings treats every
+# combination as its own category, so section 8 works on factors instead:
+#
+#   * FactorMatrix splits each *distinct* string once into a sparse boolean
+#     combination x factor matrix (CSR arrays: indptr, indices).
+#   * Per-factor counts, factor x Severity / Region tables and factor
+#     co-occurrence are then bincounts over the matrix entries, weighted by
+#     how often each combination occurs.
+#
+# The weights come either from the rows (factorize, then bincount) or from
+# the per-combination counts and crosstabs the AccidentAggregator already
+# collects, so the tables are available when streaming or reading an
+# aggregate store too.
+
+import numpy as np
+import pandas as pd
+
+FACTOR_COLUMN = 'Contributing_Factors'
+FACTOR_SEPARATOR = ';'
+
+
+def split_factors(text, sep=FACTOR_SEPARATOR):
+    """Distinct, stripped factors of one Contributing_Factors value, in order."""
+    if not isinstance(text, str):
+        return []
+    return list(dict.fromkeys(part.strip() for part in text.split(sep) if part.strip()))
+
+
+class FactorMatrix:
+    """Sparse boolean matrix of distinct factor combinations x factors."""
+
+    def __init__(self, combos, sep=FACTOR_SEPARATOR):
+        self.combos = pd.Index(combos)
+        parsed = [split_factors(combo, sep) for combo in self.combos]
+        self.factors = pd.Index(sorted({factor for parts in parsed for factor in parts}), name='Factor')
+        lookup = {factor: i for i, factor in enumerate(self.factors)}
+        lengths = np.array([len(parts) for parts in parsed], dtype=np.int64)
+        self.indptr = np.concatenate([[0], np.cumsum(lengths)])
+        self.indices = np.fromiter((lookup[factor] for parts in parsed for factor in parts),
+                                   dtype=np.int64, count=int(lengths.sum()))
+        # Combination of every stored entry (the CSR row, repeated)
+        self._entry_combo = np.repeat(np.arange(len(self.combos)), lengths)
+
+    def __repr__(self):
+        return "FactorMatrix({} combinations x {} factors, {} entries)".format(
+            len(self.combos), len(self.factors), len(self.indices))
+
+    @classmethod
+    def from_series(cls, series, sep=FACTOR_SEPARATOR):
+        """Matrix of the distinct values of `series`, plus each row's combination code (-1 if missing)."""
+        codes, uniques = pd.factorize(series)
+        return cls(uniques, sep), codes
+
+    def _weights(self, weights):
+        # Align a per-combination Series with self.combos (0 for unseen ones)
+        if isinstance(weights, pd.Series):
+            return weights.reindex(self.combos, fill_value=0).to_numpy(dtype=np.float64)
+        return np.asarray(weights, dtype=np.float64)
+
+    def row_matrix(self, codes):
+        """rows x factors scipy.sparse CSR matrix for per-row combination codes (-1: no factors)."""
+        from scipy import sparse
+
+        codes = np.asarray(codes, dtype=np.int64)
+        row_lengths = np.where(codes >= 0, np.diff(self.indptr)[codes], 0)
+        indptr = np.concatenate([[0], np.cumsum(row_lengths)])
+        # Copy each row's slice of the combination entries
+        starts = np.repeat(self.indptr[np.maximum(codes, 0)], row_lengths)
+        offsets = np.arange(indptr[-1]) - np.repeat(indptr[:-1], row_lengths)
+        return sparse.csr_matrix((np.ones(indptr[-1], dtype=bool), self.indices[starts + offsets], indptr),
+                                 shape=(len(codes), len(self.factors)))
+
+    def counts(self, weights):
+        """Accidents mentioning each factor, most common first."""
+        weights = self._weights(weights)
+        totals = np.bincount(self.indices, weights=weights[self._entry_combo], minlength=len(self.factors))
+        counts = pd.Series(totals.astype(np.int64), index=self.factors, name='count')
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+    def crosstab(self, table):
+        """factor x column counts from a combination x column count table."""
+        table = table.reindex(self.combos, fill_value=0)
+        values = table.to_numpy(dtype=np.float64)[self._entry_combo]
+        out = np.zeros((len(self.factors), values.shape[1]))
+        for j in range(values.shape[1]):
+            out[:, j] = np.bincount(self.indices, weights=values[:, j], minlength=len(self.factors))
+        return pd.DataFrame(out.astype(np.int64), index=self.factors, columns=table.columns)
+
+    def cooccurrence(self, weights):
+        """factor x factor counts of accidents mentioning both (diagonal: the factor's count)."""
+        weights = self._weights(weights)
+        n = len(self.factors)
+        # Pair every entry with every entry of the same combination
+        lengths = np.diff(self.indptr)[self._entry_combo]
+        left = np.repeat(np.arange(len(self.indices)), lengths)
+        group_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        right = self.indptr[self._entry_combo[left]] + (np.arange(len(left)) - group_start)
+        flat = self.indices[left] * n + self.indices[right]
+        pairs = np.bincount(flat, weights=weights[self._entry_combo[left]], minlength=n * n)
+        return pd.DataFrame(pairs.reshape(n, n).astype(np.int64), index=self.factors, columns=self.factors)
+
+
+def combination_counts(series):
+    """Rows per distinct combination string (the weights FactorMatrix expects)."""
+    counts = pd.Series(series).value_counts(sort=False)
+    counts.index = pd.Index(np.asarray(counts.index), name=counts.index.name)
+    return counts[counts > 0]
+
+
+class FactorTables:
+    """Per-factor counts, factor crosstabs and co-occurrence for section 8."""
+
+    def __init__(self, counts, crosstabs, cooccurrence):
+        # Series: factor -> accidents mentioning it
+        self.counts = counts
+        # column -> DataFrame of factor x column counts
+        self.crosstabs = crosstabs
+        # DataFrame: factor x factor
+        self.cooccurrence = cooccurrence
+
+    @classmethod
+    def from_combinations(cls, combo_counts, combo_crosstabs=None, sep=FACTOR_SEPARATOR):
+        """Tables from per-combination counts and {column: combination x column} crosstabs."""
+        matrix = FactorMatrix(combo_counts.index, sep)
+        counts = matrix.counts(combo_counts)
+        crosstabs = {column: matrix.crosstab(table).loc[counts.index]
+                     for column, table in (combo_crosstabs or {}).items()}
+        cooccurrence = matrix.cooccurrence(combo_counts).loc[counts.index, counts.index]
+        return cls(counts, crosstabs, cooccurrence)
+
+    @classmethod
+    def from_frame(cls, df, by=('Severity', 'Region'), column=FACTOR_COLUMN, sep=FACTOR_SEPARATOR):
+        """Tables straight from the rows of a frame."""
+        combo_crosstabs = {}
+        for other in by:
+            if other in df.columns:
+                table = df.groupby([column, other], observed=True).size().unstack(fill_value=0)
+                table.index = pd.Index(np.asarray(table.index), name=column)
+                combo_crosstabs[other] = table
+        return cls.from_combinations(combination_counts(df[column]), combo_crosstabs, sep)
+
+    def top(self, n=10):
+        return self.counts.head(n)
+
+    def long_crosstab(self, column, top=None):
+        """factor x column table as a long frame (Contributing_Factors, column, count) for grouped bars."""
+        table = self.crosstabs[column]
+        if top is not None:
+            table = table.head(top)
+        table = table.stack()
+        table.name = 'count'
+        table.index.names = [FACTOR_COLUMN, column]
+        return table[table > 0].reset_index()
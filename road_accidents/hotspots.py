@@ -0,0 +1,151 @@
+# =============================================================================
+# Road Accident Analysis - Binned Hotspot Density
+# =============================================================================
+#
+# A scatter plot of every accident (section 2c) takes minutes and gigabytes at
+# millions of rows and ends up as an unreadable blob. Instead, the coordinates
+# are snapped to a fixed grid of cells (DEFAULT_CELL_SIZE degrees) and only
+# the per-cell counts for each Severity level are kept. Because the grid is
+# fixed, chunks can be folded in one at a time without knowing the extent in
+# advance. The cells are then re-binned into a raster of the requested
+# resolution and drawn as a density image, so rendering cost depends on the
+# grid size and not on the number of points.
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.ingest import RunningCounts
+
+# About 1.1 km of latitude per cell
+DEFAULT_CELL_SIZE = 0.01
+
+# Raster resolution (cells per axis) used for the density image
+DEFAULT_BINS = 300
+
+ALL_LEVELS = 'All'
+
+
+def cell_codes(lon, lat, cell_size=DEFAULT_CELL_SIZE):
+    """Integer grid cell (x, y) of each coordinate; NaN coordinates give -1 masks."""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    cx = np.floor(np.where(valid, lon, 0.0) / cell_size).astype(np.int64)
+    cy = np.floor(np.where(valid, lat, 0.0) / cell_size).astype(np.int64)
+    return cx, cy, valid
+
+
+class HotspotCells:
+    """Accident counts per grid cell and level (e.g. Severity)."""
+
+    def __init__(self, counts, cell_size=DEFAULT_CELL_SIZE, by='Severity'):
+        # Series indexed by (cx, cy, level)
+        self.counts = counts
+        self.cell_size = cell_size
+        self.by = by
+
+    @property
+    def levels(self):
+        return list(pd.unique(self.counts.index.get_level_values(2)))
+
+    def extent(self):
+        """(lon_min, lon_max, lat_min, lat_max) covering every occupied cell; None without cells."""
+        if not len(self.counts):
+            return None
+        cx = self.counts.index.get_level_values(0).to_numpy()
+        cy = self.counts.index.get_level_values(1).to_numpy()
+        size = self.cell_size
+        return (cx.min() * size, (cx.max() + 1) * size, cy.min() * size, (cy.max() + 1) * size)
+
+    def density(self, bins=DEFAULT_BINS, extent=None):
+        """Re-bin the cells into a raster per level (plus 'All').
+
+        Returns (rasters, extent) where rasters maps level -> 2-D array of
+        counts with shape (lat bins, lon bins), ready for imshow(origin='lower').
+        Without any cells (and no extent given) it is ({}, None).
+        """
+        extent = extent or self.extent()
+        if extent is None:
+            return {}, None
+        lon_min, lon_max, lat_min, lat_max = extent
+        # Cell centres carry the counts into the coarser raster
+        lon = (self.counts.index.get_level_values(0).to_numpy() + 0.5) * self.cell_size
+        lat = (self.counts.index.get_level_values(1).to_numpy() + 0.5) * self.cell_size
+        level = self.counts.index.get_level_values(2).to_numpy()
+        weights = self.counts.to_numpy(dtype=np.float64)
+
+        bin_range = [[lat_min, lat_max], [lon_min, lon_max]]
+        rasters = {}
+        for name in self.levels:
+            mask = level == name
+            rasters[name], _, _ = np.histogram2d(lat[mask], lon[mask], bins=bins,
+                                                 range=bin_range, weights=weights[mask])
+        rasters[ALL_LEVELS], _, _ = np.histogram2d(lat, lon, bins=bins, range=bin_range, weights=weights)
+        return rasters, extent
+
+    def top_cells(self, n=10, level=None):
+        """The n busiest cells, optionally for one level, as a DataFrame."""
+        counts = self.counts
+        if level is not None:
+            counts = counts[counts.index.get_level_values(2) == level]
+        totals = counts.groupby(level=[0, 1]).sum().nlargest(n)
+        frame = totals.rename('count').reset_index()
+        frame['lon'] = (frame['cx'] + 0.5) * self.cell_size
+        frame['lat'] = (frame['cy'] + 0.5) * self.cell_size
+        return frame[['lon', 'lat', 'count']]
+
+
+class HotspotAccumulator:
+    """Folds Latitude/Longitude (and Severity) of each chunk into grid-cell counts."""
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE, by='Severity'):
+        self.cell_size = cell_size
+        self.by = by
+        # Counts per (cx, cy, level), summed as the chunks arrive
+        self.counts = RunningCounts()
+
+    def update(self, chunk):
+        if 'Latitude' not in chunk.columns or 'Longitude' not in chunk.columns:
+            return self
+        cx, cy, valid = cell_codes(chunk['Longitude'], chunk['Latitude'], self.cell_size)
+        if self.by in chunk.columns:
+            level = chunk[self.by].astype(object).to_numpy()
+        else:
+            level = np.full(len(chunk), ALL_LEVELS, dtype=object)
+        keep = valid & pd.notna(level)
+        frame = pd.DataFrame({'cx': cx[keep], 'cy': cy[keep], 'level': level[keep]})
+        counts = frame.groupby(['cx', 'cy', 'level'], sort=False).size()
+        self.counts.add(counts)
+        return self
+
+    def result(self):
+        counts = self.counts.total()
+        if counts is None:
+            return None
+        return HotspotCells(counts.astype(np.int64), self.cell_size, self.by)
+
+
+def plot_density(fig, rasters, extent, title="Geographical Hotspots of Accidents", cmap='viridis'):
+    """One log-scaled density panel per level, 'All' first (a note when there is no extent)."""
+    from matplotlib.colors import LogNorm
+
+    if extent is None:
+        ax = fig.subplots()
+        ax.text(0.5, 0.5, "No accident coordinates", ha='center', va='center', transform=ax.transAxes)
+        ax.set_axis_off()
+        fig.suptitle(title)
+        return [ax]
+    names = [ALL_LEVELS] + [name for name in rasters if name != ALL_LEVELS]
+    axes = fig.subplots(1, len(names), squeeze=False, sharex=True, sharey=True)[0]
+    for ax, name in zip(axes, names):
+        raster = rasters[name]
+        # Empty cells are masked so the background stays blank
+        image = ax.imshow(np.ma.masked_equal(raster, 0), origin='lower', extent=extent,
+                          aspect='auto', cmap=cmap, norm=LogNorm(vmin=1, vmax=max(raster.max(), 1)),
+                          interpolation='nearest')
+        ax.set_title(str(name))
+        ax.set_xlabel("Longitude")
+        fig.colorbar(image, ax=ax, label="Accidents per cell")
+    axes[0].set_ylabel("Latitude")
+    fig.suptitle(title)
+    return axes
@@ -0,0 +1,200 @@
+# =============================================================================
+# Road Accident Analysis - Data Loading and Preprocessing
+# =============================================================================
+#
+# Two ways of getting the accident records into the analysis:
+#
+#   * load_accidents()        - read the whole CSV into one DataFrame
+#   * iter_accident_chunks()  - stream the CSV in bounded-size chunks, so that
+#                               peak memory depends on the chunk size and not
+#                               on the size of the file
+#
+# Both paths run the same preprocessing (derive_time_fields), so aggregates
+# built from the chunks match the ones built from the full frame.
+
+import pandas as pd
+
+from road_accidents.parsing import parse_dates, parse_hours
+
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Derived columns and the raw columns they are computed from
+DERIVED_SOURCES = {
+    'Year': 'Date',
+    'Month': 'Date',
+    'DayOfWeek': 'Date',
+    'Hour': 'Time',
+}
+
+
+# -----------------------------------------------------------------------------
+# Preprocessing
+# -----------------------------------------------------------------------------
+def derive_time_fields(df, report=None):
+    """Convert Date/Time in place and add Year, Month, DayOfWeek and Hour.
+
+    Pass a ParseReport to collect the rows whose Date/Time failed to parse.
+    """
+    if 'Date' in df.columns:
+        df['Date'] = parse_dates(df['Date'], report=report)
+        df['Year'] = df['Date'].dt.year
+        df['Month'] = df['Date'].dt.month
+        df['DayOfWeek'] = df['Date'].dt.day_name()
+
+    if 'Time' in df.columns:
+        # Assuming Time is in HH:MM format
+        df['Hour'] = parse_hours(df['Time'], report=report)
+    return df
+
+
+def available_columns(raw_columns):
+    """Raw CSV columns plus the derived columns preprocessing will add."""
+    columns = list(raw_columns)
+    for derived, source in DERIVED_SOURCES.items():
+        if source in columns and derived not in columns:
+            columns.append(derived)
+    return columns
+
+
+def read_header(path):
+    """Column names of the CSV, without reading any rows."""
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def source_columns(columns, raw_columns):
+    """Raw CSV columns needed to produce the requested (possibly derived) columns."""
+    needed = []
+    for col in columns:
+        col = DERIVED_SOURCES.get(col, col) if col not in raw_columns else col
+        if col in raw_columns and col not in needed:
+            needed.append(col)
+    return needed
+
+
+# -----------------------------------------------------------------------------
+# Loading
+# -----------------------------------------------------------------------------
+def load_accidents(path, usecols=None, report=None):
+    """Read the whole CSV and run the standard preprocessing."""
+    if usecols is not None:
+        usecols = source_columns(usecols, read_header(path))
+    df = pd.read_csv(path, usecols=usecols)
+    return derive_time_fields(df, report)
+
+
+def iter_accident_chunks(path, chunksize, usecols=None, report=None):
+    """Yield preprocessed chunks of at most `chunksize` rows.
+
+    When `usecols` is given only the raw columns needed for those (possibly
+    derived) columns are parsed. A shared `report` keeps the Date format
+    detected on the first chunk and accumulates parse failures.
+    """
+    if usecols is not None:
+        raw_columns = read_header(path)
+        # Always parse at least one column so chunk lengths still count rows
+        usecols = source_columns(usecols, raw_columns) or raw_columns[:1]
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols):
+        yield derive_time_fields(chunk, report)
+
+
+# -----------------------------------------------------------------------------
+# Incremental value counts
+# -----------------------------------------------------------------------------
+def sum_counts(parts):
+    """Sum counts Series (or frames of sums) by their (flat or MultiIndex) key.
+
+    First-seen key order is kept so ties sort the same way as value_counts()
+    on the full frame.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    merged = pd.concat(parts)
+    levels = list(range(merged.index.nlevels))
+    return merged.groupby(level=levels, sort=False).sum()
+
+
+class RunningCounts:
+    """Running sum of per-chunk counts, for keys that keep growing (Date, Intersection).
+
+    Adding every chunk straight into the total re-groups all keys seen so far
+    once per chunk. Chunks are buffered instead and summed with the total only
+    once they hold as many keys as it does, so the total at most doubles
+    between merges and the whole fold costs about one pass over the chunk
+    keys.
+    """
+
+    def __init__(self):
+        self._total = None
+        self._pending = []
+        self._pending_keys = 0
+
+    def add(self, counts):
+        self._pending.append(counts)
+        self._pending_keys += len(counts)
+        if self._total is None or self._pending_keys >= len(self._total):
+            self._merge()
+        return self
+
+    def _merge(self):
+        if self._pending:
+            parts = ([] if self._total is None else [self._total]) + self._pending
+            self._total = sum_counts(parts)
+            self._pending = []
+            self._pending_keys = 0
+
+    def total(self):
+        """The summed counts so far (None before any chunk)."""
+        self._merge()
+        return self._total
+
+    def pop(self):
+        """The summed counts so far, leaving the running total empty."""
+        total = self.total()
+        self._total = None
+        return total
+
+
+class ValueCountAccumulator:
+    """Running value_counts() for a set of columns, fed one chunk at a time."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.total_rows = 0
+        self._counts = {col: RunningCounts() for col in self.columns}
+
+    def update(self, chunk):
+        self.total_rows += len(chunk)
+        for col in self.columns:
+            if col not in chunk.columns:
+                continue
+            self._counts[col].add(chunk[col].value_counts(sort=False))
+        return self
+
+    def result(self):
+        """Dict of column -> counts Series, sorted like Series.value_counts()."""
+        results = {}
+        for col, running in self._counts.items():
+            counts = running.total()
+            if counts is None:
+                continue
+            counts = counts.sort_values(ascending=False, kind='stable')
+            counts.index.name = col
+            counts.name = 'count'
+            results[col] = counts
+        return results
+
+
+def frame_value_counts(df, columns):
+    """In-memory counterpart of stream_value_counts() for an already loaded frame."""
+    return {col: df[col].value_counts() for col in columns if col in df.columns}
+
+
+def stream_value_counts(path, columns, chunksize, report=None):
+    """Count values of `columns` over the CSV without holding it in memory.
+
+    Returns (total_rows, {column: counts Series}).
+    """
+    accumulator = ValueCountAccumulator(columns)
+    for chunk in iter_accident_chunks(path, chunksize, usecols=columns, report=report):
+        accumulator.update(chunk)
+    return accumulator.total_rows, accumulator.result()
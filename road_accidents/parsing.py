@@ -0,0 +1,192 @@
+# =============================================================================
+# Road Accident Analysis - Date/Time Parsing
+# =============================================================================
+#
+# pd.to_datetime() without a format has to infer it, falling back to
+# element-by-element parsing when it cannot, and silently turns bad values
+# into NaT. Here the Date format is detected once from a sample and every
+# column is parsed through a lookup table of its distinct values (a few
+# thousand dates, at most 1440 HH:MM strings), so the expensive parse runs
+# once per distinct string instead of once per row. A ParseReport records how
+# many rows failed and which ones.
+
+import numpy as np
+import pandas as pd
+
+# Tried in order; month-first comes before day-first to match the default
+# behaviour of pd.to_datetime() on ambiguous dates
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%m-%d-%Y',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%Y%m%d',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%b %d, %Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%d/%m/%Y %H:%M',
+]
+
+TIME_FORMAT = '%H:%M'
+
+# A format is accepted when it parses at least this share of the sample
+MIN_FORMAT_SUCCESS = 0.9
+
+# ParseReport.date_format once detection has failed, so later chunks skip it
+UNDETECTED_DATE_FORMAT = ''
+
+
+# -----------------------------------------------------------------------------
+# Parse-error report
+# -----------------------------------------------------------------------------
+class ParseReport:
+    """Rows seen, missing and unparseable per column, with example bad values.
+
+    One report can be passed through several chunks; it also remembers the
+    detected Date format so it is only detected once.
+    """
+
+    def __init__(self, max_examples=20):
+        self.max_examples = max_examples
+        self.date_format = None
+        self.rows = {}
+        self.missing = {}
+        self.failures = {}
+        # column -> list of (row index, raw value)
+        self.examples = {}
+
+    def record(self, column, raw, parsed):
+        is_missing = raw.isna()
+        failed = parsed.isna() & ~is_missing
+        self.rows[column] = self.rows.get(column, 0) + len(raw)
+        self.missing[column] = self.missing.get(column, 0) + int(is_missing.sum())
+        self.failures[column] = self.failures.get(column, 0) + int(failed.sum())
+        examples = self.examples.setdefault(column, [])
+        room = self.max_examples - len(examples)
+        if room > 0 and failed.any():
+            bad = raw[failed].head(room)
+            examples.extend((int(i) if isinstance(i, (int, np.integer)) else str(i), str(v))
+                            for i, v in bad.items())
+
+    def merge(self, other):
+        """Fold in the counts and examples of another report (e.g. of another file)."""
+        if not self.date_format and other.date_format is not None:
+            self.date_format = other.date_format
+        for column in other.rows:
+            self.rows[column] = self.rows.get(column, 0) + other.rows[column]
+            self.missing[column] = self.missing.get(column, 0) + other.missing[column]
+            self.failures[column] = self.failures.get(column, 0) + other.failures[column]
+            examples = self.examples.setdefault(column, [])
+            examples.extend(other.examples.get(column, [])[:max(self.max_examples - len(examples), 0)])
+        return self
+
+    def failed_rows(self, column):
+        return self.failures.get(column, 0)
+
+    def summary(self):
+        if not self.rows:
+            return "No Date/Time columns parsed."
+        lines = []
+        if self.date_format:
+            lines.append("Detected Date format: {}".format(self.date_format))
+        elif self.date_format == UNDETECTED_DATE_FORMAT:
+            lines.append("No Date format detected; dates inferred by pandas")
+        for column in self.rows:
+            lines.append("{}: {} rows, {} missing, {} failed to parse".format(
+                column, self.rows[column], self.missing[column], self.failures[column]))
+            for index, value in self.examples.get(column, []):
+                lines.append("    row {}: {!r}".format(index, value))
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'date_format': self.date_format,
+            'rows': self.rows,
+            'missing': self.missing,
+            'failures': self.failures,
+            'examples': {col: [list(example) for example in examples]
+                         for col, examples in self.examples.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_examples=20):
+        report = cls(max_examples)
+        report.date_format = data.get('date_format')
+        report.rows = dict(data.get('rows', {}))
+        report.missing = dict(data.get('missing', {}))
+        report.failures = dict(data.get('failures', {}))
+        report.examples = {col: [tuple(example) for example in examples]
+                           for col, examples in data.get('examples', {}).items()}
+        return report
+
+
+# -----------------------------------------------------------------------------
+# Parsing
+# -----------------------------------------------------------------------------
+def detect_date_format(values, sample_size=1000, formats=DATE_FORMATS):
+    """Pick the format that parses most of a sample of distinct values.
+
+    Returns None when no candidate reaches MIN_FORMAT_SUCCESS.
+    """
+    sample = pd.Series(pd.unique(pd.Series(values).dropna().astype(str)))
+    sample = sample.head(sample_size)
+    if sample.empty:
+        return None
+    best_format, best_rate = None, 0.0
+    for fmt in formats:
+        rate = pd.to_datetime(sample, format=fmt, errors='coerce').notna().mean()
+        if rate > best_rate:
+            best_format, best_rate = fmt, rate
+        if rate == 1.0:
+            break
+    return best_format if best_rate >= MIN_FORMAT_SUCCESS else None
+
+
+def _via_lookup(series, convert):
+    # Parse each distinct value once and broadcast back with the factor codes
+    codes, uniques = pd.factorize(series)
+    table = np.asarray(convert(pd.Index(uniques)))
+    # Code -1 (missing) picks the trailing NaT/NaN slot
+    missing = np.datetime64('NaT') if table.dtype.kind == 'M' else np.nan
+    table = np.append(table, np.array([missing]).astype(table.dtype))
+    return pd.Series(table[codes], index=series.index)
+
+
+def parse_dates(series, date_format=None, report=None, column='Date'):
+    """Vectorized Date parsing with a detected (or given) format."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if date_format is None and report is not None:
+        date_format = report.date_format
+    if date_format is None:
+        date_format = detect_date_format(series)
+        # A chunk without any dates says nothing about the format
+        if report is not None and series.notna().any():
+            report.date_format = UNDETECTED_DATE_FORMAT if date_format is None else date_format
+
+    if not date_format:
+        # Unknown layout: let pandas infer it, as before
+        parsed = pd.to_datetime(series, errors='coerce')
+    else:
+        parsed = _via_lookup(
+            series, lambda uniques: pd.to_datetime(uniques, format=date_format, errors='coerce'))
+    if report is not None:
+        report.record(column, series, parsed)
+    return parsed
+
+
+def parse_hours(series, time_format=TIME_FORMAT, report=None, column='Time'):
+    """Hour of day from HH:MM strings via a lookup table of the distinct values."""
+    hours = _via_lookup(
+        series,
+        lambda uniques: pd.to_datetime(uniques, format=time_format, errors='coerce').hour.astype(np.float64))
+    if report is not None:
+        report.record(column, series, hours)
+    # Same dtype as .dt.hour: integers unless some rows failed
+    return hours if hours.isna().any() else hours.astype(np.int32)
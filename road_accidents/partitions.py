@@ -0,0 +1,308 @@
+# =============================================================================
+# Road Accident Analysis - Partitioned Multi-Year Datasets
+# =============================================================================
+#
+# A dataset can be a directory with one CSV per year and region, laid out
+# hive style:
+#
+#   accidents/Year=2020/Region=North/part-0.csv
+#   accidents/Year=2020/Region=South/part-0.csv
+#   accidents/Year=2021/Region=North/part-0.csv
+#
+# Filters are pushed down instead of applied after loading everything:
+#
+#   * years / regions select partitions from the directory names, so other
+#     files are never opened;
+#   * columns are pruned to the raw CSV columns the request needs (Year and
+#     Region come from the path when a file does not carry them);
+#   * severity is applied to each partition right after parsing, before the
+#     Date/Time conversion and before partitions are concatenated.
+#
+# Partitions are read by a thread pool (the pandas CSV tokenizer releases the
+# GIL). year and region filters accept one value, a list of values or an
+# inclusive slice such as slice(2019, 2021), as in AccidentCube queries.
+#
+# Usage:
+#   python -m road_accidents.partitions split road-accident-data.csv accidents/
+#   python -m road_accidents.partitions scan accidents/ --years 2019:2021 --regions North --severity Fatal
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from road_accidents.ingest import derive_time_fields, read_header, source_columns
+from road_accidents.parsing import UNDETECTED_DATE_FORMAT, ParseReport, detect_date_format
+
+PARTITION_KEYS = ['Year', 'Region']
+DATA_EXTENSION = '.csv'
+
+# Directory value for rows without a key value (e.g. an unparseable Date)
+MISSING_VALUE = '__missing__'
+
+
+def _typed(value):
+    # Partition values are text in the path; Year=2020 means the integer
+    if value == MISSING_VALUE:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def matches(value, wanted):
+    """True if `value` passes a filter: None, one value, a list or an inclusive slice."""
+    if wanted is None:
+        return True
+    if value is None:
+        return False
+    if isinstance(wanted, slice):
+        return ((wanted.start is None or value >= wanted.start)
+                and (wanted.stop is None or value <= wanted.stop))
+    if isinstance(wanted, (list, tuple, set, frozenset, range)):
+        return value in wanted
+    return value == wanted
+
+
+def filter_mask(series, wanted):
+    """Vectorized matches() over a Series."""
+    if isinstance(wanted, slice):
+        mask = pd.Series(True, index=series.index)
+        if wanted.start is not None:
+            mask &= series >= wanted.start
+        if wanted.stop is not None:
+            mask &= series <= wanted.stop
+        return mask
+    if isinstance(wanted, (list, tuple, set, frozenset, range)):
+        return series.isin(list(wanted))
+    return series == wanted
+
+
+def parse_filter(text):
+    """Command-line filter: '2019:2021' (inclusive range), '2019,2021' (list) or '2019'."""
+    if text is None:
+        return None
+    if ':' in text:
+        start, _, stop = text.partition(':')
+        return slice(_typed(start) if start else None, _typed(stop) if stop else None)
+    values = [_typed(part) for part in text.split(',')]
+    return values if len(values) > 1 else values[0]
+
+
+class Partition:
+    """One data file and the key values encoded in its directory path."""
+
+    def __init__(self, path, values):
+        self.path = path
+        self.values = values
+
+    def __repr__(self):
+        return "Partition({!r}, {})".format(self.path, self.values)
+
+
+class PartitionedDataset:
+    """A Year=/Region= partitioned directory of accident CSVs."""
+
+    def __init__(self, root, keys=PARTITION_KEYS):
+        self.root = root
+        self.keys = list(keys)
+        self._partitions = None
+        self._date_format = None
+
+    def __repr__(self):
+        return "PartitionedDataset({!r}, {} partitions)".format(self.root, len(self.all_partitions()))
+
+    def all_partitions(self):
+        if self._partitions is None:
+            partitions = []
+            for directory, dirnames, filenames in os.walk(self.root):
+                dirnames.sort()
+                rel = os.path.relpath(directory, self.root)
+                values = {}
+                for part in ([] if rel == os.curdir else rel.split(os.sep)):
+                    key, sep, value = part.partition('=')
+                    if sep:
+                        values[key] = _typed(value)
+                for name in sorted(filenames):
+                    if name.endswith(DATA_EXTENSION) and not name.startswith(('.', '_')):
+                        partitions.append(Partition(os.path.join(directory, name), values))
+            self._partitions = partitions
+        return self._partitions
+
+    def partitions(self, years=None, regions=None):
+        """Partitions whose Year and Region pass the filters (decided from the paths alone)."""
+        return [partition for partition in self.all_partitions()
+                if matches(partition.values.get('Year'), years)
+                and matches(partition.values.get('Region'), regions)]
+
+    def levels(self, key):
+        """Distinct values of a partition key."""
+        return sorted({partition.values[key] for partition in self.all_partitions()
+                       if partition.values.get(key) is not None})
+
+    def raw_columns(self):
+        partitions = self.all_partitions()
+        return read_header(partitions[0].path) if partitions else []
+
+    def date_format(self):
+        """Date format detected once from the first partitions, shared by all of them."""
+        if self._date_format is None:
+            self._date_format = False
+            for partition in self.all_partitions():
+                if 'Date' not in read_header(partition.path):
+                    break
+                sample = pd.read_csv(partition.path, usecols=['Date'], nrows=1000)['Date']
+                detected = detect_date_format(sample)
+                if detected:
+                    self._date_format = detected
+                    break
+        return self._date_format or None
+
+    def columns(self):
+        """Raw, derived and partition columns available for loading."""
+        from road_accidents.ingest import available_columns
+        columns = available_columns(self.raw_columns())
+        return columns + [key for key in self.keys if key not in columns]
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+    def read_partition(self, partition, columns=None, severity=None, report=None):
+        """One partition, with only the needed raw columns parsed and `severity` rows kept."""
+        header = read_header(partition.path)
+        wanted = list(columns) if columns is not None else self.columns()
+        usecols = source_columns(wanted + (['Severity'] if severity is not None else []), header)
+        df = pd.read_csv(partition.path, usecols=usecols)
+        if severity is not None and 'Severity' in df.columns:
+            df = df[filter_mask(df['Severity'], severity)].reset_index(drop=True)
+        df = derive_time_fields(df, report)
+        for key, value in partition.values.items():
+            if key in wanted and key not in df.columns:
+                df[key] = value if value is not None else float('nan')
+        return df[[col for col in wanted if col in df.columns]]
+
+    def iter_frames(self, columns=None, years=None, regions=None, severity=None, max_workers=None,
+                    report=None):
+        """Yield the matching partitions as frames, in path order, reading up to max_workers at once."""
+        partitions = self.partitions(years, regions)
+        max_workers = max_workers or min(len(partitions), os.cpu_count() or 1) or 1
+
+        date_format = self.date_format()
+
+        def read(partition):
+            # One report per partition (merged below), seeded with the shared
+            # format so a partition of bad dates is not parsed value by value
+            partition_report = ParseReport()
+            partition_report.date_format = date_format or UNDETECTED_DATE_FORMAT
+            return self.read_partition(partition, columns, severity, partition_report), partition_report
+
+        with ThreadPoolExecutor(max_workers) as executor:
+            # A bounded window of partitions in flight keeps memory at
+            # max_workers frames when streaming
+            for start in range(0, len(partitions), max_workers):
+                for frame, partition_report in executor.map(read, partitions[start:start + max_workers]):
+                    if report is not None:
+                        report.merge(partition_report)
+                    yield frame
+
+    def load(self, columns=None, years=None, regions=None, severity=None, max_workers=None, report=None):
+        """The matching partitions concatenated into one frame."""
+        frames = list(self.iter_frames(columns, years, regions, severity, max_workers, report))
+        if not frames:
+            return pd.DataFrame(columns=list(columns) if columns is not None else self.columns())
+        return pd.concat(frames, ignore_index=True)
+
+    def aggregate(self, aggregator=None, years=None, regions=None, severity=None, max_workers=None,
+                  report=None):
+        """AggregateResults over the matching partitions, one partition in memory per worker."""
+        from road_accidents.aggregate import AccidentAggregator
+
+        aggregator = aggregator or AccidentAggregator()
+        available = set(self.columns())
+        columns = [col for col in aggregator.required_columns() if col in available]
+        for frame in self.iter_frames(columns, years, regions, severity, max_workers, report):
+            aggregator.update(frame)
+        return aggregator.result()
+
+    def row_counts(self, years=None, regions=None):
+        """Rows per partition (Year, Region), parsing a single column of each file."""
+        partitions = self.partitions(years, regions)
+        index = pd.MultiIndex.from_tuples(
+            [tuple(partition.values.get(key) for key in self.keys) for partition in partitions], names=self.keys)
+        rows = [len(pd.read_csv(partition.path, usecols=[0])) for partition in partitions]
+        return pd.Series(rows, index=index, name='count').groupby(level=self.keys).sum()
+
+
+def _key_text(values):
+    # 2020.0 (Year of a frame with unparseable dates) -> '2020'
+    return values.astype(object).map(
+        lambda value: MISSING_VALUE if pd.isna(value)
+        else str(int(value)) if isinstance(value, float) and value.is_integer() else str(value))
+
+
+def write_partitioned(df, root, keys=PARTITION_KEYS, key_values=None, filename='part-0' + DATA_EXTENSION):
+    """Write a frame as a hive-style partitioned directory; returns the file paths.
+
+    `key_values` maps keys that are not columns of `df` (e.g. Year derived
+    from Date) to the Series to partition by; those are not written into the
+    files. Rows with a missing key value go under KEY=__missing__, which
+    year/region filters never select.
+    """
+    key_values = key_values or {}
+    groups = [_key_text(key_values[key] if key in key_values else df[key]) for key in keys]
+    paths = []
+    for values, part in df.groupby(groups, sort=True):
+        values = values if isinstance(values, tuple) else (values,)
+        directory = os.path.join(root, *('{}={}'.format(key, value) for key, value in zip(keys, values)))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        part.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split or scan a Year=/Region= partitioned accident dataset.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    split = sub.add_parser('split', help="partition a single accident CSV by Year and Region")
+    split.add_argument('data', help="accident CSV file")
+    split.add_argument('root', help="output directory")
+    scan = sub.add_parser('scan', help="load the partitions matching the filters")
+    scan.add_argument('root', help="partitioned dataset directory")
+    scan.add_argument('--years', default=None, help="e.g. 2019:2021 or 2019,2021")
+    scan.add_argument('--regions', default=None, help="e.g. North,East")
+    scan.add_argument('--severity', default=None, help="e.g. Fatal or Fatal,Serious")
+    scan.add_argument('--columns', default=None, help="comma-separated columns to load")
+    scan.add_argument('--workers', type=int, default=None, help="partitions read in parallel")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == 'split':
+        # The files keep the raw columns; Year comes from the parsed Date
+        raw = pd.read_csv(args.data)
+        key_values = {}
+        if 'Year' not in raw.columns and 'Date' in raw.columns:
+            key_values['Year'] = derive_time_fields(raw[['Date']].copy())['Year']
+        paths = write_partitioned(raw, args.root, key_values=key_values)
+        print("Wrote {} partitions to {} in {:.2f}s".format(len(paths), args.root, time.perf_counter() - start))
+        return
+
+    dataset = PartitionedDataset(args.root)
+    years, regions = parse_filter(args.years), parse_filter(args.regions)
+    severity = args.severity.split(',') if args.severity else None
+    columns = args.columns.split(',') if args.columns else None
+    selected = dataset.partitions(years, regions)
+    df = dataset.load(columns, years, regions, severity, args.workers)
+    print("Read {} of {} partitions: {} rows x {} columns in {:.3f}s".format(
+        len(selected), len(dataset.all_partitions()), len(df), len(df.columns), time.perf_counter() - start))
+    print(df.head().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+# =============================================================================
+# Road Accident Analysis - Profiling Hooks
+# =============================================================================
+#
+# Instrumentation for the analysis script: every numbered section and every
+# plot is timed (wall and CPU), its peak memory growth is sampled, and the
+# rows it worked on are recorded. At the end a JSON and a CSV report are
+# written and a console summary sorted by cost is printed. Optionally every
+# section runs under cProfile and the stats of the slowest one are dumped.
+#
+# Sections are marked with start_section() (the previous one ends
+# automatically), so the script needs no re-indenting. Plots are picked up
+# by wrapping pyplot's figure()/show(): a plot runs from figure() to show()
+# and is named after its title.
+
+import cProfile
+import csv
+import io
+import json
+import os
+import platform
+import pstats
+import threading
+import time
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Not the current RSS, only the high-water mark; good enough off Linux
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if platform.system() == 'Darwin' else maxrss * 1024
+
+
+class PeakMemory:
+    """Samples RSS in a background thread between start() and stop().
+
+    Also usable as a context manager.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_rss = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def start(self):
+        self.start_rss = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def delta_mb(self):
+        return (self.peak - self.start_rss) / 1e6
+
+
+class _Span:
+    # One timed section or plot
+    def __init__(self, kind, name, section, rows, origin):
+        self.kind = kind
+        self.name = name
+        self.section = section
+        self.rows = rows
+        self.offset = time.perf_counter() - origin
+        self.memory = PeakMemory().start()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+
+    def finish(self):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        self.memory.stop()
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'section': self.section,
+            'start_s': round(self.offset, 4),
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'peak_mem_mb': round(self.memory.delta_mb, 1),
+            'rows': self.rows,
+        }
+
+
+class Profiler:
+    """Collects per-section and per-plot timings; a no-op when disabled."""
+
+    def __init__(self, enabled=True, output_dir='profile-report', cprofile=False):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.cprofile = cprofile
+        self.records = []
+        self._origin = time.perf_counter()
+        self._section = None
+        self._plot = None
+        self._profile = None
+        # (wall seconds, section name, pstats.Stats) of the slowest section so far
+        self._slowest = None
+
+    # -------------------------------------------------------------------------
+    # Sections
+    # -------------------------------------------------------------------------
+    def start_section(self, name, rows=None):
+        """End the current section (if any) and start timing `name`."""
+        if not self.enabled:
+            return
+        self.end_section()
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._section = _Span('section', name, name, rows, self._origin)
+
+    def set_rows(self, rows):
+        """Record the number of rows the current section processed."""
+        if self.enabled and self._section is not None:
+            self._section.rows = rows
+
+    def end_section(self):
+        if not self.enabled or self._section is None:
+            return
+        self.end_plot()
+        if self._profile is not None:
+            self._profile.disable()
+        record = self._section.finish()
+        self.records.append(record)
+        if self._profile is not None:
+            if self._slowest is None or record['wall_s'] > self._slowest[0]:
+                self._slowest = (record['wall_s'], record['name'], pstats.Stats(self._profile))
+            self._profile = None
+        self._section = None
+
+    # -------------------------------------------------------------------------
+    # Plots
+    # -------------------------------------------------------------------------
+    def start_plot(self, name=None):
+        if not self.enabled:
+            return
+        self.end_plot()
+        section = self._section.name if self._section is not None else None
+        rows = self._section.rows if self._section is not None else None
+        self._plot = _Span('plot', name, section, rows, self._origin)
+
+    def end_plot(self, name=None):
+        if not self.enabled or self._plot is None:
+            return
+        if name:
+            self._plot.name = name
+        record = self._plot.finish()
+        record['name'] = record['name'] or "plot {}".format(
+            sum(1 for r in self.records if r['kind'] == 'plot') + 1)
+        self.records.append(record)
+        self._plot = None
+
+    def instrument_pyplot(self, plt):
+        """Time every figure()...show() pair, naming it after the figure title."""
+        if not self.enabled:
+            return
+        original_figure, original_show = plt.figure, plt.show
+
+        def figure(*args, **kwargs):
+            self.start_plot()
+            return original_figure(*args, **kwargs)
+
+        def show(*args, **kwargs):
+            fig = plt.gcf()
+            titles = [ax.get_title() for ax in fig.axes if ax.get_title()]
+            suptitle = fig.get_suptitle() if hasattr(fig, 'get_suptitle') else None
+            result = original_show(*args, **kwargs)
+            self.end_plot(suptitle or (titles[0] if titles else None))
+            return result
+
+        plt.figure, plt.show = figure, show
+
+    # -------------------------------------------------------------------------
+    # Reporting
+    # -------------------------------------------------------------------------
+    def summary(self, top=15):
+        """Console table of the most expensive sections and plots."""
+        sections = [r for r in self.records if r['kind'] == 'section']
+        total = sum(r['wall_s'] for r in sections) or 1.0
+        lines = ["{:<8} {:>9} {:>9} {:>6} {:>9} {:>10}  {}".format(
+            'kind', 'wall s', 'cpu s', '%', 'mem MB', 'rows', 'name')]
+        for record in sorted(self.records, key=lambda r: r['wall_s'], reverse=True)[:top]:
+            lines.append("{:<8} {:>9.3f} {:>9.3f} {:>5.1f}% {:>9.1f} {:>10}  {}".format(
+                record['kind'], record['wall_s'], record['cpu_s'], record['wall_s'] / total * 100,
+                record['peak_mem_mb'], '' if record['rows'] is None else record['rows'], record['name']))
+        lines.append("Total (sections): {:.3f}s".format(total))
+        return "\n".join(lines)
+
+    def write_reports(self):
+        """Write profile.json and profile.csv (and the cProfile dump) to output_dir."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = {}
+        paths['json'] = os.path.join(self.output_dir, 'profile.json')
+        with open(paths['json'], 'w') as f:
+            json.dump(self.records, f, indent=2)
+        paths['csv'] = os.path.join(self.output_dir, 'profile.csv')
+        fields = ['kind', 'name', 'section', 'start_s', 'wall_s', 'cpu_s', 'peak_mem_mb', 'rows']
+        with open(paths['csv'], 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
+        if self._slowest is not None:
+            paths['cprofile'] = os.path.join(self.output_dir, 'slowest-section.prof')
+            self._slowest[2].dump_stats(paths['cprofile'])
+        return paths
+
+    def slowest_section_stats(self, limit=20):
+        """Top cumulative-time functions of the slowest section (cprofile mode)."""
+        if self._slowest is None:
+            return None
+        out = io.StringIO()
+        stats = self._slowest[2]
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(limit)
+        return "Slowest section: {} ({:.3f}s)\n{}".format(self._slowest[1], self._slowest[0], out.getvalue())
+
+    def finish(self, top=15):
+        """End the last section, write the reports and print the summary."""
+        if not self.enabled:
+            return None
+        self.end_section()
+        paths = self.write_reports()
+        print("\n================== Profile ==================")
+        print(self.summary(top))
+        print("Reports: " + ", ".join(paths.values()))
+        stats = self.slowest_section_stats()
+        if stats:
+            print(stats)
+        return paths
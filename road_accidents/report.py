@@ -0,0 +1,487 @@
+# =============================================================================
+# Road Accident Analysis - Headless Parallel Report
+# =============================================================================
+#
+# Batch counterpart of the interactive script: every chart is described by a
+# small, picklable ChartSpec built from the section's aggregated data, and the
+# specs are rendered in parallel by a process pool using the Agg backend. The
+# figures are written as PNG/SVG files to an output directory together with
+# index.html and index.json, so a full report takes roughly as long as its
+# slowest chart.
+#
+# Usage:
+#   python -m road_accidents.report road-accident-data.csv --output-dir report
+
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.ingest import DAYS_ORDER
+from road_accidents.partitions import parse_filter
+from road_accidents.sketches import APPROX_COLUMNS
+
+SECTION_TITLES = {
+    1: "Frequency of Accidents Over Time",
+    2: "Geographical Distribution",
+    3: "Accident Severity Analysis",
+    4: "Demographic Insights",
+    5: "Environmental and Road Conditions",
+    6: "Vehicle and Driver Information",
+    7: "Temporal Patterns",
+    8: "Contributing Factors",
+    9: "Injury and Fatality Analysis",
+    10: "Comparative Analysis",
+}
+
+AGE_BINS = [0, 18, 30, 45, 60, 100]
+AGE_LABELS = ['0-18', '19-30', '31-45', '46-60', '60+']
+
+SEVERITY_MAPPING = {'Minor': 1, 'Serious': 2, 'Fatal': 3}
+
+
+class ChartSpec:
+    """Everything needed to draw one chart, without access to the raw rows.
+
+    kind is one of 'bar', 'grouped_bar', 'hist', 'line', 'heatmap', 'box' or
+    'density' (hotspot rasters, drawn with one panel per Severity level).
+    """
+
+    def __init__(self, name, section, kind, data, title, xlabel, ylabel,
+                 figsize=(10, 6), rotate_xticks=False, **options):
+        self.name = name
+        self.section = section
+        self.kind = kind
+        self.data = data
+        self.title = title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.figsize = figsize
+        self.rotate_xticks = rotate_xticks
+        self.options = options
+
+
+# -----------------------------------------------------------------------------
+# Box plot statistics (computed up front so workers never see the rows)
+# -----------------------------------------------------------------------------
+def box_stats(df, x, y, max_fliers=500):
+    """Per-group statistics in the format expected by Axes.bxp()."""
+    stats = []
+    for label, values in df.groupby(x, observed=True, sort=True)[y]:
+        values = values.dropna().to_numpy(dtype=np.float64)
+        if not len(values):
+            continue
+        q1, med, q3 = np.percentile(values, [25, 50, 75])
+        iqr = q3 - q1
+        low = values[values >= q1 - 1.5 * iqr].min()
+        high = values[values <= q3 + 1.5 * iqr].max()
+        fliers = values[(values < low) | (values > high)]
+        if len(fliers) > max_fliers:
+            fliers = np.random.default_rng(0).choice(fliers, max_fliers, replace=False)
+        stats.append({'label': str(label), 'q1': q1, 'med': med, 'q3': q3,
+                      'whislo': low, 'whishi': high, 'fliers': fliers})
+    return stats
+
+
+# -----------------------------------------------------------------------------
+# Chart specs for sections 1-10
+# -----------------------------------------------------------------------------
+def build_chart_specs(agg, df=None):
+    """ChartSpecs for every chart that can be drawn from `agg`.
+
+    When the full frame `df` is given, the box plots and the correlation
+    heatmap (which need individual rows) are summarised and included too.
+    """
+    counts = agg.counts
+    specs = []
+
+    def bar(name, section, column, title, xlabel, ylabel, palette, sort_index=False,
+            head=None, order=None, **kwargs):
+        if column not in counts:
+            return
+        data = counts[column]
+        if sort_index:
+            data = data.sort_index()
+        if order is not None:
+            data = data.reindex(order, fill_value=0)
+        if head is not None:
+            data = data.head(head)
+        specs.append(ChartSpec(name, section, 'bar', data, title, xlabel, ylabel,
+                               palette=palette, **kwargs))
+
+    def grouped(name, section, row, column, title, xlabel, ylabel, palette, **kwargs):
+        if (row, column) not in agg.crosstabs:
+            return
+        specs.append(ChartSpec(name, section, 'grouped_bar', agg.long_crosstab(row, column),
+                               title, xlabel, ylabel, palette=palette, x=row, hue=column, **kwargs))
+
+    def hist(name, section, column, title, xlabel, color):
+        if column in counts:
+            specs.append(ChartSpec(name, section, 'hist', counts[column].sort_index(), title,
+                                   xlabel, "Frequency", color=color))
+
+    # 1. Frequency of Accidents Over Time
+    bar('accidents_per_year', 1, 'Year', "Number of Accidents per Year", "Year",
+        "Number of Accidents", 'Blues_d', sort_index=True)
+    bar('accidents_per_month', 1, 'Month', "Number of Accidents per Month", "Month",
+        "Number of Accidents", 'Greens_d', sort_index=True)
+    bar('accidents_per_day_of_week', 1, 'DayOfWeek', "Number of Accidents by Day of the Week",
+        "Day of the Week", "Number of Accidents", 'Purples_d', order=DAYS_ORDER)
+    bar('accidents_per_hour', 1, 'Hour', "Number of Accidents by Hour of the Day",
+        "Hour of the Day", "Number of Accidents", 'Oranges_d', sort_index=True)
+    if 'Date' in counts:
+        specs.append(ChartSpec('daily_accidents', 1, 'line', counts['Date'].sort_index(),
+                               "Daily Accident Frequency Over Time", "Date",
+                               "Number of Accidents", figsize=(14, 7), color='navy'))
+    if agg.daily is not None:
+        rolling = agg.daily.rolling()
+        specs.append(ChartSpec('daily_rolling_average', 1, 'line', rolling.drop(columns='count'),
+                               "Rolling Average of Daily Accidents", "Date",
+                               "Accidents per Day", figsize=(14, 7)))
+
+    # 2. Geographical Distribution
+    bar('top_cities', 2, 'City', "Top 10 Cities with Highest Accident Frequency", "City",
+        "Number of Accidents", 'Reds_d', head=10, figsize=(12, 6), rotate_xticks=True)
+    bar('top_intersections', 2, 'Intersection', "Top 10 Intersections with Highest Accident Frequency",
+        "Intersection", "Number of Accidents", 'Reds_d', head=10, figsize=(12, 6), rotate_xticks=True)
+    bar('accidents_by_region', 2, 'Region', "Accident Distribution by Region/Zone", "Region/Zone",
+        "Number of Accidents", 'coolwarm', figsize=(12, 6), rotate_xticks=True)
+    if agg.hotspots is not None and agg.hotspots.extent() is not None:
+        rasters, extent = agg.hotspots.density()
+        specs.append(ChartSpec('hotspot_density', 2, 'density', {'rasters': rasters, 'extent': extent},
+                               "Geographical Hotspots of Accidents", "Longitude", "Latitude",
+                               figsize=(5 * len(rasters), 5)))
+
+    # 3. Accident Severity Analysis
+    bar('severity_distribution', 3, 'Severity', "Distribution of Accident Severities",
+        "Accident Severity", "Count", 'Set2', figsize=(8, 6))
+    if df is not None and 'Severity' in df.columns:
+        severity_numeric = df['Severity'].map(SEVERITY_MAPPING).astype(float)
+        frame = pd.DataFrame({'Severity_Numeric': severity_numeric})
+        for col in ['Hour', 'Region', 'Month']:
+            if col in df.columns:
+                frame[col] = df[col]
+        if 'Hour' in frame.columns:
+            specs.append(ChartSpec('severity_by_hour', 3, 'box', box_stats(frame, 'Hour', 'Severity_Numeric'),
+                                   "Accident Severity by Hour of the Day", "Hour of the Day",
+                                   "Severity (Numeric)", figsize=(12, 6), palette='Accent'))
+        if 'Region' in frame.columns:
+            specs.append(ChartSpec('severity_by_region', 3, 'box', box_stats(frame, 'Region', 'Severity_Numeric'),
+                                   "Accident Severity by Region", "Region", "Severity (Numeric)",
+                                   figsize=(12, 6), rotate_xticks=True, palette='Accent'))
+        numeric_features = [c for c in ['Severity_Numeric', 'Hour', 'Month'] if c in frame.columns]
+        if len(numeric_features) > 1:
+            specs.append(ChartSpec('severity_time_correlation', 3, 'heatmap',
+                                   frame[numeric_features].astype(float).corr(),
+                                   "Correlation Matrix of Severity and Time Factors", "", "",
+                                   figsize=(6, 4)))
+
+    # 4. Demographic Insights
+    hist('age_distribution', 4, 'Age', "Distribution of Age of Individuals Involved in Accidents",
+         "Age", 'skyblue')
+    bar('gender_distribution', 4, 'Gender', "Gender Distribution of Individuals Involved in Accidents",
+        "Gender", "Count", 'pastel', figsize=(8, 6))
+    if 'Age' in counts:
+        age_counts = counts['Age'].sort_index()
+        age_groups = pd.cut(age_counts.index, bins=AGE_BINS, labels=AGE_LABELS, right=False)
+        specs.append(ChartSpec('accidents_by_age_group', 4, 'bar',
+                               age_counts.groupby(age_groups, observed=False).sum(),
+                               "Accident Frequency by Age Group", "Age Group",
+                               "Number of Accidents", palette='magma'))
+    if df is not None and 'Gender' in df.columns and 'Age' in df.columns:
+        specs.append(ChartSpec('age_by_gender', 4, 'box', box_stats(df, 'Gender', 'Age'),
+                               "Age Distribution by Gender", "Gender", "Age", palette='Set3'))
+
+    # 5. Environmental and Road Conditions
+    bar('accidents_by_weather', 5, 'Weather', "Accident Frequency by Weather Condition",
+        "Weather Condition", "Number of Accidents", 'cool', figsize=(12, 6), rotate_xticks=True)
+    bar('accidents_by_road_type', 5, 'Road_Type', "Accident Frequency by Road Type", "Road Type",
+        "Number of Accidents", 'autumn', figsize=(12, 6), rotate_xticks=True)
+    bar('accidents_by_lighting', 5, 'Lighting', "Accident Frequency by Lighting Condition",
+        "Lighting Condition", "Number of Accidents", 'winter', figsize=(12, 6), rotate_xticks=True)
+
+    # 6. Vehicle and Driver Information
+    bar('accidents_by_vehicle_type', 6, 'Vehicle_Type', "Accident Frequency by Vehicle Type",
+        "Vehicle Type", "Number of Accidents", 'Spectral', figsize=(12, 6), rotate_xticks=True)
+    grouped('severity_by_vehicle_type', 6, 'Vehicle_Type', 'Severity', "Accident Severity by Vehicle Type",
+            "Vehicle Type", "Count", 'Accent', figsize=(12, 6), rotate_xticks=True)
+    hist('driver_experience', 6, 'Driver_Experience', "Distribution of Driver Experience",
+         "Years of Experience", 'olive')
+    bar('speeding', 6, 'Speeding', "Frequency of Accidents Involving Speeding", "Speeding (Yes/No)",
+        "Number of Accidents", 'coolwarm', figsize=(8, 6))
+    bar('seatbelt_usage', 6, 'Seatbelt_Usage', "Frequency of Accidents by Seatbelt Usage",
+        "Seatbelt Usage (Yes/No)", "Number of Accidents", 'coolwarm', figsize=(8, 6))
+
+    # 7. Temporal Patterns
+    bar('peak_hours', 7, 'Hour', "Accident Frequency by Hour of the Day", "Hour of the Day",
+        "Number of Accidents", 'cubehelix', sort_index=True)
+    bar('peak_days', 7, 'DayOfWeek', "Accident Frequency by Day of the Week", "Day of the Week",
+        "Number of Accidents", 'cubehelix', order=DAYS_ORDER)
+    bar('weekday_vs_weekend', 7, 'Is_Weekend', "Accident Frequency: Weekdays vs. Weekends",
+        "Is Weekend (True/False)", "Number of Accidents", 'pastel', figsize=(8, 6))
+    bar('seasonal_variation', 7, 'Month', "Accident Frequency by Month (Seasonal Variation)", "Month",
+        "Number of Accidents", 'rainbow', sort_index=True)
+
+    # 8. Contributing Factors (per individual factor of multi-valued records)
+    factor_tables = agg.factors()
+    if factor_tables is not None:
+        top_factors = factor_tables.top(10)
+        specs.append(ChartSpec('top_contributing_factors', 8, 'bar', top_factors,
+                               "Top 10 Contributing Factors to Accidents", "Contributing Factor", "Count",
+                               palette='mako', figsize=(12, 6), rotate_xticks=True))
+        for name, column, title, palette in [
+                ('factors_by_severity', 'Severity', "Contributing Factors by Accident Severity", 'viridis'),
+                ('factors_by_region', 'Region', "Contributing Factors by Region", 'Spectral')]:
+            if column in factor_tables.crosstabs:
+                specs.append(ChartSpec(name, 8, 'grouped_bar', factor_tables.long_crosstab(column), title,
+                                       "Contributing Factor", "Count", palette=palette,
+                                       x='Contributing_Factors', hue=column, figsize=(12, 6),
+                                       rotate_xticks=True))
+        specs.append(ChartSpec('factor_cooccurrence', 8, 'heatmap',
+                               factor_tables.cooccurrence.loc[top_factors.index, top_factors.index],
+                               "Co-occurrence of the Top 10 Contributing Factors", "Contributing Factor",
+                               "Contributing Factor", figsize=(10, 8), fmt='d', cmap='mako'))
+
+    # 9. Injury and Fatality Analysis
+    bar('accidents_by_road_user', 9, 'Road_User', "Accident Frequency by Road User Type", "Road User",
+        "Number of Accidents", 'Set1', figsize=(12, 6))
+    if df is not None and 'Injury_Count' in df.columns and 'Vehicle_Type' in df.columns:
+        specs.append(ChartSpec('injuries_by_vehicle_type', 9, 'box', box_stats(df, 'Vehicle_Type', 'Injury_Count'),
+                               "Injury Count by Vehicle Type", "Vehicle Type", "Injury Count",
+                               figsize=(12, 6), rotate_xticks=True, palette='cool'))
+    if df is not None and 'Fatality_Count' in df.columns and 'Speeding' in df.columns:
+        specs.append(ChartSpec('fatalities_by_speeding', 9, 'box', box_stats(df, 'Speeding', 'Fatality_Count'),
+                               "Fatality Count vs. Speeding", "Speeding (Yes/No)", "Fatality Count",
+                               palette='Reds'))
+
+    # 10. Comparative Analysis
+    grouped('region_by_year', 10, 'Region', 'Year', "Accident Frequency by Region and Year", "Region",
+            "Number of Accidents", 'tab10', figsize=(12, 6), rotate_xticks=True)
+    bar('urban_vs_rural', 10, 'Area_Type', "Accident Frequency: Urban vs. Rural", "Area Type",
+        "Number of Accidents", 'Set2', figsize=(8, 6))
+
+    return specs
+
+
+# -----------------------------------------------------------------------------
+# Rendering (runs inside the worker processes)
+# -----------------------------------------------------------------------------
+def _label(value):
+    # Year/Month/Hour are floats when some dates failed to parse; show 2019, not 2019.0
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def draw_chart(spec, ax):
+    """Draw `spec` onto a matplotlib Axes."""
+    import seaborn as sns
+
+    opts = spec.options
+    if spec.kind == 'bar':
+        labels = [_label(label) for label in spec.data.index]
+        sns.barplot(x=labels, y=spec.data.values, hue=labels, order=labels,
+                    palette=opts.get('palette'), legend=False, ax=ax)
+    elif spec.kind == 'grouped_bar':
+        data = spec.data.copy()
+        for col in (opts['x'], opts['hue']):
+            data[col] = data[col].map(_label)
+        sns.barplot(x=opts['x'], y='count', hue=opts['hue'], data=data,
+                    palette=opts.get('palette'), ax=ax)
+    elif spec.kind == 'hist':
+        sns.histplot(x=spec.data.index.to_numpy(dtype=float), weights=spec.data.values,
+                     bins=20, kde=True, color=opts.get('color'), ax=ax)
+    elif spec.kind == 'line':
+        spec.data.plot(kind='line', color=opts.get('color'), ax=ax)
+    elif spec.kind == 'heatmap':
+        sns.heatmap(spec.data, annot=True, cmap=opts.get('cmap', 'coolwarm'), fmt=opts.get('fmt', ".2f"), ax=ax)
+    elif spec.kind == 'box':
+        boxes = ax.bxp(spec.data, patch_artist=True)
+        colors = sns.color_palette(opts.get('palette'), len(spec.data))
+        for patch, color in zip(boxes['boxes'], colors):
+            patch.set_facecolor(color)
+    else:
+        raise ValueError("Unknown chart kind: {!r}".format(spec.kind))
+
+    ax.set_title(spec.title)
+    ax.set_xlabel(spec.xlabel)
+    ax.set_ylabel(spec.ylabel)
+    if spec.rotate_xticks:
+        ax.tick_params(axis='x', labelrotation=45)
+
+
+def _draw_figure(spec):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=spec.figsize)
+    try:
+        if spec.kind == 'density':
+            from road_accidents.hotspots import plot_density
+            plot_density(fig, spec.data['rasters'], spec.data['extent'], spec.title)
+        else:
+            draw_chart(spec, fig.add_subplot())
+        fig.tight_layout()
+    except Exception:
+        plt.close(fig)
+        raise
+    return fig
+
+
+def render_chart_bytes(spec, fmt='png'):
+    """Render one spec in memory; returns the encoded image."""
+    import matplotlib.pyplot as plt
+
+    fig = _draw_figure(spec)
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def render_chart(spec, output_dir, formats=('png',)):
+    """Render one spec to files; returns (name, [paths], seconds)."""
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    fig = _draw_figure(spec)
+    try:
+        paths = []
+        for fmt in formats:
+            path = os.path.join(output_dir, "{:02d}_{}.{}".format(spec.section, spec.name, fmt))
+            fig.savefig(path, format=fmt)
+            paths.append(path)
+    finally:
+        plt.close(fig)
+    return spec.name, paths, time.perf_counter() - start
+
+
+def write_index(specs, rendered, output_dir):
+    """Write index.json and a simple index.html linking every chart."""
+    entries = []
+    for spec in specs:
+        paths, seconds = rendered[spec.name]
+        entries.append({
+            'name': spec.name,
+            'section': spec.section,
+            'section_title': SECTION_TITLES.get(spec.section, ''),
+            'title': spec.title,
+            'kind': spec.kind,
+            'files': [os.path.basename(p) for p in paths],
+            'render_seconds': round(seconds, 4),
+        })
+    with open(os.path.join(output_dir, 'index.json'), 'w') as f:
+        json.dump(entries, f, indent=2)
+
+    html = ["<html><head><meta charset='utf-8'><title>Road Accident Analysis</title></head><body>",
+            "<h1>Road Accident Analysis</h1>"]
+    current_section = None
+    for entry in entries:
+        if entry['section'] != current_section:
+            current_section = entry['section']
+            html.append("<h2>{}. {}</h2>".format(current_section, entry['section_title']))
+        html.append("<h3>{}</h3>".format(entry['title']))
+        html.append("<img src='{}' alt='{}'>".format(entry['files'][0], entry['title']))
+    html.append("</body></html>")
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write("\n".join(html))
+    return entries
+
+
+def render_report(specs, output_dir, formats=('png',), max_workers=None):
+    """Render all specs in a process pool and write the index files.
+
+    With max_workers=1 everything is rendered in the current process.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    formats = tuple(formats)
+    rendered = {}
+    if max_workers == 1:
+        results = (render_chart(spec, output_dir, formats) for spec in specs)
+        for name, paths, seconds in results:
+            rendered[name] = (paths, seconds)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(render_chart, spec, output_dir, formats) for spec in specs]
+            for future in futures:
+                name, paths, seconds = future.result()
+                rendered[name] = (paths, seconds)
+    return write_index(specs, rendered, output_dir)
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def build_report_specs(path, chunksize=None, use_cache=True, approximate=(), years=None, regions=None,
+                       severity=None):
+    """Load or stream `path`, aggregate it and return the chart specs.
+
+    Columns in `approximate` are counted with top-K/distinct sketches. When
+    `path` is a Year=/Region= partitioned directory, only the partitions
+    matching `years` and `regions` are read and only `severity` rows kept.
+    """
+    from road_accidents.aggregate import AccidentAggregator, aggregate_frame, stream_aggregates
+    from road_accidents.partitions import PartitionedDataset
+
+    aggregator = AccidentAggregator(approximate=approximate)
+    dataset = PartitionedDataset(path) if os.path.isdir(path) else None
+    if chunksize:
+        if dataset is not None:
+            return build_chart_specs(dataset.aggregate(aggregator, years, regions, severity))
+        return build_chart_specs(stream_aggregates(path, chunksize, aggregator))
+
+    from road_accidents.cache import AccidentCache
+    from road_accidents.dtypes import compact_dtypes
+    from road_accidents.ingest import load_accidents
+
+    if dataset is not None:
+        df = dataset.load(years=years, regions=regions, severity=severity)
+    else:
+        df = AccidentCache(path).read() if use_cache else load_accidents(path)
+    df, _ = compact_dtypes(df)
+    return build_chart_specs(aggregate_frame(df, aggregator), df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the road accident report to image files.")
+    parser.add_argument('data', help="accident CSV file or Year=/Region= partitioned directory")
+    parser.add_argument('--output-dir', default='report', help="directory for the charts and index")
+    parser.add_argument('--format', dest='formats', action='append', choices=['png', 'svg'],
+                        help="output format (repeatable, default png)")
+    parser.add_argument('--workers', type=int, default=None, help="rendering processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="stream the CSV in chunks of this many rows (skips row-level charts)")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the Feather cache")
+    parser.add_argument('--approximate', action='store_true',
+                        help="count Intersection and City with bounded-memory sketches")
+    parser.add_argument('--years', default=None, help="partitioned data: e.g. 2019:2021 or 2019,2021")
+    parser.add_argument('--regions', default=None, help="partitioned data: e.g. North or North,East")
+    parser.add_argument('--severity', default=None, help="partitioned data: e.g. Fatal or Fatal,Serious")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    approximate = APPROX_COLUMNS if args.approximate else ()
+    specs = build_report_specs(args.data, args.chunk_size, use_cache=not args.no_cache, approximate=approximate,
+                               years=parse_filter(args.years), regions=parse_filter(args.regions),
+                               severity=args.severity.split(',') if args.severity else None)
+    aggregated = time.perf_counter()
+    entries = render_report(specs, args.output_dir, args.formats or ['png'], args.workers)
+    done = time.perf_counter()
+
+    slowest = max(entries, key=lambda e: e['render_seconds']) if entries else None
+    print("Aggregated data in {:.2f}s".format(aggregated - start))
+    print("Rendered {} charts to {} in {:.2f}s".format(len(entries), args.output_dir, done - aggregated))
+    if slowest:
+        print("Slowest chart: {} ({:.2f}s)".format(slowest['name'], slowest['render_seconds']))
+
+
+if __name__ == '__main__':
+    main()
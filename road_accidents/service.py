@@ -0,0 +1,510 @@
+# =============================================================================
+# Road Accident Analysis - Local JSON Query Service
+# =============================================================================
+#
+# Dashboards ask for the same section 1-10 numbers over and over. This
+# service loads the dataset once (Feather cache or partitioned directory,
+# compacted dtypes) and answers over HTTP on localhost:
+#
+#   GET /health                         rows loaded, cache statistics
+#   GET /results                        every result name, section and description
+#   GET /results/<name>?Region=North    one result as JSON
+#   GET /sections/<n>?Year=2019:2021    every result of a section
+#   GET /charts/<name>.png?Severity=Fatal
+#
+# Query parameters filter the rows before the result is computed: any column
+# name, with one value, a comma-separated list or an inclusive range
+# (Year=2019:2021), as in the partition filters. Each filtered subset is an
+# AccidentAnalysis of its own, so its loaded columns and results are memoized
+# like the unfiltered one.
+#
+# Encoded responses are kept in an LRU cache with a time-to-live, keyed by the
+# path and the sorted filters, so a repeated query is a dictionary lookup.
+# Identical queries arriving together share one computation. Results are
+# computed on a thread pool and charts rendered in a separate process pool,
+# so the event loop keeps accepting requests while a slow chart is drawn.
+#
+# The server is plain asyncio (no web framework) and binds to 127.0.0.1 by
+# default; port 0 picks a free port, which keeps it easy to run in tests.
+#
+# Usage:
+#   python -m road_accidents.service road-accident-data.csv --port 8765
+#   curl 'http://127.0.0.1:8765/results/severity_counts?Region=North&Year=2020'
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.analysis import RESULTS, AccidentAnalysis
+from road_accidents.hotspots import HotspotCells
+from road_accidents.partitions import filter_mask, parse_filter
+from road_accidents.timeseries import DailyCounts
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_TTL = 300.0
+
+# Filtered subsets (frames plus their memoized results) kept at once
+DEFAULT_SUBSETS = 16
+
+# Hotspot results are returned as their busiest cells
+MAX_HOTSPOT_CELLS = 100
+
+
+class NotFound(LookupError):
+    """Unknown result, section, chart or endpoint (HTTP 404)."""
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        # None keeps entries until they are evicted
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            expires = self.clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                'hits': self.hits, 'misses': self.misses}
+
+
+# -----------------------------------------------------------------------------
+# JSON conversion
+# -----------------------------------------------------------------------------
+def _scalar(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if np.isfinite(value) else None
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat() if value == value.normalize() else value.isoformat()
+    if isinstance(value, (pd.Period, pd.Interval, pd.Timedelta)):
+        return str(value)
+    if isinstance(value, tuple):
+        return [_scalar(item) for item in value]
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def jsonable(value):
+    """Plain JSON-ready data for a result value.
+
+    Series become {"name", "index", "values"} and DataFrames {"index",
+    "columns", "data"} (rows), as with pandas' "split" orientation.
+    """
+    if isinstance(value, DailyCounts):
+        value = value.series()
+    elif isinstance(value, HotspotCells):
+        value = value.top_cells(MAX_HOTSPOT_CELLS)
+    if isinstance(value, pd.DataFrame):
+        return {
+            'index': [_scalar(label) for label in value.index],
+            'columns': [_scalar(label) for label in value.columns],
+            'data': [[_scalar(item) for item in row] for row in value.to_numpy(dtype=object).tolist()],
+        }
+    if isinstance(value, pd.Series):
+        return {
+            'name': _scalar(value.name),
+            'index': [_scalar(label) for label in value.index],
+            'values': [_scalar(item) for item in value.to_numpy(dtype=object).tolist()],
+        }
+    if isinstance(value, dict):
+        return {str(_scalar(key)): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, np.ndarray)):
+        return [jsonable(item) for item in value]
+    return _scalar(value)
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+# Query service
+# -----------------------------------------------------------------------------
+def _number(value):
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("{!r} is not a number".format(value))
+
+
+def numeric_filter(wanted):
+    """A parsed filter with its values as numbers; ValueError for any that is not."""
+    if isinstance(wanted, slice):
+        return slice(_number(wanted.start), _number(wanted.stop))
+    if isinstance(wanted, list):
+        return [_number(value) for value in wanted]
+    return _number(wanted)
+
+
+def load_frame(path, use_cache=True):
+    """The whole dataset (CSV or partitioned directory) with compacted dtypes."""
+    from road_accidents.cache import AccidentCache
+    from road_accidents.dtypes import compact_dtypes
+    from road_accidents.ingest import load_accidents
+    from road_accidents.partitions import PartitionedDataset
+
+    if os.path.isdir(path):
+        df = PartitionedDataset(path).load()
+    else:
+        df = AccidentCache(path).read() if use_cache else load_accidents(path)
+    df, _ = compact_dtypes(df)
+    return df
+
+
+class AccidentService:
+    """Cached, filtered section 1-10 results of one loaded dataset."""
+
+    def __init__(self, df, cache_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_TTL, max_workers=None,
+                 chart_workers=1, subsets=DEFAULT_SUBSETS):
+        self.df = df
+        self.cache = ResultCache(cache_size, ttl)
+        # filter key -> (AccidentAnalysis of the subset, rows)
+        self._subsets = ResultCache(subsets, ttl)
+        # cache key -> Task computing it, so concurrent identical queries share it
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._chart_workers = chart_workers
+        self._chart_executor = None
+
+    @classmethod
+    def from_path(cls, path, use_cache=True, **kwargs):
+        return cls(load_frame(path, use_cache), **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._chart_executor is not None:
+            self._chart_executor.shutdown(wait=False)
+
+    # -------------------------------------------------------------------------
+    # Filtering
+    # -------------------------------------------------------------------------
+    def parse_filters(self, params):
+        """{column: filter} from query parameters; ValueError for unknown columns."""
+        filters = {}
+        for column, text in params:
+            if column not in self.df.columns:
+                raise ValueError("Unknown filter column {!r}".format(column))
+            filters[column] = text
+        return dict(sorted(filters.items()))
+
+    def subset(self, filters):
+        """(AccidentAnalysis, rows) for the rows matching `filters` (column -> filter text)."""
+        key = tuple(filters.items())
+        cached = self._subsets.get(key)
+        if cached is not None:
+            return cached
+        if filters:
+            mask = np.ones(len(self.df), dtype=bool)
+            for column, text in filters.items():
+                series = self.df[column]
+                try:
+                    wanted = parse_filter(text)
+                    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                        wanted = numeric_filter(wanted)
+                    mask &= filter_mask(series, wanted).to_numpy(dtype=bool)
+                except (TypeError, ValueError) as e:
+                    raise ValueError("Cannot filter {} by {!r}: {}".format(column, text, e))
+            df = self.df[mask].reset_index(drop=True)
+        else:
+            df = self.df
+        cached = (AccidentAnalysis.from_frame(df), len(df))
+        self._subsets.put(key, cached)
+        return cached
+
+    # -------------------------------------------------------------------------
+    # Computing (worker threads)
+    # -------------------------------------------------------------------------
+    def _analysis_for(self, name, filters):
+        # Analysis and row count of the filtered rows, if they can produce `name`
+        if name not in RESULTS:
+            raise NotFound("Unknown result {!r}".format(name))
+        analysis, rows = self.subset(filters)
+        if not analysis.has(*RESULTS[name].columns):
+            raise NotFound("{} needs columns {} which the data does not have".format(
+                name, ', '.join(RESULTS[name].columns)))
+        return analysis, rows
+
+    def compute(self, name, filters):
+        """Encoded JSON for one result of the filtered rows."""
+        analysis, rows = self._analysis_for(name, filters)
+        start = time.perf_counter()
+        value = analysis.get(name)
+        return _encode({
+            'name': name,
+            'section': RESULTS[name].section,
+            'filters': filters,
+            'rows': rows,
+            'seconds': round(time.perf_counter() - start, 6),
+            'value': jsonable(value),
+        })
+
+    def chart_spec(self, name, filters):
+        if name in RESULTS and RESULTS[name].chart is None:
+            raise NotFound("{} has no chart".format(name))
+        analysis, _ = self._analysis_for(name, filters)
+        return analysis.chart_spec(name)
+
+    def section_names(self, section):
+        """Results of `section` whose columns the data has."""
+        analysis, _ = self.subset({})
+        return [name for name, spec in RESULTS.items()
+                if spec.section == section and analysis.has(*spec.columns)]
+
+    # -------------------------------------------------------------------------
+    # Async entry points
+    # -------------------------------------------------------------------------
+    async def _cached(self, key, make):
+        value = self.cache.get(key)
+        if value is not None:
+            return value, True
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key, make))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task), False
+
+    async def _fill(self, key, make):
+        value = await make()
+        self.cache.put(key, value)
+        return value
+
+    def _run(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def result(self, name, filters):
+        """(JSON bytes, served from cache) for one result."""
+        key = ('result', name, tuple(filters.items()))
+        return await self._cached(key, partial(self._run, self.compute, name, filters))
+
+    async def section(self, section, filters):
+        names = await self._run(self.section_names, section)
+        if not names:
+            raise NotFound("No results for section {!r}".format(section))
+        bodies = await asyncio.gather(*(self.result(name, filters) for name in names))
+        # The cached bodies are already encoded; splice them into one object
+        parts = ['"{}":{}'.format(name, body.decode('utf-8')) for name, (body, _) in zip(names, bodies)]
+        return '{{"section":{},"filters":{},"results":{{{}}}}}'.format(
+            section, json.dumps(filters, separators=(',', ':')), ','.join(parts)).encode('utf-8'), all(hit for _, hit in bodies)
+
+    def _chart_pool(self):
+        if self._chart_executor is None:
+            # spawn: the workers must not inherit this process's threads
+            self._chart_executor = ProcessPoolExecutor(
+                self._chart_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._chart_executor
+
+    def _reset_chart_pool(self, broken):
+        # Only the broken pool: a concurrent chart may already have replaced it
+        broken.shutdown(wait=False)
+        if self._chart_executor is broken:
+            self._chart_executor = None
+
+    async def chart(self, name, filters):
+        """(PNG bytes, served from cache) for one result's chart."""
+        from road_accidents.report import render_chart_bytes
+
+        async def make():
+            spec = await self._run(self.chart_spec, name, filters)
+            loop = asyncio.get_running_loop()
+            pool = self._chart_pool()
+            try:
+                return await loop.run_in_executor(pool, render_chart_bytes, spec)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool and retry once
+                self._reset_chart_pool(pool)
+                return await loop.run_in_executor(self._chart_pool(), render_chart_bytes, spec)
+
+        return await self._cached(('chart', name, tuple(filters.items())), make)
+
+    def health(self):
+        return _encode({'status': 'ok', 'rows': len(self.df), 'columns': list(self.df.columns),
+                        'cache': self.cache.stats(), 'subsets': self._subsets.stats()})
+
+    def catalogue(self):
+        return _encode([{'name': name, 'section': spec.section, 'columns': spec.columns,
+                         'chart': spec.chart is not None, 'description': spec.description}
+                        for name, spec in RESULTS.items()])
+
+
+# -----------------------------------------------------------------------------
+# HTTP
+# -----------------------------------------------------------------------------
+def _error(status, message):
+    return status, 'application/json', _encode({'error': message}), False
+
+
+async def handle_request(service, method, target):
+    """(status, content type, body, served from cache) for one request."""
+    if method not in ('GET', 'HEAD'):
+        return _error(405, "Only GET is supported")
+    url = urlsplit(target)
+    parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+    try:
+        filters = service.parse_filters(parse_qsl(url.query))
+        if parts == ['health']:
+            return 200, 'application/json', service.health(), False
+        if parts == ['results']:
+            return 200, 'application/json', service.catalogue(), False
+        if len(parts) == 2 and parts[0] == 'results':
+            body, hit = await service.result(parts[1], filters)
+            return 200, 'application/json', body, hit
+        if len(parts) == 2 and parts[0] == 'sections' and parts[1].isdigit():
+            body, hit = await service.section(int(parts[1]), filters)
+            return 200, 'application/json', body, hit
+        if len(parts) == 2 and parts[0] == 'charts' and parts[1].endswith('.png'):
+            body, hit = await service.chart(parts[1][:-len('.png')], filters)
+            return 200, 'image/png', body, hit
+        raise NotFound("No such endpoint: {}".format(url.path))
+    except ValueError as e:
+        return _error(400, str(e))
+    except NotFound as e:
+        return _error(404, str(e))
+    except Exception as e:
+        return _error(500, "{}: {}".format(type(e).__name__, e))
+
+
+async def handle_connection(service, reader, writer):
+    """Serve HTTP/1.1 requests on one connection (keep-alive unless the client closes)."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            start = time.perf_counter()
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                status, content_type, body, hit = _error(400, "Malformed request line")
+                version, method = 'HTTP/1.0', 'GET'
+            else:
+                status, content_type, body, hit = await handle_request(service, method, target)
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+            head = [
+                'HTTP/1.1 {} {}'.format(status, REASONS.get(status, '')),
+                'Content-Type: {}'.format(content_type),
+                'Content-Length: {}'.format(len(body)),
+                'X-Cache: {}'.format('hit' if hit else 'miss'),
+                'X-Response-Time: {:.6f}'.format(time.perf_counter() - start),
+                'Connection: {}'.format('keep-alive' if keep_alive else 'close'),
+            ]
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            if method != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Start serving `service`; returns the asyncio Server (port 0 picks a free one)."""
+    return await asyncio.start_server(partial(handle_connection, service), host, port)
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+async def _serve(service, host, port):
+    server = await start_server(service, host, port)
+    host, port = server.sockets[0].getsockname()[:2]
+    print("Serving {} rows on http://{}:{}/ (Ctrl+C to stop)".format(len(service.df), host, port))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the accident statistics as JSON on localhost.")
+    parser.add_argument('data', help="accident CSV file or Year=/Region= partitioned directory")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help="cached responses")
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help="seconds a cached response stays valid")
+    parser.add_argument('--workers', type=int, default=None, help="threads computing results")
+    parser.add_argument('--chart-workers', type=int, default=1, help="processes rendering charts")
+    parser.add_argument('--no-cache', action='store_true', help="read the CSV instead of the Feather cache")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    service = AccidentService.from_path(args.data, use_cache=not args.no_cache, cache_size=args.cache_size,
+                                        ttl=args.ttl, max_workers=args.workers, chart_workers=args.chart_workers)
+    print("Loaded {} rows in {:.2f}s".format(len(service.df), time.perf_counter() - start))
+    try:
+        asyncio.run(_serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
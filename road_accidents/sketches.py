@@ -0,0 +1,368 @@
+# =============================================================================
+# Road Accident Analysis - Approximate Top-K and Distinct Counts
+# =============================================================================
+#
+# Exact value_counts() on Intersection or City keeps a hash table of every
+# distinct value just to draw ten bars. In approximate mode those columns are
+# summarised with fixed-size streaming sketches instead:
+#
+#   * CountMinSketch - depth x width counters; an estimate never undercounts
+#     and overcounts by at most e/width * N with probability 1 - e^-depth.
+#   * TopKSketch     - a Count-Min sketch plus a bounded set of candidate
+#     heavy hitters (values whose estimate ranks in the top `capacity`).
+#   * HyperLogLog    - 2^p one-byte registers; distinct count with a relative
+#     standard error of about 1.04 / sqrt(2^p).
+#
+# Each chunk is factorized first, so only its distinct values are hashed and
+# the sketches are updated with per-value weights. Memory is bounded by the
+# sketch sizes plus one chunk, whatever the number of distinct values.
+#
+# Usage:
+#   python -m road_accidents.sketches road-accident-data.csv --column Intersection --chunk-size 100000 --verify
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.ingest import RunningCounts, iter_accident_chunks
+
+# High-cardinality columns that approximate mode sketches
+APPROX_COLUMNS = ['Intersection', 'City']
+
+DEFAULT_TOP_K = 10
+DEFAULT_WIDTH = 1 << 14
+DEFAULT_DEPTH = 5
+DEFAULT_HLL_PRECISION = 14
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def hash_values(values):
+    """Stable 64-bit hashes of values (the same value hashes alike in every chunk)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def _value_weights(values):
+    # Distinct non-missing values of one chunk and how often each occurs
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    weights = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    return np.asarray(uniques, dtype=object), weights
+
+
+def _leading_zeros(words):
+    """Leading zero bits of each uint64 (64 for zero), exact via two 32-bit halves."""
+    high = (words >> np.uint64(32)).astype(np.float64)
+    low = (words & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        high_lz = 31 - np.floor(np.log2(high))
+        low_lz = 63 - np.floor(np.log2(low))
+    return np.where(high > 0, high_lz, np.where(low > 0, low_lz, 64)).astype(np.int64)
+
+
+class CountMinSketch:
+    """Count-Min sketch over 64-bit value hashes."""
+
+    def __init__(self, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, seed=0):
+        self.width = int(width)
+        self.depth = int(depth)
+        self.seed = seed
+        self.total = 0
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        # Odd multipliers and offsets of one multiply-add hash per row
+        self._mult = rng.integers(1, 1 << 63, size=self.depth, dtype=np.uint64) | np.uint64(1)
+        self._add = rng.integers(0, 1 << 63, size=self.depth, dtype=np.uint64)
+
+    def _buckets(self, hashes):
+        with np.errstate(over='ignore'):
+            mixed = hashes[None, :] * self._mult[:, None] + self._add[:, None]
+        return ((mixed >> np.uint64(32)) % np.uint64(self.width)).astype(np.int64)
+
+    def add_hashes(self, hashes, weights):
+        weights = np.asarray(weights, dtype=np.int64)
+        self.total += int(weights.sum())
+        for row, buckets in enumerate(self._buckets(hashes)):
+            self.table[row] += np.bincount(buckets, weights=weights, minlength=self.width).astype(np.int64)
+
+    def update(self, values):
+        uniques, weights = _value_weights(values)
+        self.add_hashes(hash_values(uniques), weights)
+        return self
+
+    def estimate_hashes(self, hashes):
+        buckets = self._buckets(hashes)
+        return self.table[np.arange(self.depth)[:, None], buckets].min(axis=0)
+
+    def estimate(self, values):
+        return self.estimate_hashes(hash_values(values))
+
+    def merge(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Count-Min sketches must share width, depth and seed to merge")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    @property
+    def epsilon(self):
+        return np.e / self.width
+
+    @property
+    def delta(self):
+        return float(np.exp(-self.depth))
+
+    def error_bound(self):
+        """Maximum overcount (absolute), holding with probability 1 - delta."""
+        return self.epsilon * self.total
+
+
+class TopKSketch:
+    """Approximate heavy hitters: Count-Min estimates over a bounded candidate set."""
+
+    def __init__(self, k=DEFAULT_TOP_K, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, capacity=None, seed=0):
+        self.k = k
+        self.capacity = capacity or 20 * k
+        self.sketch = CountMinSketch(width, depth, seed)
+        # value -> hash of the current candidates
+        self.candidates = {}
+
+    def add(self, uniques, hashes, weights):
+        """Count distinct `uniques` (with their hashes) `weights` times each."""
+        self.sketch.add_hashes(hashes, weights)
+        self._prune(uniques, hashes)
+
+    def update(self, values):
+        uniques, weights = _value_weights(values)
+        if len(uniques):
+            self.add(uniques, hash_values(uniques), weights)
+        return self
+
+    def _prune(self, uniques, hashes):
+        # Keep the `capacity` values with the highest estimates
+        values = list(self.candidates) + list(uniques)
+        all_hashes = np.concatenate([np.fromiter(self.candidates.values(), dtype=np.uint64,
+                                                 count=len(self.candidates)), hashes])
+        estimates = self.sketch.estimate_hashes(all_hashes)
+        order = np.argsort(-estimates, kind='stable')
+        self.candidates = {}
+        for i in order:
+            if len(self.candidates) >= self.capacity:
+                break
+            self.candidates.setdefault(values[i], all_hashes[i])
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        uniques = np.asarray(list(other.candidates), dtype=object)
+        hashes = np.fromiter(other.candidates.values(), dtype=np.uint64, count=len(other.candidates))
+        self._prune(uniques, hashes)
+        return self
+
+    def top(self, n=None):
+        """Estimated counts of the n (default k) heaviest values, largest first."""
+        n = n or self.k
+        values = list(self.candidates)
+        hashes = np.fromiter(self.candidates.values(), dtype=np.uint64, count=len(values))
+        estimates = pd.Series(self.sketch.estimate_hashes(hashes), index=pd.Index(values, dtype=object),
+                              name='count')
+        return estimates.sort_values(ascending=False, kind='stable').head(n)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2^precision registers."""
+
+    def __init__(self, precision=DEFAULT_HLL_PRECISION):
+        self.precision = int(precision)
+        self.m = 1 << self.precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = (hashes << np.uint64(self.precision)) & _MASK64
+        rank = np.minimum(_leading_zeros(rest) + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values):
+        uniques, _ = _value_weights(values)
+        self.add_hashes(hash_values(uniques))
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("HyperLogLog sketches must share the precision to merge")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self):
+        """Relative standard error of estimate()."""
+        return 1.04 / np.sqrt(self.m)
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class ColumnSummary:
+    """Top values and distinct count of one column, exact or approximate."""
+
+    def __init__(self, column, top, distinct, total, exact, overcount=0.0, delta=0.0, distinct_error=0.0,
+                 counts=None):
+        self.column = column
+        # Series of (estimated) counts, largest first
+        self.top = top
+        # Every value's exact count (exact mode only)
+        self.counts = counts
+        self.distinct = distinct
+        self.total = total
+        self.exact = exact
+        # Counts overestimate by at most `overcount` with probability 1 - delta
+        self.overcount = overcount
+        self.delta = delta
+        # Relative standard error of `distinct`
+        self.distinct_error = distinct_error
+
+    def bounds(self):
+        """One-line statement of the error bounds."""
+        if self.exact:
+            return "{}: exact counts, {:,} distinct values".format(self.column, self.distinct)
+        return ("{}: approximate counts over {:,} rows, each at most {:,.0f} too high "
+                "(probability {:.1%}); ~{:,} distinct values (±{:.1%} standard error)").format(
+            self.column, self.total, self.overcount, 1 - self.delta, self.distinct, self.distinct_error)
+
+
+class SketchAccumulator:
+    """Single-pass top-K and distinct counts for several columns, chunk by chunk.
+
+    With exact=True the same interface keeps full value counts, for
+    verifying the approximate results.
+    """
+
+    def __init__(self, columns=APPROX_COLUMNS, k=DEFAULT_TOP_K, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH,
+                 precision=DEFAULT_HLL_PRECISION, exact=False):
+        self.columns = list(columns)
+        self.k = k
+        self.exact = exact
+        self.total_rows = 0
+        if exact:
+            self._counts = {col: RunningCounts() for col in self.columns}
+        else:
+            self._top = {col: TopKSketch(k, width, depth) for col in self.columns}
+            self._distinct = {col: HyperLogLog(precision) for col in self.columns}
+
+    def update(self, chunk):
+        self.total_rows += len(chunk)
+        for col in self.columns:
+            if col not in chunk.columns:
+                continue
+            if self.exact:
+                self._counts[col].add(chunk[col].value_counts(sort=False))
+            else:
+                uniques, weights = _value_weights(chunk[col])
+                if not len(uniques):
+                    continue
+                hashes = hash_values(uniques)
+                self._top[col].add(uniques, hashes, weights)
+                self._distinct[col].add_hashes(hashes)
+        return self
+
+    def merge(self, other):
+        self.total_rows += other.total_rows
+        for col in self.columns:
+            if self.exact:
+                counts = other._counts[col].total()
+                if counts is not None:
+                    self._counts[col].add(counts)
+            else:
+                self._top[col].merge(other._top[col])
+                self._distinct[col].merge(other._distinct[col])
+        return self
+
+    def result(self):
+        """{column: ColumnSummary} for every column seen."""
+        summaries = {}
+        for col in self.columns:
+            if self.exact:
+                counts = self._counts[col].total()
+                if counts is None:
+                    continue
+                counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+                counts.index = pd.Index(np.asarray(counts.index), name=col)
+                counts.name = 'count'
+                summaries[col] = ColumnSummary(col, counts.head(self.k), len(counts), int(counts.sum()), True,
+                                               counts=counts)
+            else:
+                top = self._top[col]
+                if not top.sketch.total:
+                    continue
+                counts = top.top(top.capacity)
+                counts.index.name = col
+                hll = self._distinct[col]
+                summaries[col] = ColumnSummary(
+                    col, counts.head(self.k), hll.estimate(), top.sketch.total, False,
+                    top.sketch.error_bound(), top.sketch.delta, hll.relative_error)
+        return summaries
+
+
+def sketch_columns(path, chunksize, columns=APPROX_COLUMNS, k=DEFAULT_TOP_K, exact=False, report=None):
+    """Top-K and distinct counts of `columns` in one chunked pass over the CSV."""
+    accumulator = SketchAccumulator(columns, k, exact=exact)
+    for chunk in iter_accident_chunks(path, chunksize, usecols=columns, report=report):
+        accumulator.update(chunk)
+    return accumulator.result()
+
+
+def compare_summaries(approx, exact):
+    """Frame of each approximate top value's estimate against its exact count and rank."""
+    rows = []
+    for col, summary in approx.items():
+        counts = exact[col].counts
+        ranks = pd.Series(np.arange(1, len(counts) + 1), index=counts.index)
+        for value, estimate in summary.top.items():
+            rows.append({'column': col, 'value': value, 'estimate': int(estimate),
+                         'exact': int(counts.get(value, 0)), 'exact_rank': int(ranks.get(value, 0))})
+    return pd.DataFrame(rows)
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Approximate top-K and distinct counts of accident columns.")
+    parser.add_argument('data', help="accident CSV file")
+    parser.add_argument('--column', action='append', default=None,
+                        help="column to summarise (repeatable; default: {})".format(', '.join(APPROX_COLUMNS)))
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_K, help="number of top values")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="rows per chunk")
+    parser.add_argument('--exact', action='store_true', help="exact counts instead of sketches")
+    parser.add_argument('--verify', action='store_true', help="also compute exact counts and compare")
+    args = parser.parse_args(argv)
+    columns = args.column or APPROX_COLUMNS
+
+    start = time.perf_counter()
+    summaries = sketch_columns(args.data, args.chunk_size, columns, args.top, exact=args.exact)
+    elapsed = time.perf_counter() - start
+    for summary in summaries.values():
+        print(summary.bounds())
+        print(summary.top.to_string())
+    print("({:.3f}s)".format(elapsed))
+
+    if args.verify and not args.exact:
+        start = time.perf_counter()
+        exact = sketch_columns(args.data, args.chunk_size, columns, args.top, exact=True)
+        print("Exact pass: {:.3f}s".format(time.perf_counter() - start))
+        for col, summary in exact.items():
+            print("{}: {:,} distinct (estimate {:,})".format(col, summary.distinct, summaries[col].distinct))
+        print(compare_summaries(summaries, exact).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
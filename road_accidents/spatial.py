@@ -0,0 +1,340 @@
+# =============================================================================
+# Road Accident Analysis - Spatial Index and Hotspot Queries
+# =============================================================================
+#
+# A grid-bucket index over the accident coordinates, built once and saved as
+# plain .npy arrays in the cache directory so later runs memory-map it and
+# answer queries in milliseconds:
+#
+#   * radius_counts(lat, lon, km)  - accidents within R km of a point
+#   * bbox_counts(...) / bbox_rows - accidents inside a bounding box
+#   * top_cells(n, severity)       - the n densest cells (e.g. 500 m squares)
+#
+# Every count is broken down by Severity. Points are sorted by cell key
+# (row-major: cell row, then cell column), so the points of one row of cells
+# form a contiguous slice and a query only touches the cells it overlaps.
+#
+# Cells are CELL_METERS on a side, using a local equirectangular projection
+# around the mean latitude of the data, so they are close to square over a
+# country-sized area.
+#
+# Usage:
+#   python -m road_accidents.spatial road-accident-data.csv --top 10 --severity Fatal
+#   python -m road_accidents.spatial road-accident-data.csv --radius 28.61 77.21 5
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.cache import DEFAULT_CACHE_DIR, cache_stem, read_json, source_signature, source_unchanged, write_json
+from road_accidents.ingest import available_columns, iter_accident_chunks, read_header
+
+CELL_METERS = 500
+
+METERS_PER_DEGREE = 111320.0
+EARTH_RADIUS_KM = 6371.0088
+
+UNKNOWN_SEVERITY = 'Unknown'
+
+# Rows per chunk when building from the CSV (only three columns are kept)
+BUILD_CHUNK_SIZE = 500_000
+
+# Bump when the on-disk layout changes
+INDEX_VERSION = 1
+
+_ARRAYS = ['lat', 'lon', 'severity', 'rows', 'keys', 'cell_keys', 'cell_counts']
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (vectorized over numpy arrays)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex:
+    """Grid-bucket index over accident coordinates with Severity breakdowns."""
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.levels = meta['levels']
+        self.cell_meters = meta['cell_meters']
+        self.lat0 = meta['lat0']
+        self.cell_lat = meta['cell_lat']
+        self.cell_lon = meta['cell_lon']
+        self.origin_lat = meta['origin_lat']
+        self.origin_lon = meta['origin_lon']
+        self.nx = meta['nx']
+        self.ny = meta['ny']
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        # cells x levels counts, computed lazily from the sorted points
+        self._cell_levels = arrays.get('cell_levels')
+
+    # -------------------------------------------------------------------------
+    # Construction and persistence
+    # -------------------------------------------------------------------------
+    @classmethod
+    def build(cls, lat, lon, severity=None, cell_meters=CELL_METERS):
+        """Build the index from coordinate arrays (NaN coordinates are skipped)."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        lat, lon = lat[rows], lon[rows]
+        if severity is None:
+            severity = np.full(len(rows), UNKNOWN_SEVERITY, dtype=object)
+        else:
+            severity = pd.Series(severity).astype(object).to_numpy()[rows]
+            severity = np.where(pd.isna(severity), UNKNOWN_SEVERITY, severity)
+        codes, levels = pd.factorize(severity, sort=True)
+
+        lat0 = float(lat.mean()) if len(lat) else 0.0
+        cell_lat = cell_meters / METERS_PER_DEGREE
+        cell_lon = cell_meters / (METERS_PER_DEGREE * max(np.cos(np.radians(lat0)), 1e-6))
+        origin_lat = float(lat.min()) if len(lat) else 0.0
+        origin_lon = float(lon.min()) if len(lon) else 0.0
+        cy = np.floor((lat - origin_lat) / cell_lat).astype(np.int64)
+        cx = np.floor((lon - origin_lon) / cell_lon).astype(np.int64)
+        nx = int(cx.max()) + 1 if len(cx) else 1
+        ny = int(cy.max()) + 1 if len(cy) else 1
+        keys = cy * nx + cx
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        cell_keys, cell_counts = np.unique(keys, return_counts=True)
+        arrays = {
+            'lat': lat[order],
+            'lon': lon[order],
+            'severity': codes[order].astype(np.int16),
+            'rows': rows[order].astype(np.int64),
+            'keys': keys,
+            'cell_keys': cell_keys,
+            'cell_counts': cell_counts.astype(np.int64),
+        }
+        meta = {
+            'version': INDEX_VERSION,
+            'levels': [str(level) for level in levels],
+            'cell_meters': cell_meters,
+            'lat0': lat0,
+            'cell_lat': cell_lat,
+            'cell_lon': cell_lon,
+            'origin_lat': origin_lat,
+            'origin_lon': origin_lon,
+            'nx': nx,
+            'ny': ny,
+            'points': int(len(rows)),
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory, extra_meta=None):
+        os.makedirs(directory, exist_ok=True)
+        arrays = {name: getattr(self, name) for name in _ARRAYS}
+        arrays['cell_levels'] = self._cell_levels_array()
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + '.npy'), array)
+        write_json(os.path.join(directory, 'meta.json'), {**self.meta, **(extra_meta or {})})
+
+    @classmethod
+    def load(cls, directory):
+        """Open a saved index; the arrays are memory-mapped, not read."""
+        meta = read_json(os.path.join(directory, 'meta.json'))
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+                  for name in _ARRAYS + ['cell_levels']}
+        return cls(arrays, meta)
+
+    @classmethod
+    def for_source(cls, path, cell_meters=CELL_METERS, cache_dir=DEFAULT_CACHE_DIR, chunksize=BUILD_CHUNK_SIZE):
+        """Load the saved index for a CSV, (re)building it if missing or stale.
+
+        A rebuild streams the CSV in chunks and keeps only the coordinates and
+        Severity, so it never holds the full dataset in memory.
+        """
+        stem = cache_stem(path)
+        directory = os.path.join(cache_dir, '{}.spatial-{}m'.format(stem, cell_meters))
+        meta = read_json(os.path.join(directory, 'meta.json'))
+        if meta is not None and meta.get('version') == INDEX_VERSION:
+            mtime_ns = meta.get('mtime_ns')
+            if source_unchanged(meta, path):
+                if meta['mtime_ns'] != mtime_ns:
+                    write_json(os.path.join(directory, 'meta.json'), meta)
+                return cls.load(directory)
+
+        missing = [col for col in ('Latitude', 'Longitude') if col not in available_columns(read_header(path))]
+        if missing:
+            raise ValueError("{} has no {} column".format(path, ' or '.join(missing)))
+        signature = source_signature(path)
+        chunks = iter_accident_chunks(path, chunksize, usecols=['Latitude', 'Longitude', 'Severity'])
+        columns = {'Latitude': [], 'Longitude': [], 'Severity': []}
+        for chunk in chunks:
+            for col, parts in columns.items():
+                if col in chunk.columns:
+                    values = chunk[col]
+                    parts.append(pd.Categorical(values.astype(object)) if col == 'Severity'
+                                 else values.to_numpy(np.float64))
+        # A CSV without data rows yields no chunks: an empty index
+        df = pd.DataFrame({
+            'Latitude': np.concatenate(columns['Latitude'] or [np.empty(0)]),
+            'Longitude': np.concatenate(columns['Longitude'] or [np.empty(0)]),
+            **({'Severity': pd.api.types.union_categoricals(columns['Severity'], ignore_order=True)}
+               if columns['Severity'] else {}),
+        })
+        severity = df['Severity'] if 'Severity' in df.columns else None
+        index = cls.build(df['Latitude'], df['Longitude'], severity, cell_meters)
+        index.save(directory, signature)
+        return cls.load(directory)
+
+    # -------------------------------------------------------------------------
+    # Helpers
+    # -------------------------------------------------------------------------
+    def _cell_levels_array(self):
+        if self._cell_levels is None:
+            # Position of each point's cell in cell_keys, then bincount per level
+            cell_pos = np.repeat(np.arange(len(self.cell_keys)), self.cell_counts)
+            flat = cell_pos * len(self.levels) + np.asarray(self.severity)
+            counts = np.bincount(flat, minlength=len(self.cell_keys) * len(self.levels))
+            self._cell_levels = counts.reshape(len(self.cell_keys), len(self.levels))
+        return self._cell_levels
+
+    def _level_counts(self, codes):
+        counts = np.bincount(np.asarray(codes, dtype=np.int64), minlength=len(self.levels))
+        return pd.Series(counts, index=pd.Index(self.levels, name='Severity'), name='count')
+
+    def _candidates(self, lat_min, lat_max, lon_min, lon_max):
+        """Positions (into the sorted arrays) of points in cells overlapping the box."""
+        cy_lo = max(int(np.floor((lat_min - self.origin_lat) / self.cell_lat)), 0)
+        cy_hi = min(int(np.floor((lat_max - self.origin_lat) / self.cell_lat)), self.ny - 1)
+        cx_lo = max(int(np.floor((lon_min - self.origin_lon) / self.cell_lon)), 0)
+        cx_hi = min(int(np.floor((lon_max - self.origin_lon) / self.cell_lon)), self.nx - 1)
+        if cy_lo > cy_hi or cx_lo > cx_hi:
+            return np.empty(0, dtype=np.int64)
+        cell_rows = np.arange(cy_lo, cy_hi + 1, dtype=np.int64) * self.nx
+        # One contiguous slice of the sorted keys per row of cells
+        starts = np.searchsorted(self.keys, cell_rows + cx_lo, side='left')
+        ends = np.searchsorted(self.keys, cell_rows + cx_hi, side='right')
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return np.arange(lengths.sum()) + offsets
+
+    def _level_code(self, severity):
+        if severity not in self.levels:
+            raise ValueError("Unknown Severity {!r}; choose from {}".format(severity, ', '.join(self.levels)))
+        return self.levels.index(severity)
+
+    def _severity_mask(self, codes, severity):
+        if severity is None:
+            return np.ones(len(codes), dtype=bool)
+        return np.asarray(codes) == self._level_code(severity)
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+    def radius_counts(self, lat, lon, radius_km):
+        """Accidents within `radius_km` of (lat, lon), by Severity."""
+        dlat = radius_km / (METERS_PER_DEGREE / 1000.0)
+        dlon = radius_km / (METERS_PER_DEGREE / 1000.0 * max(np.cos(np.radians(lat)), 1e-6))
+        pos = self._candidates(lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        inside = haversine_km(lat, lon, np.asarray(self.lat)[pos], np.asarray(self.lon)[pos]) <= radius_km
+        return self._level_counts(np.asarray(self.severity)[pos][inside])
+
+    def radius_count(self, lat, lon, radius_km, severity=None):
+        counts = self.radius_counts(lat, lon, radius_km)
+        return int(counts.sum() if severity is None else counts.get(severity, 0))
+
+    def _bbox_positions(self, lat_min, lat_max, lon_min, lon_max):
+        pos = self._candidates(lat_min, lat_max, lon_min, lon_max)
+        lat = np.asarray(self.lat)[pos]
+        lon = np.asarray(self.lon)[pos]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return pos[inside]
+
+    def bbox_counts(self, lat_min, lat_max, lon_min, lon_max):
+        """Accidents inside the bounding box, by Severity."""
+        pos = self._bbox_positions(lat_min, lat_max, lon_min, lon_max)
+        return self._level_counts(np.asarray(self.severity)[pos])
+
+    def bbox_rows(self, lat_min, lat_max, lon_min, lon_max, severity=None):
+        """Original row positions of the accidents inside the bounding box."""
+        pos = self._bbox_positions(lat_min, lat_max, lon_min, lon_max)
+        pos = pos[self._severity_mask(np.asarray(self.severity)[pos], severity)]
+        return np.sort(np.asarray(self.rows)[pos])
+
+    def top_cells(self, n=10, severity=None):
+        """The n densest cells (by all accidents or one Severity level).
+
+        Returns a DataFrame with each cell's centre, bounds, total and
+        per-Severity counts.
+        """
+        cell_levels = self._cell_levels_array()
+        ranking = (np.asarray(self.cell_counts) if severity is None
+                   else cell_levels[:, self._level_code(severity)])
+        n = min(n, len(ranking))
+        if n == 0:
+            return pd.DataFrame(columns=['lat', 'lon', 'total'] + self.levels)
+        top = np.argpartition(-ranking, n - 1)[:n]
+        top = top[np.lexsort((top, -ranking[top]))]
+
+        keys = np.asarray(self.cell_keys)[top]
+        cy, cx = np.divmod(keys, self.nx)
+        lat_min = self.origin_lat + cy * self.cell_lat
+        lon_min = self.origin_lon + cx * self.cell_lon
+        frame = pd.DataFrame({
+            'lat': lat_min + self.cell_lat / 2,
+            'lon': lon_min + self.cell_lon / 2,
+            'lat_min': lat_min,
+            'lat_max': lat_min + self.cell_lat,
+            'lon_min': lon_min,
+            'lon_max': lon_min + self.cell_lon,
+            'total': np.asarray(self.cell_counts)[top],
+        })
+        for i, level in enumerate(self.levels):
+            frame[level] = cell_levels[top, i]
+        return frame
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the accident spatial index.")
+    parser.add_argument('data', help="accident CSV file")
+    parser.add_argument('--cell-meters', type=int, default=CELL_METERS, help="grid cell size")
+    parser.add_argument('--top', type=int, default=None, help="show the N densest cells")
+    parser.add_argument('--severity', default=None, help="rank cells by this Severity level")
+    parser.add_argument('--radius', nargs=3, type=float, metavar=('LAT', 'LON', 'KM'),
+                        help="count accidents within KM of LAT, LON")
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'),
+                        help="count accidents inside a bounding box")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        index = SpatialIndex.for_source(args.data, args.cell_meters)
+    except ValueError as e:
+        parser.exit(1, "{}: error: {}\n".format(parser.prog, e))
+    print("Index ready in {:.3f}s ({} points)".format(time.perf_counter() - start, index.meta['points']))
+
+    if args.top:
+        start = time.perf_counter()
+        try:
+            print(index.top_cells(args.top, args.severity).to_string(index=False))
+        except ValueError as e:
+            parser.exit(1, "{}: error: {}\n".format(parser.prog, e))
+        print("({:.3f}s)".format(time.perf_counter() - start))
+    if args.radius:
+        start = time.perf_counter()
+        print(index.radius_counts(*args.radius).to_string())
+        print("({:.3f}s)".format(time.perf_counter() - start))
+    if args.bbox:
+        start = time.perf_counter()
+        print(index.bbox_counts(*args.bbox).to_string())
+        print("({:.3f}s)".format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
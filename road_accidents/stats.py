@@ -0,0 +1,257 @@
+# =============================================================================
+# Road Accident Analysis - Significance Tests and Bootstrap Intervals
+# =============================================================================
+#
+# The tests sections 3b, 4c and 9c ask for ("significant difference?"):
+#
+#   * chi_square / crosstab_tests - independence of the aggregated crosstabs
+#   * factor_presence_tests       - the same per Contributing_Factors factor,
+#     as a present/absent table so every accident is counted once
+#   * mann_whitney / ks_test      - two distributions, e.g. Age of male vs.
+#     female drivers, computed from value -> count tables so they work on the
+#     aggregates and cost O(distinct values) rather than O(rows log rows)
+#   * proportion_intervals        - bootstrap confidence intervals for the
+#     fatal/serious percentages
+#
+# The bootstrap is vectorized in batches. A statistic of a categorical column
+# depends only on the category counts, and resampling n rows with replacement
+# gives multinomial(n, p) counts, so bootstrap_counts draws a whole batch of
+# resampled count vectors at once: cost per resample is O(categories), not
+# O(rows). bootstrap_indices is the general version that resamples row
+# indices in (batch x n) blocks. Batches get independent seeds and can be
+# spread over processes with max_workers.
+#
+# scipy.stats is imported only for the reference distributions.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_BATCH = 1000
+
+# Keep a batch of resampled indices under roughly this many elements
+MAX_BATCH_ELEMENTS = 1 << 24
+
+
+# -----------------------------------------------------------------------------
+# Contingency tables
+# -----------------------------------------------------------------------------
+def chi_square(table):
+    """Pearson chi-square test of independence for a count table (DataFrame)."""
+    from scipy.stats import chi2
+
+    observed = np.asarray(table, dtype=np.float64)
+    # Empty rows/columns carry no information and would give zero expectations
+    observed = observed[observed.sum(axis=1) > 0][:, observed.sum(axis=0) > 0]
+    n = observed.sum()
+    rows, cols = observed.shape
+    if n == 0 or rows < 2 or cols < 2:
+        return {'n': int(n), 'chi2': np.nan, 'dof': 0, 'p_value': np.nan, 'cramers_v': np.nan}
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / n
+    statistic = float(((observed - expected) ** 2 / expected).sum())
+    dof = (rows - 1) * (cols - 1)
+    return {
+        'n': int(n),
+        'chi2': statistic,
+        'dof': dof,
+        'p_value': float(chi2.sf(statistic, dof)),
+        'cramers_v': float(np.sqrt(statistic / (n * (min(rows, cols) - 1)))),
+        # Share of cells with expected count < 5 (the approximation is rough above ~20%)
+        'sparse_cells': float((expected < 5).mean()),
+    }
+
+
+def crosstab_tests(crosstabs):
+    """chi_square() for every {(row, column): table} crosstab, as a DataFrame."""
+    results = [{'row': row, 'column': column, **chi_square(table)}
+               for (row, column), table in crosstabs.items()]
+    return pd.DataFrame(results)
+
+
+def factor_presence_tests(factor_table, totals):
+    """chi_square() of a present/absent x column table for every factor.
+
+    `factor_table` is a factor x column count table, in which an accident
+    mentioning several factors appears in several rows, so it cannot be
+    tested as it is; `totals` are the accidents per column. Each factor's
+    2 x k table counts every accident exactly once.
+    """
+    totals = totals.reindex(factor_table.columns, fill_value=0)
+    results = []
+    for factor, present in factor_table.iterrows():
+        table = pd.DataFrame([present, totals - present], index=['present', 'absent'])
+        results.append({'factor': factor, **chi_square(table)})
+    return pd.DataFrame(results)
+
+
+# -----------------------------------------------------------------------------
+# Two-sample distribution tests from value counts
+# -----------------------------------------------------------------------------
+def _aligned_counts(a, b):
+    # Two value -> count Series on one sorted value axis
+    values = np.union1d(np.asarray(a.index, dtype=np.float64), np.asarray(b.index, dtype=np.float64))
+    a = pd.Series(np.asarray(a, dtype=np.float64), index=np.asarray(a.index, dtype=np.float64))
+    b = pd.Series(np.asarray(b, dtype=np.float64), index=np.asarray(b.index, dtype=np.float64))
+    a = a.groupby(level=0).sum().reindex(values, fill_value=0).to_numpy()
+    b = b.groupby(level=0).sum().reindex(values, fill_value=0).to_numpy()
+    return values, a, b
+
+
+def mann_whitney(a, b):
+    """Two-sided Mann-Whitney U test from value -> count Series.
+
+    Normal approximation with tie and continuity correction (as scipy's
+    asymptotic method), exact for the statistic itself.
+    """
+    from scipy.stats import norm
+
+    _, a, b = _aligned_counts(a, b)
+    n1, n2 = a.sum(), b.sum()
+    if n1 == 0 or n2 == 0:
+        return {'u': np.nan, 'z': np.nan, 'p_value': np.nan}
+    # Pairs where a's value is larger, plus half the ties
+    u = float((a * (np.cumsum(b) - b)).sum() + 0.5 * (a * b).sum())
+    ties = a + b
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    var = n1 * n2 / 12 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))
+    if var <= 0:
+        return {'u': u, 'z': 0.0, 'p_value': 1.0}
+    z = (abs(u - mean) - 0.5) / np.sqrt(var)
+    return {'u': u, 'z': float(np.sign(u - mean) * max(z, 0.0)), 'p_value': float(min(1.0, 2 * norm.sf(max(z, 0.0))))}
+
+
+def ks_test(a, b):
+    """Two-sample Kolmogorov-Smirnov test from value -> count Series (asymptotic p-value)."""
+    from scipy.stats import kstwobign
+
+    _, a, b = _aligned_counts(a, b)
+    n1, n2 = a.sum(), b.sum()
+    if n1 == 0 or n2 == 0:
+        return {'d': np.nan, 'p_value': np.nan}
+    d = float(np.abs(np.cumsum(a) / n1 - np.cumsum(b) / n2).max())
+    en = np.sqrt(n1 * n2 / (n1 + n2))
+    return {'d': d, 'p_value': float(kstwobign.sf(d * en))}
+
+
+def compare_groups(table, min_count=1):
+    """Mann-Whitney and KS tests for every pair of groups in a group x value count table.
+
+    `table` is e.g. agg.crosstab('Gender', 'Age'): one row per group, one
+    column per value. Returns one row per pair with sizes, medians and p-values.
+    """
+    values = np.asarray(table.columns, dtype=np.float64)
+    groups = [group for group in table.index if table.loc[group].sum() >= min_count]
+    rows = []
+    for i, first in enumerate(groups):
+        for second in groups[i + 1:]:
+            a = pd.Series(table.loc[first].to_numpy(), index=values)
+            b = pd.Series(table.loc[second].to_numpy(), index=values)
+            mw, ks = mann_whitney(a, b), ks_test(a, b)
+            rows.append({
+                'group_a': first, 'group_b': second,
+                'n_a': int(a.sum()), 'n_b': int(b.sum()),
+                'median_a': _weighted_median(a), 'median_b': _weighted_median(b),
+                'mann_whitney_u': mw['u'], 'mann_whitney_p': mw['p_value'],
+                'ks_d': ks['d'], 'ks_p': ks['p_value'],
+            })
+    return pd.DataFrame(rows)
+
+
+def _weighted_median(counts):
+    cumulative = np.cumsum(counts.to_numpy())
+    if not len(cumulative) or cumulative[-1] == 0:
+        return np.nan
+    return float(counts.index[np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+# -----------------------------------------------------------------------------
+# Bootstrap
+# -----------------------------------------------------------------------------
+def _batch_sizes(n_resamples, batch_size):
+    full, rest = divmod(n_resamples, batch_size)
+    return [batch_size] * full + ([rest] if rest else [])
+
+
+def _run_batches(batch_func, n_resamples, batch_size, seed, max_workers):
+    sizes = _batch_sizes(n_resamples, batch_size)
+    # Independent streams per batch: same result however batches are spread
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if max_workers == 1 or len(sizes) == 1:
+        results = [batch_func(size, batch_seed) for size, batch_seed in zip(sizes, seeds)]
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(sizes))
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(batch_func, sizes, seeds))
+    return np.concatenate(results) if results else np.empty(0)
+
+
+def _counts_batch(counts, statistic, size, seed):
+    rng = np.random.default_rng(seed)
+    n = int(counts.sum())
+    resampled = rng.multinomial(n, counts / n, size=size)
+    return np.asarray(statistic(resampled), dtype=np.float64)
+
+
+def _indices_batch(values, statistic, size, seed):
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, len(values), size=(size, len(values)))
+    return np.asarray(statistic(values[indices]), dtype=np.float64)
+
+
+def bootstrap_counts(counts, statistic, n_resamples=DEFAULT_RESAMPLES, batch_size=DEFAULT_BATCH, seed=0,
+                     max_workers=1):
+    """Bootstrap replicates of a statistic of category counts.
+
+    `statistic` maps a (batch, categories) array of resampled counts to one
+    value per row, e.g. share(counts, i). It must be picklable (module-level
+    function or functools.partial) when max_workers != 1.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    return _run_batches(partial(_counts_batch, counts, statistic), n_resamples, batch_size, seed, max_workers)
+
+
+def bootstrap_indices(values, statistic, n_resamples=DEFAULT_RESAMPLES, batch_size=None, seed=0,
+                      max_workers=1):
+    """Bootstrap replicates of a statistic of row values (e.g. np.mean with axis=1).
+
+    Resamples (batch x n) index blocks; `statistic` is applied to the
+    (batch, n) resampled values and must return one value per row.
+    """
+    values = np.asarray(values)
+    batch_size = batch_size or max(1, min(DEFAULT_BATCH, MAX_BATCH_ELEMENTS // max(len(values), 1)))
+    return _run_batches(partial(_indices_batch, values, statistic), n_resamples, batch_size, seed, max_workers)
+
+
+def share(resampled, index):
+    """Percentage of category `index` in each row of resampled counts."""
+    return resampled[:, index] / resampled.sum(axis=1) * 100
+
+
+def confidence_interval(replicates, confidence=DEFAULT_CONFIDENCE):
+    """Percentile interval of bootstrap replicates."""
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(replicates, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def proportion_intervals(counts, levels=('Fatal', 'Serious'), n_resamples=DEFAULT_RESAMPLES,
+                         confidence=DEFAULT_CONFIDENCE, seed=0, max_workers=1):
+    """Percentages of `levels` in a counts Series with bootstrap confidence intervals."""
+    counts = counts[counts > 0]
+    total = counts.sum()
+    rows = []
+    for level in levels:
+        if level not in counts.index:
+            continue
+        index = counts.index.get_loc(level)
+        replicates = bootstrap_counts(counts.to_numpy(), partial(share, index=index), n_resamples,
+                                      seed=seed, max_workers=max_workers)
+        low, high = confidence_interval(replicates, confidence)
+        rows.append({'level': level, 'percent': counts[level] / total * 100, 'ci_low': low, 'ci_high': high})
+    return pd.DataFrame(rows).set_index('level') if rows else pd.DataFrame(columns=['percent', 'ci_low', 'ci_high'])
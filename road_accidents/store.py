@@ -0,0 +1,440 @@
+# =============================================================================
+# Road Accident Analysis - Incremental Aggregate Store
+# =============================================================================
+#
+# New accident records arrive daily. Rather than recomputing every statistic
+# from the full history, the AccidentAggregator state (value counts, daily
+# series, crosstabs, running sums and hotspot cells) is kept on disk and each
+# delta CSV is folded into it. The store remembers which files went in (by
+# content hash), so `verify` can rebuild everything from scratch and compare.
+#
+# An append aggregates the delta rows on their own and merges the result into
+# the stored state once. The exact count tables (Date, Intersection, the
+# crosstabs, the hotspot cells: the bulk of the state) are not pickled but
+# kept as CountTables, one .npy array per key level plus a counts array.
+# Their counts are updated in place through a memory map and only keys not
+# seen before are appended, so a refresh does not re-group the stored totals
+# or rewrite them; the pickle holds just the small remainder (running sums,
+# the dense daily series, sketches).
+#
+# Usage:
+#   python -m road_accidents.store init   road-accident-data.csv --store accident-store
+#   python -m road_accidents.store append new-accidents-2024-05-02.csv --store accident-store
+#   python -m road_accidents.store verify --store accident-store
+#   python -m road_accidents.store show   --store accident-store
+
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.aggregate import AccidentAggregator
+from road_accidents.cache import read_json, source_signature, write_json
+from road_accidents.ingest import available_columns, iter_accident_chunks, read_header
+from road_accidents.parsing import ParseReport
+
+DEFAULT_STORE_DIR = 'accident-store'
+DEFAULT_CHUNK_SIZE = 500_000
+
+# Bump when the pickled aggregator or count table layout changes
+STORE_VERSION = 6
+
+
+# Multiplier folding the per-level key hashes into one (64-bit FNV prime)
+HASH_MULTIPLIER = np.uint64(1099511628211)
+
+# Keys appended since the sorted hash index was last rebuilt are looked up
+# directly; the index is rebuilt once there are more of them than this, or
+# than a quarter of the indexed keys
+MIN_UNINDEXED_KEYS = 4096
+
+
+def _level_array(values, kind=None):
+    """(kind, array) for one level of table keys: 'str' with an object array of
+    str, or a numpy dtype string; with `kind` given, the values must fit it."""
+    index = pd.Index(np.asarray(values))
+    if index.inferred_type == 'string':
+        if kind not in (None, 'str'):
+            raise ValueError("Text keys cannot be added to {} keys".format(kind))
+        return 'str', index.to_numpy(dtype=object)
+    array = index.to_numpy()
+    if array.dtype == object:
+        # e.g. numbers in an object column
+        array = pd.Index(list(array)).to_numpy()
+    if array.dtype == object or kind == 'str':
+        raise ValueError("Cannot store {} keys{}".format(
+            index.inferred_type, '' if kind is None else ' with {} keys'.format(kind)))
+    if kind is not None and array.dtype.str != kind:
+        cast = array.astype(kind)
+        if not (cast == array).all():
+            raise ValueError("Keys of type {} do not fit the stored {} keys".format(array.dtype, kind))
+        array = cast
+    return array.dtype.str, array
+
+
+def _key_hashes(levels):
+    # One uint64 per key; numbers hash by value (2020 == 2020.0), dates by instant
+    hashes = None
+    for kind, array in levels:
+        if kind == 'str':
+            level = pd.util.hash_array(array)
+        elif np.dtype(kind).kind == 'M':
+            level = pd.util.hash_array(array.astype('datetime64[ns]').view(np.int64))
+        else:
+            level = pd.util.hash_array(array.astype(np.float64))
+        hashes = level if hashes is None else hashes * HASH_MULTIPLIER ^ level
+    return hashes
+
+
+def _append_bytes(path, size, data):
+    # Write `data` at offset `size`, dropping anything past it (left by an interrupted append)
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+        f.truncate(size)
+        f.seek(size)
+        f.write(data)
+
+
+class CountTable:
+    """A counts Series on disk as row-aligned flat arrays that can be updated in place.
+
+    Each key level is one binary file (text as UTF-8 bytes plus end offsets),
+    next to the counts and a 64-bit hash of every key. add() finds the keys of
+    a delta by their hashes, adds to the counts of known keys through a
+    memory map and appends new keys in first-seen order, so the stored order
+    stays that of a single pass over all the files. The lookup binary-searches
+    a sorted, memory-mapped copy of the hashes, plus the few keys appended
+    since it was built, so it touches O(delta keys x log keys) of the table.
+    meta.json records how many rows are complete and is written last.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read(self):
+        """The stored counts Series (None if nothing was added yet)."""
+        meta = read_json(self.meta_path)
+        if meta is None:
+            return None
+        rows = meta['rows']
+        levels = []
+        for level, kind in enumerate(meta['kinds']):
+            if kind == 'str':
+                ends = np.fromfile(self._path('key{}.ends'.format(level)), np.int64, count=rows).tolist()
+                with open(self._path('key{}.bytes'.format(level)), 'rb') as f:
+                    blob = f.read(meta['bytes'][level])
+                values = np.array([blob[start:end].decode('utf-8')
+                                   for start, end in zip([0] + ends[:-1], ends)], dtype=object)
+            else:
+                values = np.fromfile(self._path('key{}.bin'.format(level)), kind, count=rows)
+            levels.append(values)
+        names = meta['names']
+        index = (pd.Index(levels[0], name=names[0]) if len(levels) == 1
+                 else pd.MultiIndex.from_arrays(levels, names=names))
+        return pd.Series(np.fromfile(self._path('counts.bin'), np.int64, count=rows), index=index, name='count')
+
+    def add(self, counts):
+        """Add a counts Series (flat or MultiIndex, same levels each time) into the table."""
+        counts = counts[counts > 0]
+        if not len(counts):
+            return self
+        os.makedirs(self.directory, exist_ok=True)
+        meta = read_json(self.meta_path) or {
+            'names': list(counts.index.names), 'kinds': [None] * counts.index.nlevels,
+            'bytes': [0] * counts.index.nlevels, 'rows': 0, 'indexed': 0}
+        rows = meta['rows']
+        levels = [_level_array(counts.index.get_level_values(level), kind)
+                  for level, kind in enumerate(meta['kinds'])]
+        hashes = _key_hashes(levels)
+        values = counts.to_numpy(dtype=np.int64)
+
+        positions = self._lookup(hashes, meta)
+        known = positions >= 0
+        if known.any():
+            stored = np.memmap(self._path('counts.bin'), np.int64, mode='r+', shape=(rows,))
+            stored[positions[known]] += values[known]
+            del stored
+
+        new = ~known
+        if new.any():
+            for level, (kind, array) in enumerate(levels):
+                meta['kinds'][level] = kind
+                if kind == 'str':
+                    encoded = [value.encode('utf-8') for value in array[new]]
+                    ends = meta['bytes'][level] + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+                    _append_bytes(self._path('key{}.bytes'.format(level)), meta['bytes'][level], b''.join(encoded))
+                    _append_bytes(self._path('key{}.ends'.format(level)), rows * 8, ends.tobytes())
+                    meta['bytes'][level] = int(ends[-1])
+                else:
+                    itemsize = np.dtype(kind).itemsize
+                    _append_bytes(self._path('key{}.bin'.format(level)), rows * itemsize, array[new].tobytes())
+            _append_bytes(self._path('hashes.bin'), rows * 8, hashes[new].tobytes())
+            _append_bytes(self._path('counts.bin'), rows * 8, values[new].tobytes())
+            meta['rows'] = rows + int(new.sum())
+            if meta['rows'] - meta['indexed'] > max(MIN_UNINDEXED_KEYS, meta['indexed'] // 4):
+                self._build_index(meta)
+            write_json(self.meta_path, meta)
+        return self
+
+    def _lookup(self, hashes, meta):
+        # Row of each hash in the table, -1 for keys not stored yet
+        positions = np.full(len(hashes), -1, dtype=np.int64)
+        indexed, rows = meta['indexed'], meta['rows']
+        if indexed:
+            sorted_hashes = np.memmap(self._path('index-hashes.bin'), np.uint64, mode='r', shape=(indexed,))
+            at = np.minimum(np.searchsorted(sorted_hashes, hashes), indexed - 1)
+            found = sorted_hashes[at] == hashes
+            sorted_rows = np.memmap(self._path('index-rows.bin'), np.int64, mode='r', shape=(indexed,))
+            positions[found] = sorted_rows[at[found]]
+        if rows > indexed:
+            recent = np.fromfile(self._path('hashes.bin'), np.uint64, count=rows - indexed, offset=indexed * 8)
+            at = pd.Index(recent).get_indexer(hashes)
+            positions[at >= 0] = at[at >= 0] + indexed
+        return positions
+
+    def _build_index(self, meta):
+        hashes = np.fromfile(self._path('hashes.bin'), np.uint64, count=meta['rows'])
+        order = np.argsort(hashes, kind='stable')
+        for name, array in [('index-hashes.bin', hashes[order]), ('index-rows.bin', order.astype(np.int64))]:
+            tmp_path = self._path(name + '.tmp')
+            array.tofile(tmp_path)
+            os.replace(tmp_path, self._path(name))
+        meta['indexed'] = meta['rows']
+
+
+class AggregateStore:
+    """On-disk AccidentAggregator state plus the list of files folded into it."""
+
+    def __init__(self, directory=DEFAULT_STORE_DIR):
+        self.directory = directory
+        self.state_path = os.path.join(directory, 'aggregator.pkl')
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.tables_dir = os.path.join(directory, 'tables')
+
+    def exists(self):
+        return os.path.exists(self.state_path) and os.path.exists(self.meta_path)
+
+    def meta(self):
+        meta = read_json(self.meta_path)
+        if meta is None:
+            raise FileNotFoundError("No aggregate store in {!r}; run 'init' first".format(self.directory))
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError("Aggregate store {!r} has version {}, expected {}; rebuild it with 'init'".format(
+                self.directory, meta.get('version'), STORE_VERSION))
+        return meta
+
+    def _state(self):
+        # The pickled aggregator, without its count tables
+        self.meta()
+        with open(self.state_path, 'rb') as f:
+            return pickle.load(f)
+
+    def _table(self, name):
+        return CountTable(os.path.join(self.tables_dir, name))
+
+    def aggregator(self):
+        """The full AccidentAggregator: the pickled state plus the count tables."""
+        aggregator = self._state()
+        tables = {name: self._table(name).read() for name in self.meta()['tables']}
+        return aggregator.add_tables(tables)
+
+    def results(self):
+        """AggregateResults for everything ingested so far."""
+        return self.aggregator().result()
+
+    def columns(self):
+        """Columns (raw and derived) seen across the ingested files."""
+        return self.meta()['columns']
+
+    def _save(self, aggregator, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(aggregator, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.state_path)
+        write_json(self.meta_path, meta)
+
+    # -------------------------------------------------------------------------
+    # Ingest
+    # -------------------------------------------------------------------------
+    def init(self, path, chunksize=DEFAULT_CHUNK_SIZE):
+        """Start a new store from a full CSV (replacing any existing store)."""
+        if os.path.isdir(self.tables_dir):
+            shutil.rmtree(self.tables_dir)
+        meta = {'version': STORE_VERSION, 'files': [], 'columns': [], 'tables': []}
+        return self._ingest(AccidentAggregator(), meta, path, chunksize)
+
+    def append(self, path, chunksize=DEFAULT_CHUNK_SIZE):
+        """Fold the rows of a delta CSV into the stored aggregates."""
+        meta = self.meta()
+        signature = source_signature(path)
+        if any(entry['sha256'] == signature['sha256'] for entry in meta['files']):
+            raise ValueError("{!r} has already been added to the store".format(path))
+        return self._ingest(self._state(), meta, path, chunksize, signature)
+
+    def _ingest(self, state, meta, path, chunksize, signature=None):
+        signature = signature or source_signature(path)
+        report = ParseReport()
+        # Aggregate the new rows on their own, then merge them in once
+        delta = AccidentAggregator()
+        chunks = iter_accident_chunks(path, chunksize, usecols=delta.required_columns(), report=report)
+        for chunk in chunks:
+            delta.update(chunk)
+        for name, counts in delta.pop_tables().items():
+            self._table(name).add(counts)
+            if name not in meta['tables']:
+                meta['tables'].append(name)
+        state.merge(delta)
+
+        meta['files'].append({
+            'path': os.path.abspath(path),
+            'rows': delta.total_rows,
+            'parse_failures': report.failures,
+            **signature,
+        })
+        columns = meta['columns'] + available_columns(read_header(path))
+        meta['columns'] = list(dict.fromkeys(columns))
+        self._save(state, meta)
+        return delta.total_rows
+
+    # -------------------------------------------------------------------------
+    # Verification
+    # -------------------------------------------------------------------------
+    def recompute(self, chunksize=DEFAULT_CHUNK_SIZE):
+        """AggregateResults rebuilt from scratch over every ingested file."""
+        aggregator = AccidentAggregator()
+        for entry in self.meta()['files']:
+            chunks = iter_accident_chunks(entry['path'], chunksize, usecols=aggregator.required_columns())
+            for chunk in chunks:
+                aggregator.update(chunk)
+        return aggregator.result()
+
+    def verify(self, chunksize=DEFAULT_CHUNK_SIZE):
+        """List of differences between the stored state and a full recompute."""
+        problems = []
+        for entry in self.meta()['files']:
+            if not os.path.exists(entry['path']):
+                problems.append("missing source file {}".format(entry['path']))
+            elif source_signature(entry['path'])['sha256'] != entry['sha256']:
+                problems.append("source file changed since it was added: {}".format(entry['path']))
+        if problems:
+            return problems
+        return compare_results(self.results(), self.recompute(chunksize))
+
+
+def _same_counts(a, b):
+    a = a.groupby(level=list(range(a.index.nlevels))).sum().sort_index()
+    b = b.groupby(level=list(range(b.index.nlevels))).sum().sort_index()
+    return a.index.equals(b.index) and np.array_equal(a.to_numpy(), b.to_numpy())
+
+
+def compare_results(stored, fresh):
+    """Differences between two AggregateResults (empty list when identical)."""
+    problems = []
+    if stored.total_rows != fresh.total_rows:
+        problems.append("total_rows: {} != {}".format(stored.total_rows, fresh.total_rows))
+
+    for col in sorted(set(stored.counts) | set(fresh.counts)):
+        if col not in stored.counts or col not in fresh.counts:
+            problems.append("counts[{}] missing on one side".format(col))
+        elif not _same_counts(stored.counts[col], fresh.counts[col]):
+            problems.append("counts[{}] differ".format(col))
+
+    for pair in sorted(set(stored.crosstabs) | set(fresh.crosstabs)):
+        if pair not in stored.crosstabs or pair not in fresh.crosstabs:
+            problems.append("crosstab{} missing on one side".format(pair))
+        elif not _same_counts(stored.crosstabs[pair].stack(), fresh.crosstabs[pair].stack()):
+            problems.append("crosstab{} differ".format(pair))
+
+    for col in sorted(set(stored.stats) | set(fresh.stats)):
+        a, b = stored.stats.get(col), fresh.stats.get(col)
+        if a is None or b is None:
+            problems.append("stats[{}] missing on one side".format(col))
+            continue
+        for key in a:
+            if not np.isclose(a[key], b[key], rtol=1e-9, equal_nan=True):
+                problems.append("stats[{}][{}]: {} != {}".format(col, key, a[key], b[key]))
+
+    if (stored.hotspots is None) != (fresh.hotspots is None):
+        problems.append("hotspots missing on one side")
+    elif stored.hotspots is not None and not _same_counts(stored.hotspots.counts, fresh.hotspots.counts):
+        problems.append("hotspot cells differ")
+
+    if (stored.daily is None) != (fresh.daily is None):
+        problems.append("daily counts missing on one side")
+    elif stored.daily is not None and not (
+            stored.daily.start == fresh.daily.start and stored.daily.levels == fresh.daily.levels
+            and np.array_equal(stored.daily.counts, fresh.daily.counts)):
+        problems.append("daily counts differ")
+    return problems
+
+
+def rates_summary(results):
+    """Headline numbers from stored aggregates (sections 1 and 3b)."""
+    lines = ["Total accidents: {}".format(results.total_rows)]
+    severity = results.counts.get('Severity')
+    if severity is not None and severity.sum():
+        for level in ['Fatal', 'Serious']:
+            lines.append("Percentage of {} Accidents: {:.2f}%".format(
+                level, severity.get(level, 0) / severity.sum() * 100))
+    daily = results.counts.get('Date')
+    if daily is not None and len(daily):
+        daily = daily.sort_index()
+        lines.append("Dates covered: {} to {} ({} days with accidents)".format(
+            pd.Timestamp(daily.index[0]).date(), pd.Timestamp(daily.index[-1]).date(), len(daily)))
+    if results.daily is not None:
+        latest = results.daily.rolling((7, 30)).iloc[-1]
+        lines.append("Accidents per day on {}: {:.1f} (7-day average), {:.1f} (30-day average)".format(
+            latest.name.date(), latest['rolling_7'], latest['rolling_30']))
+    return "\n".join(lines)
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain incrementally updated accident aggregates.")
+    parser.add_argument('command', choices=['init', 'append', 'verify', 'show'])
+    parser.add_argument('data', nargs='?', help="CSV to ingest (init/append)")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="store directory")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk")
+    args = parser.parse_args(argv)
+
+    store = AggregateStore(args.store)
+    start = time.perf_counter()
+    try:
+        if args.command in ('init', 'append'):
+            if not args.data:
+                parser.error("{} needs a CSV file".format(args.command))
+            ingest = store.init if args.command == 'init' else store.append
+            rows = ingest(args.data, args.chunk_size)
+            print("Added {} rows from {} in {:.2f}s".format(rows, args.data, time.perf_counter() - start))
+            print(rates_summary(store.results()))
+        elif args.command == 'verify':
+            problems = store.verify(args.chunk_size)
+            if problems:
+                print("Incremental aggregates do NOT match a full recompute:")
+                for problem in problems:
+                    print("  " + problem)
+                sys.exit(1)
+            print("Incremental aggregates match a full recompute ({} files, {:.2f}s)".format(
+                len(store.meta()['files']), time.perf_counter() - start))
+        else:
+            for entry in store.meta()['files']:
+                print("{path}: {rows} rows".format(**entry))
+            print(rates_summary(store.results()))
+    except (FileNotFoundError, ValueError) as e:
+        # e.g. a file appended twice or a missing store: a message, not a traceback
+        parser.exit(1, "{}: error: {}\n".format(parser.prog, e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+# =============================================================================
+# Road Accident Analysis - Dense Daily Time Series
+# =============================================================================
+#
+# Section 1c plots the raw daily accident counts. Monitoring needs more than
+# that (rolling 7/30/365-day averages, weekly and monthly totals,
+# year-over-year deltas, a seasonal baseline to spot unusual days), and
+# recomputing each of those with pandas over the full frame costs a pass
+# over every row.
+#
+# DailyCounts keeps one dense int array of shape (regions, severities, days)
+# covering every calendar day from the first to the last accident, with the
+# gaps zero-filled. It is filled in the same single pass as the other
+# aggregates (chunk by chunk when streaming, and kept in the aggregate
+# store), after which every query works on the day axis only:
+#
+#   * rolling windows are differences of one cumulative sum;
+#   * weekly/monthly totals are np.add.reduceat over the period boundaries;
+#   * year-over-year compares with the value 364 days / 52 weeks / 12 months
+#     earlier (364 days keeps the weekday);
+#   * the seasonal baseline is the mean and spread per (month, weekday),
+#     from bincounts over the day axis.
+#
+# so their cost is O(days), whatever the number of rows.
+#
+# Usage:
+#   python -m road_accidents.timeseries road-accident-data.csv --where Region=North --freq M
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from road_accidents.ingest import iter_accident_chunks
+from road_accidents.partitions import matches
+
+DAILY_KEYS = ['Region', 'Severity']
+DEFAULT_WINDOWS = (7, 30, 365)
+
+# Level for rows without a Region/Severity, so the day totals still add up
+MISSING_LEVEL = 'Unknown'
+
+# Periods per year for year_over_year(); 364 days keeps the weekday
+YEAR_LAGS = {'D': 364, 'W': 52, 'M': 12}
+
+
+def _sorted_levels(levels):
+    try:
+        return sorted(levels)
+    except TypeError:
+        return sorted(levels, key=str)
+
+
+def rolling_sum(values, window):
+    """Trailing `window`-day sums along the last axis (NaN until a full window)."""
+    values = np.asarray(values)
+    cumulative = np.cumsum(values, axis=-1, dtype=np.int64)
+    out = np.full(values.shape, np.nan)
+    if window <= values.shape[-1]:
+        out[..., window - 1] = cumulative[..., window - 1]
+        out[..., window:] = cumulative[..., window:] - cumulative[..., :-window]
+    return out
+
+
+def rolling_mean(values, window):
+    """Trailing `window`-day means along the last axis (NaN until a full window)."""
+    return rolling_sum(values, window) / window
+
+
+class DailyCountsBuilder:
+    """Folds the Date (and Region/Severity) of each chunk into dense day counts."""
+
+    def __init__(self, keys=DAILY_KEYS):
+        self.keys = list(keys)
+        self._levels = {key: [] for key in self.keys}
+        # Day number (days since 1970-01-01) of the first column of _counts
+        self._start = None
+        self._counts = np.zeros([0] * (len(self.keys) + 1), dtype=np.int64)
+
+    def required_columns(self):
+        return ['Date'] + self.keys
+
+    def _codes(self, key, chunk):
+        if key in chunk.columns:
+            values = chunk[key].astype(object).where(chunk[key].notna(), MISSING_LEVEL)
+        else:
+            values = pd.Series(MISSING_LEVEL, index=chunk.index, dtype=object)
+        levels = self._levels[key]
+        new = [value for value in pd.unique(values) if value not in set(levels)]
+        levels.extend(value.item() if isinstance(value, np.generic) else value for value in new)
+        return pd.Index(levels).get_indexer(values)
+
+    def _grow(self, first, last):
+        # Pad the level axes for newly seen levels and the day axis to cover first..last
+        start = first if self._start is None else min(self._start, first)
+        end = last + 1 if self._start is None else max(self._start + self._counts.shape[-1], last + 1)
+        before = 0 if self._start is None else self._start - start
+        pad = [(0, len(self._levels[key]) - size) for key, size in zip(self.keys, self._counts.shape)]
+        pad.append((before, end - start - before - self._counts.shape[-1]))
+        if any(width for pair in pad for width in pair):
+            self._counts = np.pad(self._counts, pad)
+        self._start = start
+
+    def update(self, chunk):
+        if 'Date' not in chunk.columns:
+            return self
+        dates = pd.to_datetime(chunk['Date'], errors='coerce')
+        valid = dates.notna().to_numpy()
+        if not valid.any():
+            return self
+        chunk = chunk[valid]
+        days = dates[valid].to_numpy().astype('datetime64[D]').astype(np.int64)
+        codes = [self._codes(key, chunk) for key in self.keys]
+        self._grow(int(days.min()), int(days.max()))
+        shape = self._counts.shape
+        flat = np.ravel_multi_index(codes + [days - self._start], shape)
+        self._counts += np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return self
+
+    def merge(self, other):
+        """Add the day counts of another builder with the same keys (e.g. of a delta file)."""
+        if other._start is None:
+            return self
+        positions = []
+        for key in self.keys:
+            levels = self._levels[key]
+            levels.extend(level for level in other._levels[key] if level not in set(levels))
+            positions.append(pd.Index(levels).get_indexer(other._levels[key]))
+        days = other._counts.shape[-1]
+        self._grow(other._start, other._start + days - 1)
+        positions.append(np.arange(days) + other._start - self._start)
+        self._counts[np.ix_(*positions)] += other._counts
+        return self
+
+    def result(self):
+        """The finished DailyCounts, with each key's levels sorted (None before any dated row)."""
+        if self._start is None:
+            return None
+        counts = self._counts
+        levels = {}
+        for axis, key in enumerate(self.keys):
+            ordered = _sorted_levels(self._levels[key])
+            counts = counts.take(pd.Index(self._levels[key]).get_indexer(ordered), axis=axis)
+            levels[key] = ordered
+        # int32 is plenty for accidents per region, severity and day
+        dtype = np.int32 if counts.max(initial=0) <= np.iinfo(np.int32).max else np.int64
+        return DailyCounts(counts.astype(dtype), np.datetime64(self._start, 'D'), levels)
+
+
+class DailyCounts:
+    """Zero-filled accident counts per key level (Region, Severity) and calendar day."""
+
+    def __init__(self, counts, start, levels):
+        # ndarray of shape (levels of each key..., days)
+        self.counts = counts
+        self.start = np.datetime64(start, 'D')
+        self.levels = levels
+        self.keys = list(levels)
+
+    def __repr__(self):
+        return "DailyCounts({} days from {}, {})".format(
+            self.days, self.start, ', '.join('{} {}'.format(len(v), k) for k, v in self.levels.items()))
+
+    @classmethod
+    def from_frame(cls, df, keys=DAILY_KEYS):
+        """Daily counts of an in-memory frame."""
+        return DailyCountsBuilder(keys).update(df).result()
+
+    @classmethod
+    def stream(cls, path, chunksize, keys=DAILY_KEYS, report=None):
+        """Daily counts of the CSV, one chunk at a time."""
+        builder = DailyCountsBuilder(keys)
+        for chunk in iter_accident_chunks(path, chunksize, usecols=builder.required_columns(), report=report):
+            builder.update(chunk)
+        return builder.result()
+
+    @property
+    def days(self):
+        return self.counts.shape[-1]
+
+    @property
+    def dates(self):
+        return pd.date_range(pd.Timestamp(self.start), periods=self.days, freq='D', name='Date')
+
+    def _values(self, where=None):
+        # Day counts summed over the key levels matching `where`
+        counts = self.counts
+        for axis, key in enumerate(self.keys):
+            wanted = (where or {}).get(key)
+            if wanted is not None:
+                keep = [i for i, level in enumerate(self.levels[key]) if matches(level, wanted)]
+                counts = counts.take(keep, axis=axis)
+        return counts.reshape(-1, self.days).sum(axis=0, dtype=np.int64)
+
+    def series(self, where=None):
+        """Accidents per day over the levels matching `where`, e.g. {'Region': 'North'}."""
+        return pd.Series(self._values(where), index=self.dates, name='count')
+
+    def by(self, key, where=None):
+        """days x levels of `key` frame (e.g. one column per Region)."""
+        where = {k: v for k, v in (where or {}).items() if k != key}
+        columns = {level: self._values({**where, key: level}) for level in self.levels[key]}
+        frame = pd.DataFrame(columns, index=self.dates)
+        frame.columns.name = key
+        return frame
+
+    def rolling(self, windows=DEFAULT_WINDOWS, where=None):
+        """Daily counts with trailing rolling means, one column per window."""
+        values = self._values(where)
+        frame = pd.DataFrame({'count': values}, index=self.dates)
+        for window in windows:
+            frame['rolling_{}'.format(window)] = rolling_mean(values, window)
+        return frame
+
+    def _period_totals(self, values, freq):
+        # Sum days into calendar periods; the first and last may be partial
+        periods = self.dates.to_period(freq)
+        starts = np.flatnonzero(np.r_[True, periods.asi8[1:] != periods.asi8[:-1]])
+        return pd.Series(np.add.reduceat(values, starts), index=periods[starts], name='count')
+
+    def resample(self, freq='M', where=None):
+        """Totals per calendar week ('W') or month ('M'); the first and last periods may be partial."""
+        return self._period_totals(self._values(where), freq)
+
+    def year_over_year(self, freq='M', where=None):
+        """Counts per day/week/month next to the same period a year earlier."""
+        if freq not in YEAR_LAGS:
+            raise ValueError("freq must be one of {}".format(', '.join(YEAR_LAGS)))
+        values = self._values(where)
+        current = self.series(where) if freq == 'D' else self._period_totals(values, freq)
+        lag = YEAR_LAGS[freq]
+        previous = np.full(len(current), np.nan)
+        if lag < len(current):
+            previous[lag:] = current.to_numpy()[:-lag]
+        delta = current.to_numpy() - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(previous > 0, delta / previous * 100, np.nan)
+        return pd.DataFrame({'count': current.to_numpy(), 'previous': previous, 'delta': delta,
+                             'pct_change': pct}, index=current.index)
+
+    def seasonal_baseline(self, where=None):
+        """Daily counts against the mean for their (month, weekday), with z-scores."""
+        values = self._values(where).astype(np.float64)
+        dates = self.dates
+        group = (dates.month.to_numpy() - 1) * 7 + dates.dayofweek.to_numpy()
+        n = np.bincount(group, minlength=84)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.bincount(group, weights=values, minlength=84) / n
+            var = np.bincount(group, weights=values ** 2, minlength=84) / n - mean ** 2
+            # Sample standard deviation per group
+            std = np.sqrt(np.maximum(var, 0) * n / (n - 1))
+            baseline = mean[group]
+            zscore = np.where(std[group] > 0, (values - baseline) / std[group], np.nan)
+        return pd.DataFrame({'count': values.astype(np.int64), 'baseline': baseline,
+                             'residual': values - baseline, 'zscore': zscore}, index=dates)
+
+    def anomalies(self, threshold=3.0, where=None):
+        """Days whose count is `threshold` or more standard deviations off the seasonal baseline."""
+        baseline = self.seasonal_baseline(where)
+        return baseline[baseline['zscore'].abs() >= threshold]
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def parse_where(daily, items):
+    """Turn KEY=VALUE[,VALUE...] strings into a `where` dict, matching levels by their text."""
+    where = {}
+    for item in items or []:
+        key, _, text = item.partition('=')
+        if key not in daily.levels:
+            raise SystemExit("Unknown key {!r}; choose from {}".format(key, ', '.join(daily.keys)))
+        wanted = set(text.split(','))
+        where[key] = [level for level in daily.levels[key] if str(level) in wanted]
+    return where
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling averages, period totals and year-over-year "
+                                                 "changes of the daily accident counts.")
+    parser.add_argument('data', help="accident CSV file")
+    parser.add_argument('--where', action='append', default=[], metavar='KEY=VALUE[,VALUE]',
+                        help="keep only these Region/Severity levels (repeatable)")
+    parser.add_argument('--freq', default='M', choices=list(YEAR_LAGS), help="period for year-over-year")
+    parser.add_argument('--windows', type=int, nargs='+', default=list(DEFAULT_WINDOWS))
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    parser.add_argument('--threshold', type=float, default=3.0, help="z-score for anomalous days")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    daily = DailyCounts.stream(args.data, args.chunksize)
+    if daily is None:
+        raise SystemExit("No parseable dates in {}".format(args.data))
+    print("{} in {:.3f}s".format(daily, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    where = parse_where(daily, args.where)
+    print(daily.rolling(args.windows, where).tail(10).to_string())
+    print(daily.year_over_year(args.freq, where).tail(12).to_string())
+    print(daily.anomalies(args.threshold, where).to_string())
+    print("({:.3f}s)".format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()